@@ -0,0 +1,257 @@
+#!/usr/bin/env python
+
+r"""
+Dividend histories as typed, date-indexed arrays, and trailing totals,
+payout counts and growth rates computed for many tickers at once.
+
+The dividend CSVs in data/RawData/Dividends hold timestamp strings, which
+are slow to parse. buildDividendTable() parses every ticker's CSV once and
+keeps the payment dates ( datetime64[D] ) and amounts ( float64 ) of the
+whole universe back to back in data/ProcessedData/dividends.npz.
+readDividendArrays() reads a ticker's dividends from that table when it's
+up-to-date, and from the CSV otherwise.
+
+DividendIndex keeps the dividends of many tickers the same way, keyed by
+( ticker, date ), so one np.searchsorted call finds every ticker's window of
+payments, and np.add.reduceat sums all the windows in one pass.
+
+Example:
+   >>> buildDividendTable()
+   >>> arrays = [ readDividendArrays( t ) for t in tickers ]
+   >>> index = DividendIndex( [ a[ 0 ] for a in arrays ], [ a[ 1 ] for a in arrays ] )
+   >>> index.trailingTotal()            # Paid in the last 365 days, per ticker
+   >>> index.growthRate( 5 )            # Annual growth of that total over 5 years
+"""
+
+############
+# Imports
+############
+
+from typing import Optional, Sequence
+import os, datetime
+from functools import cached_property
+
+import numpy as np
+import pandas as pd
+from numpy.typing import ArrayLike
+
+from UtilLib import NpzTable
+from UtilLib.Util import absolutePathLocator
+from AnalysisLib.ReturnCalculator import Dates, KEY_OFFSET, KEY_STRIDE, nYearsBefore, toDays
+
+
+############
+# Constants
+############
+
+TABLE_PATH = 'data/ProcessedData/dividends.npz'
+DIVIDENDS_DIR = 'data/RawData/Dividends'
+
+TRAILING_DAYS = 365
+
+
+############
+# Functions and Classes
+############
+
+def _dividendsPath( ticker: str, dividendsDir: str = '' ) -> str:
+    return os.path.join( dividendsDir or absolutePathLocator( DIVIDENDS_DIR ), '%s.csv' % ticker )
+
+
+def readDividendsCsv( path: str ) -> tuple[np.ndarray, np.ndarray]:
+    '''
+    Return the payment dates ( datetime64[D] ) and amounts ( float64 )
+    from a Date,Dividends CSV, oldest first.
+    '''
+    df = pd.read_csv( path, dtype={ 'Date' : str } )
+    # The dates are the exchange's local dates, so drop the time and offset
+    # instead of converting to UTC.
+    dates = np.array( df[ 'Date' ].str.slice( 0, 10 ), dtype='datetime64[D]' )
+    amounts = pd.to_numeric( df[ 'Dividends' ], errors='coerce' ).to_numpy( dtype=np.float64 )
+    # Leave out amounts that aren't numbers, like pandas' sum() would,
+    # so one bad row doesn't make every total NaN.
+    valid = ~np.isnan( amounts )
+    dates, amounts = dates[ valid ], amounts[ valid ]
+    order = np.argsort( dates, kind='stable' )
+    return dates[ order ], amounts[ order ]
+
+
+def buildDividendTable( tickers: Optional[list[str]] = None,
+                        tablePath: str = '',
+                        dividendsDir: str = '' ) -> int:
+    '''
+    Build the table from the dividend CSVs, and return the number of
+    tickers in it.
+
+    Keyword arguments:
+       tickers      -- Tickers to include. Defaults to every ticker with a dividends CSV.
+       tablePath    -- Where to write the table. Defaults to TABLE_PATH.
+       dividendsDir -- Where to read the CSVs from.
+    '''
+    tablePath = tablePath or absolutePathLocator( TABLE_PATH )
+    dividendsDir = dividendsDir or absolutePathLocator( DIVIDENDS_DIR )
+    if tickers is None:
+        tickers = []
+        if os.path.isdir( dividendsDir ):
+            tickers = [ f[:-4] for f in os.listdir( dividendsDir ) if f.endswith( '.csv' ) ]
+    tickers = sorted( tickers )
+
+    paths = [ _dividendsPath( ticker, dividendsDir ) for ticker in tickers ]
+    mtimes, results = NpzTable.readSourceFiles( paths, readDividendsCsv, ( OSError, ValueError, KeyError ) )
+    lengths = np.array( [ len( r[ 0 ] ) if r is not None else 0 for r in results ], dtype=np.int64 )
+    dates = [ r[ 0 ] for r in results if r is not None ]
+    amounts = [ r[ 1 ] for r in results if r is not None ]
+
+    arrays = {
+        'tickers' : np.array( tickers, dtype=np.str_ ),
+        'mtimes' : mtimes,
+        'lengths' : lengths,
+        'dates' : np.concatenate( dates ) if dates else np.array( [], dtype='datetime64[D]' ),
+        'amounts' : np.concatenate( amounts ) if amounts else np.array( [], dtype=np.float64 ),
+    }
+    NpzTable.writeTable( tablePath, arrays )
+    return len( tickers )
+
+
+class DividendTable( NpzTable.NpzTable ):
+    '''
+    Read-only view of the table built by buildDividendTable().
+    The whole table is read the first time it's used.
+    '''
+    def __init__( self, tablePath: str = '', dividendsDir: str = '' ) -> None:
+        '''
+        Keyword arguments:
+           tablePath    -- The table's file. Defaults to TABLE_PATH.
+           dividendsDir -- Where the CSVs the table was built from are.
+        '''
+        super().__init__( tablePath or absolutePathLocator( TABLE_PATH ) )
+        self.dividendsDir = dividendsDir or absolutePathLocator( DIVIDENDS_DIR )
+
+    @cached_property
+    def starts( self ) -> np.ndarray:
+        # Where each ticker's dividends start in the dates and amounts arrays.
+        return np.concatenate( ( [ 0 ], np.cumsum( self.arrays[ 'lengths' ] ) ) )
+
+    def dividendArrays( self, ticker: str ) -> Optional[tuple[np.ndarray, np.ndarray]]:
+        '''
+        Return the ticker's payment dates and amounts, or None if the table
+        doesn't have the ticker or its CSV changed after the table was built.
+        '''
+        row = self.tickerToRowMap.get( ticker )
+        if row is None:
+            return None
+        if not self.rowMatchesFile( row, 'mtimes', _dividendsPath( ticker, self.dividendsDir ) ):
+            return None
+        start, end = self.starts[ row ], self.starts[ row + 1 ]
+        return self.arrays[ 'dates' ][ start:end ], self.arrays[ 'amounts' ][ start:end ]
+
+
+def getSharedTable() -> DividendTable:
+    '''
+    Returns the table readDividendArrays() reads from.
+    '''
+    return NpzTable.sharedTable( DividendTable, absolutePathLocator( TABLE_PATH ) )
+
+
+def readDividendArrays( ticker: str ) -> tuple[np.ndarray, np.ndarray]:
+    '''
+    Return the ticker's payment dates and amounts, from the shared table
+    when it's up-to-date, and from the CSV otherwise.
+    '''
+    arrays = getSharedTable().dividendArrays( ticker )
+    if arrays is not None:
+        return arrays
+    return readDividendsCsv( _dividendsPath( ticker ) )
+
+
+class DividendIndex:
+    def __init__( self, dates: Sequence[ArrayLike], amounts: Sequence[ArrayLike] ) -> None:
+        '''
+        Keyword arguments:
+           dates   -- One array of sorted payment dates per ticker.
+           amounts -- The matching dividend amounts.
+        '''
+        keys = []
+        values = []
+        for i, ( tickerDates, tickerAmounts ) in enumerate( zip( dates, amounts ) ):
+            days = toDays( tickerDates ).astype( np.int64 )
+            tickerAmounts = np.asarray( tickerAmounts, dtype=np.float64 )
+            if len( days ) != len( tickerAmounts ):
+                raise ValueError( "Ticker %d has %d dates but %d dividends" % \
+                                  ( i, len( days ), len( tickerAmounts ) ) )
+            keys.append( i * KEY_STRIDE + KEY_OFFSET + days )
+            values.append( tickerAmounts )
+
+        self.numTickers = len( keys )
+        self._keys = np.concatenate( keys ) if keys else np.array( [], dtype=np.int64 )
+        # A trailing 0 so np.add.reduceat() can start a window at the very end.
+        self._amounts = np.concatenate( values + [ np.zeros( 1 ) ] )
+
+    def __len__( self ) -> int:
+        return self.numTickers
+
+    def _positions( self, dates: Dates ) -> np.ndarray:
+        '''
+        For each ticker, the position just after its last payment on or before the date.
+        '''
+        days = np.broadcast_to( toDays( dates ), ( self.numTickers, ) ).astype( np.int64 )
+        targets = np.arange( self.numTickers ) * KEY_STRIDE + KEY_OFFSET + days
+        return np.searchsorted( self._keys, targets, side='right' )
+
+    def _window( self, asOf: Optional[Dates], days: int ) -> tuple[np.ndarray, np.ndarray]:
+        '''
+        Start and end positions of each ticker's payments in the days up to
+        and including asOf ( today by default ).
+        '''
+        if asOf is None:
+            asOf = np.datetime64( datetime.date.today() )
+        end = toDays( asOf )
+        return self._positions( end - np.timedelta64( days, 'D' ) ), self._positions( end )
+
+    def payoutCount( self, asOf: Optional[Dates] = None, days: int = TRAILING_DAYS ) -> np.ndarray:
+        '''
+        Number of dividends each ticker paid in the days up to asOf.
+        '''
+        starts, ends = self._window( asOf, days )
+        return ends - starts
+
+    def trailingTotal( self, asOf: Optional[Dates] = None, days: int = TRAILING_DAYS ) -> np.ndarray:
+        '''
+        Total dividends each ticker paid in the days up to asOf,
+        by default the trailing twelve months.
+        '''
+        starts, ends = self._window( asOf, days )
+        if not self.numTickers:
+            return np.zeros( 0 )
+        # Every ticker's window ends before the next one starts, so the
+        # boundaries interleave in order, and every other reduceat() sum
+        # is a window's total.
+        sums = np.add.reduceat( self._amounts, np.column_stack( ( starts, ends ) ).ravel() )[ ::2 ]
+        return np.where( ends > starts, sums, 0.0 )
+
+    def growthRate( self, years: int = 1, asOf: Optional[Dates] = None ) -> np.ndarray:
+        '''
+        Annual percent growth of the trailing-twelve-month total over the
+        given number of years. NaN when nothing was paid at the start.
+        '''
+        if asOf is None:
+            asOf = np.datetime64( datetime.date.today() )
+        asOfDays = np.broadcast_to( toDays( asOf ), ( self.numTickers, ) )
+        current = self.trailingTotal( asOfDays )
+        previous = self.trailingTotal( nYearsBefore( asOfDays, years ) )
+        with np.errstate( divide='ignore', invalid='ignore' ):
+            growth = 100 * ( ( current / previous ) ** ( 1 / years ) - 1 )
+        return np.where( previous > 0, growth, np.nan )
+
+
+############
+# main()
+############
+def main() -> None:
+    nTickers = buildDividendTable()
+    print( "Built a dividend table with %d tickers in %s" % \
+           ( nTickers, absolutePathLocator( TABLE_PATH ) ) )
+
+
+if __name__ == '__main__':
+    main()
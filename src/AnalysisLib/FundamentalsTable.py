@@ -0,0 +1,250 @@
+#!/usr/bin/env python
+
+r"""
+A single table of the fundamentals the Screener uses, for every ticker.
+
+The info JSONs in data/RawData/YahooFinanceInfo have hundreds of keys each,
+but only a handful are ever read. This table keeps just those fields in one
+file, data/ProcessedData/fundamentals.npz, with one typed array per field and
+one entry per ticker, so the whole universe's fundamentals load in one read.
+
+Stock.info and Stock.fastInfo read from the table when it's up-to-date,
+and only load the ticker's full JSON when asked for a field it doesn't have.
+
+For each field, the table also records whether the JSON had the key, so
+a missing key still raises KeyError ( and .get() returns its default )
+without loading the JSON. Values the table can't store with the right type,
+like nulls, are read from the JSON instead.
+
+Example:
+   >>> buildFundamentalsTable()
+   >>> table = FundamentalsTable()
+   >>> table.info( 'AAPL' )[ 'sector' ]   # No JSON is opened.
+   'Technology'
+   >>> table.info( 'AAPL' )[ 'website' ]  # Loads AAPL's info JSON.
+   'https://www.apple.com'
+"""
+
+############
+# Imports
+############
+
+from typing import Any, Callable, Iterator, Mapping, Optional
+import os, json
+from functools import cached_property
+
+import numpy as np
+
+from UtilLib import NpzTable
+from UtilLib.Util import absolutePathLocator
+
+
+############
+# Constants
+############
+
+TABLE_PATH = 'data/ProcessedData/fundamentals.npz'
+INFO_DIR = 'data/RawData/YahooFinanceInfo'
+FAST_INFO_DIR = 'data/RawData/YahooFinanceFastInfo'
+
+# The fields kept in the table for each source, and their types.
+SOURCE_TO_COLUMNS_MAP: dict[str, dict[str, type]] = {
+    'info' : {
+        'longName' : str,
+        'sector' : str,
+        'forwardPE' : float,
+        'dividendYield' : float,
+        'shortPercentOfFloat' : float,
+    },
+    'fastInfo' : {
+        'marketCap' : float,
+        'shares' : int,
+    },
+}
+
+# What the table knows about a ticker's field.
+ABSENT = 0      # The JSON doesn't have the key.
+STORED = 1      # The value is in the table.
+NOT_STORED = 2  # The JSON has a value the table can't hold, e.g. null.
+
+TYPE_TO_DTYPE_MAP = { str : np.str_, float : np.float64, int : np.int64 }
+TYPE_TO_EMPTY_VALUE_MAP: dict[type, Any] = { str : '', float : np.nan, int : 0 }
+
+
+############
+# Functions and Classes
+############
+
+def _sourceToDirMap( infoDir: str, fastInfoDir: str ) -> dict[str, str]:
+    return { 'info' : infoDir or absolutePathLocator( INFO_DIR ),
+             'fastInfo' : fastInfoDir or absolutePathLocator( FAST_INFO_DIR ) }
+
+
+def _canStore( value: Any, valueType: type ) -> bool:
+    if valueType is float:
+        # JSON numbers without a decimal point load as ints. Keep those in
+        # the JSON, so the table never changes a value's type.
+        return type( value ) is float
+    if valueType is int:
+        return type( value ) is int and -2**63 <= value < 2**63
+    return type( value ) is valueType
+
+
+def buildFundamentalsTable( tickers: Optional[list[str]] = None,
+                            tablePath: str = '',
+                            infoDir: str = '',
+                            fastInfoDir: str = '' ) -> int:
+    '''
+    Build the table from the info and fast_info JSONs, and return
+    the number of tickers in it.
+
+    Keyword arguments:
+       tickers     -- Tickers to include. Defaults to every ticker with an
+                      info or fast_info JSON.
+       tablePath   -- Where to write the table. Defaults to TABLE_PATH.
+       infoDir, fastInfoDir -- Where to read the JSONs from.
+    '''
+    tablePath = tablePath or absolutePathLocator( TABLE_PATH )
+    sourceToDirMap = _sourceToDirMap( infoDir, fastInfoDir )
+    if tickers is None:
+        tickerSet: set[str] = set()
+        for directory in sourceToDirMap.values():
+            if os.path.isdir( directory ):
+                tickerSet.update( f[:-5] for f in os.listdir( directory ) if f.endswith( '.json' ) )
+        tickers = list( tickerSet )
+    tickers = sorted( tickers )
+
+    arrays: dict[str, np.ndarray] = { 'tickers' : np.array( tickers, dtype=np.str_ ) }
+    for source, columns in SOURCE_TO_COLUMNS_MAP.items():
+        paths = [ os.path.join( sourceToDirMap[ source ], '%s.json' % ticker ) for ticker in tickers ]
+        mtimes, dicts = NpzTable.readSourceFiles( paths, loadJson, ( OSError, ValueError ) )
+        values: dict[str, list] = { c : [] for c in columns }
+        states = { c : np.full( len( tickers ), ABSENT, dtype=np.int8 ) for c in columns }
+        for row, d in enumerate( dicts ):
+            d = d if d is not None else {}
+            for column, valueType in columns.items():
+                value = TYPE_TO_EMPTY_VALUE_MAP[ valueType ]
+                if column in d:
+                    if _canStore( d[ column ], valueType ):
+                        value = d[ column ]
+                        states[ column ][ row ] = STORED
+                    else:
+                        states[ column ][ row ] = NOT_STORED
+                values[ column ].append( value )
+
+        arrays[ '%s-mtimes' % source ] = mtimes
+        for column, valueType in columns.items():
+            arrays[ '%s-%s' % ( source, column ) ] = np.array( values[ column ],
+                                                               dtype=TYPE_TO_DTYPE_MAP[ valueType ] )
+            arrays[ '%s-%s-states' % ( source, column ) ] = states[ column ]
+    NpzTable.writeTable( tablePath, arrays )
+    return len( tickers )
+
+
+class TableBackedDict( Mapping[str, Any] ):
+    '''
+    Read-only view of a ticker's info or fast_info dict. Fields in the
+    table are read from it, and anything else from the full JSON,
+    which is only loaded the first time it's needed.
+    '''
+    def __init__( self,
+                  tableValues: dict[str, Any],
+                  absentKeys: set[str],
+                  loadFullDict: Callable[[], dict] ) -> None:
+        self.tableValues = tableValues
+        self.absentKeys = absentKeys
+        self.loadFullDict = loadFullDict
+
+    @cached_property
+    def fullDict( self ) -> dict:
+        return self.loadFullDict()
+
+    def __getitem__( self, key: str ) -> Any:
+        if key in self.tableValues:
+            return self.tableValues[ key ]
+        if key in self.absentKeys:
+            raise KeyError( key )
+        return self.fullDict[ key ]
+
+    def __contains__( self, key: object ) -> bool:
+        if key in self.tableValues:
+            return True
+        if key in self.absentKeys:
+            return False
+        return key in self.fullDict
+
+    def __iter__( self ) -> Iterator[str]:
+        return iter( self.fullDict )
+
+    def __len__( self ) -> int:
+        return len( self.fullDict )
+
+
+def loadJson( path: str ) -> dict:
+    with open( path, 'r' ) as f:
+        d: dict = json.load( f )
+    return d
+
+
+class FundamentalsTable( NpzTable.NpzTable ):
+    '''
+    Read-only view of the table built by buildFundamentalsTable().
+    The whole table is read the first time it's used.
+    '''
+    def __init__( self, tablePath: str = '', infoDir: str = '', fastInfoDir: str = '' ) -> None:
+        '''
+        Keyword arguments:
+           tablePath            -- The table's file. Defaults to TABLE_PATH.
+           infoDir, fastInfoDir -- Where the JSONs the table was built from are.
+        '''
+        super().__init__( tablePath or absolutePathLocator( TABLE_PATH ) )
+        self.sourceToDirMap = _sourceToDirMap( infoDir, fastInfoDir )
+
+    def _dict( self, source: str, ticker: str ) -> Optional[TableBackedDict]:
+        '''
+        Return the ticker's dict for the source, or None if the table
+        doesn't have the ticker or its JSON changed after the table was built.
+        '''
+        row = self.tickerToRowMap.get( ticker )
+        if row is None:
+            return None
+        path = os.path.join( self.sourceToDirMap[ source ], '%s.json' % ticker )
+        if not self.rowMatchesFile( row, '%s-mtimes' % source, path ):
+            return None
+
+        values = {}
+        absentKeys = set()
+        for column, valueType in SOURCE_TO_COLUMNS_MAP[ source ].items():
+            state = self.arrays[ '%s-%s-states' % ( source, column ) ][ row ]
+            if state == STORED:
+                # Convert from the NumPy scalar to the type json.load() gives.
+                values[ column ] = valueType( self.arrays[ '%s-%s' % ( source, column ) ][ row ] )
+            elif state == ABSENT:
+                absentKeys.add( column )
+        return TableBackedDict( values, absentKeys, lambda: loadJson( path ) )
+
+    def info( self, ticker: str ) -> Optional[TableBackedDict]:
+        return self._dict( 'info', ticker )
+
+    def fastInfo( self, ticker: str ) -> Optional[TableBackedDict]:
+        return self._dict( 'fastInfo', ticker )
+
+
+def getSharedTable() -> FundamentalsTable:
+    '''
+    Returns the table Stock.info and Stock.fastInfo read from.
+    '''
+    return NpzTable.sharedTable( FundamentalsTable, absolutePathLocator( TABLE_PATH ) )
+
+
+############
+# main()
+############
+def main() -> None:
+    nTickers = buildFundamentalsTable()
+    print( "Built a fundamentals table with %d tickers in %s" % \
+           ( nTickers, absolutePathLocator( TABLE_PATH ) ) )
+
+
+if __name__ == '__main__':
+    main()
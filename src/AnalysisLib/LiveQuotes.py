@@ -0,0 +1,231 @@
+#!/usr/bin/env python
+
+r"""
+Live data from Yahoo! Finance, cached with a time-to-live per field, so a
+long-running process sees new prices without rebuilding every Stock.
+
+- Each ticker's info, fast_info, latest daily bars and full history are kept
+  until their field's TTL runs out ( see FIELD_TTLS ), or until invalidate()
+  drops them.
+- refreshQuotes() downloads the latest bars of many tickers in one request.
+- patchHistory() lays a ticker's latest bars over its locally stored closing
+  prices, replacing the days they overlap, so the full history never needs
+  downloading again just to get today's close.
+- latestBars() gives just those bars, e.g. to update a MetricState with.
+
+Example:
+    >>> cache = LiveQuotes.getSharedCache()
+    >>> cache.refreshQuotes( [ 'AAPL', 'MSFT' ], start='2024-03-01' )
+    >>> cache.patchHistory( 'AAPL', History( 'AAPL' ).maxHistoryDf )
+    >>> cache.invalidate( 'AAPL' )
+"""
+
+############
+# Imports
+############
+
+from typing import Any, Callable, NamedTuple, Optional, TypeVar
+import datetime, threading, time
+
+import pandas as pd
+from pandas import DataFrame
+
+from UtilLib import RequestGovernor, TradingCalendar
+
+
+############
+# Constants
+############
+
+# Seconds each field stays fresh.
+FIELD_TTLS = {
+    'quote' : 60.0,
+    'fastInfo' : 5 * 60.0,
+    'info' : 6 * 60 * 60.0,
+    'history' : 24 * 60 * 60.0,
+}
+
+# How far back refreshQuotes() looks when it isn't given a start date.
+QUOTE_PERIOD = '5d'
+
+T = TypeVar( 'T' )
+
+
+############
+# Functions and Classes
+############
+
+class Quote( NamedTuple ):
+    # The first date the download asked for, so a later bar isn't
+    # mistaken for a gap in the data.
+    start: datetime.date
+    # A Date index and a Close column. Empty if nothing came back.
+    bars: DataFrame
+
+
+def _localDates( index: pd.Index ) -> pd.DatetimeIndex:
+    '''
+    The exchange's local dates of the bars, without time zone or time of day,
+    like the dates in the closing price files.
+    '''
+    dates = pd.DatetimeIndex( index )
+    if dates.tz is not None:
+        dates = dates.tz_localize( None )
+    return dates.normalize().rename( 'Date' )
+
+
+def _emptyBars() -> DataFrame:
+    return DataFrame( { 'Close' : [] }, index=pd.DatetimeIndex( [], name='Date' ) )
+
+
+def _request( func: Callable[..., T], *args: Any, **kwargs: Any ) -> T:
+    return RequestGovernor.getSharedGovernor().call( RequestGovernor.YAHOO_HOST, func, *args, **kwargs )
+
+
+class LiveQuoteCache:
+    def __init__( self,
+                  ttls: Optional[dict[str, float]] = None,
+                  clock: Callable[[], float] = time.monotonic ) -> None:
+        '''
+        Keyword arguments:
+           ttls  -- Seconds each field stays fresh, overriding FIELD_TTLS.
+           clock -- Returns the current time in seconds.
+        '''
+        self.ttls = { **FIELD_TTLS, **( ttls or {} ) }
+        self.clock = clock
+        self.lock = threading.Lock()
+        self.entries: dict[tuple[str, str], tuple[float, Any]] = {}
+        # The last history each ticker's bars were laid over, and the result,
+        # so the same inputs give back the very same DataFrame.
+        self.tickerToPatchMap: dict[str, tuple[DataFrame, DataFrame, DataFrame]] = {}
+        self.numHits = 0
+        self.numMisses = 0
+        self.numBatchRequests = 0
+
+    def peek( self, ticker: str, field: str ) -> Optional[Any]:
+        '''
+        Return the field's value if it's cached and still fresh, and None otherwise.
+        '''
+        with self.lock:
+            entry = self.entries.get( ( ticker, field ) )
+            if entry is None or self.clock() - entry[ 0 ] > self.ttls[ field ]:
+                return None
+            return entry[ 1 ]
+
+    def put( self, ticker: str, field: str, value: Any ) -> None:
+        with self.lock:
+            self.entries[ ( ticker, field ) ] = ( self.clock(), value )
+
+    def get( self, ticker: str, field: str, fetch: Callable[[], T] ) -> T:
+        '''
+        Return the field's cached value, calling fetch() for a new one
+        if it's missing or stale.
+        '''
+        value = self.peek( ticker, field )
+        if value is not None:
+            with self.lock:
+                self.numHits += 1
+            return value
+        with self.lock:
+            self.numMisses += 1
+        value = fetch()
+        self.put( ticker, field, value )
+        return value
+
+    def invalidate( self, ticker: Optional[str] = None, field: Optional[str] = None ) -> None:
+        '''
+        Drop the cached values of the ticker ( or every ticker ) for the field
+        ( or every field ), so the next read fetches them again.
+        '''
+        with self.lock:
+            for key in list( self.entries ):
+                if ( ticker is None or key[ 0 ] == ticker ) and ( field is None or key[ 1 ] == field ):
+                    del self.entries[ key ]
+
+    def refreshQuotes( self, tickers: list[str], start: Optional[str] = None ) -> list[str]:
+        '''
+        Download the latest daily bars of all the tickers in one request,
+        and return the tickers that got any.
+
+        Keyword arguments:
+           tickers -- The ticker symbols
+           start   -- First date to download ( 'YYYY-MM-DD' ).
+                      Defaults to the last QUOTE_PERIOD.
+        '''
+        if not tickers:
+            return []
+        # yfinance takes a while to import, so wait until live data is actually needed.
+        import yfinance as yf  # type: ignore[import-untyped]
+        period: dict[str, str] = { 'start' : start } if start else { 'period' : QUOTE_PERIOD }
+        data = _request( yf.download, tickers, group_by='ticker', ignore_tz=False,
+                         progress=False, **period )
+        with self.lock:
+            self.numBatchRequests += 1
+
+        refreshed = []
+        emptyBars = _emptyBars()
+        for ticker in tickers:
+            bars = emptyBars
+            if data is not None and ticker in data.columns.get_level_values( 0 ):
+                closes = data[ ticker ][ 'Close' ].dropna()
+                # Rounded to the cent, like the closing price files.
+                bars = DataFrame( { 'Close' : closes.to_numpy().round( 2 ) }, index=_localDates( closes.index ) )
+            if len( bars ):
+                refreshed.append( ticker )
+            # Remember when nothing came back too, so we don't keep asking.
+            quoteStart = datetime.date.fromisoformat( start ) if start \
+                         else bars.index[ 0 ].date() if len( bars ) else datetime.date.today()
+            self.put( ticker, 'quote', Quote( quoteStart, bars ) )
+        return refreshed
+
+    def latestBars( self, ticker: str, localLast: Optional[datetime.date] ) -> DataFrame:
+        '''
+        Return the ticker's latest bars ( a DataFrame with a Date index and a
+        Close column, possibly empty ). They're downloaded first if they're
+        stale, or if they'd leave a gap after localLast, the last day the
+        caller already has.
+        '''
+        quote = self.peek( ticker, 'quote' )
+        if quote is None or ( localLast is not None and quote.start > TradingCalendar.nextTradingDay( localLast ) ):
+            # Start from the last local day, so the bars always line up with it.
+            self.refreshQuotes( [ ticker ], start=localLast.isoformat() if localLast else None )
+            quote = self.peek( ticker, 'quote' )
+        return quote.bars if quote is not None else _emptyBars()
+
+    def patchHistory( self, ticker: str, localDf: DataFrame ) -> DataFrame:
+        '''
+        Return the ticker's locally stored closing prices ( a DataFrame with
+        a Date index and a Close column ) with its latest bars laid over them.
+        '''
+        localLast = localDf.index[ -1 ].date() if len( localDf ) else None
+        bars = self.latestBars( ticker, localLast )
+        if bars.empty:
+            return localDf
+
+        with self.lock:
+            patch = self.tickerToPatchMap.get( ticker )
+            if patch is not None and patch[ 0 ] is localDf and patch[ 1 ] is bars:
+                return patch[ 2 ]
+        patched = pd.concat( [ localDf.loc[ localDf.index < bars.index[ 0 ], [ 'Close' ] ], bars ] )
+        with self.lock:
+            self.tickerToPatchMap[ ticker ] = ( localDf, bars, patched )
+        return patched
+
+    def report( self ) -> str:
+        return "Live quote cache: %d hits, %d misses, %d batch requests" % \
+               ( self.numHits, self.numMisses, self.numBatchRequests )
+
+
+_sharedCache: Optional[LiveQuoteCache] = None
+_sharedCacheLock = threading.Lock()
+
+
+def getSharedCache() -> LiveQuoteCache:
+    '''
+    Returns the cache every LiveStatus reads from.
+    '''
+    global _sharedCache
+    with _sharedCacheLock:
+        if _sharedCache is None:
+            _sharedCache = LiveQuoteCache()
+        return _sharedCache
@@ -0,0 +1,283 @@
+#!/usr/bin/env python
+
+r"""
+A registry of named metrics that can be computed for a Stock,
+e.g. the columns of the Screener.
+
+Each metric declares which data sources ( inputs ) it reads and which other
+metrics it builds on ( dependencies ). When a set of metrics is evaluated for
+a stock, each input is loaded at most once, each metric is computed at most
+once, and inputs that none of the requested metrics need are never loaded.
+
+Example of adding a custom metric and using it in the Screener:
+   >>> from AnalysisLib.MetricRegistry import registerMetric
+   >>> @registerMetric( 'PctFrom200DayMA', inputs=[ 'history' ],
+   ...                  dependencies=[ 'LastClosingPrice' ] )
+   ... def pctFrom200DayMa( ctx: MetricContext ) -> float:
+   ...    ma = ctx.input( 'history' )[ 'Close' ].iloc[ -200: ].mean()
+   ...    return 100 * ( ctx[ 'LastClosingPrice' ] - ma ) / ma
+   >>> screener = Screener( columns=Screener.columns + [ 'PctFrom200DayMA' ] )
+"""
+
+############
+# Imports
+############
+
+from typing import Any, Callable, Iterable, Optional
+
+from AnalysisLib.Stock import Stock
+
+
+############
+# Constants
+############
+
+# The data sources a metric can read, and the Stock attribute that loads each one.
+INPUT_TO_STOCK_ATTRIBUTE_MAP = {
+    'history' : 'maxHistoryDf',
+    'info' : 'info',
+    'fastInfo' : 'fastInfo',
+    'dividends' : 'dividends',
+    'financials' : 'financialsDf',
+    'rollingStats' : 'rollingStats',
+    'returns' : 'returnCalculator',
+    'dividendIndex' : 'dividendIndex',
+    'metricState' : 'metricState',
+}
+
+
+############
+# Functions and Classes
+############
+
+class Metric:
+    def __init__( self,
+                  name: str,
+                  compute: Callable[['MetricContext'], Any],
+                  inputs: Iterable[str] = (),
+                  dependencies: Iterable[str] = () ) -> None:
+        '''
+        Keyword arguments:
+           name         -- Name of the metric, e.g. a Screener column title.
+           compute      -- Function that takes a MetricContext and returns the value.
+           inputs       -- Data sources the function reads with ctx.input().
+           dependencies -- Other metrics the function reads with ctx[ name ].
+        '''
+        self.name = name
+        self.compute = compute
+        self.inputs = tuple( inputs )
+        self.dependencies = tuple( dependencies )
+        for inputName in self.inputs:
+            if inputName not in INPUT_TO_STOCK_ATTRIBUTE_MAP:
+                raise ValueError( "Unknown input '%s' for metric %s" % ( inputName, name ) )
+
+
+class MetricRegistry:
+    def __init__( self ) -> None:
+        self.metrics: dict[str, Metric] = {}
+
+    def __contains__( self, name: str ) -> bool:
+        return name in self.metrics
+
+    def add( self, metric: Metric, replace: bool = False ) -> None:
+        if metric.name in self.metrics and not replace:
+            raise ValueError( "Metric %s is already registered" % metric.name )
+        self.metrics[ metric.name ] = metric
+
+    def register( self,
+                  name: str,
+                  inputs: Iterable[str] = (),
+                  dependencies: Iterable[str] = (),
+                  replace: bool = False ) -> Callable:
+        '''
+        Decorator that registers the function as the metric's compute function.
+        '''
+        def decorator( compute: Callable[['MetricContext'], Any] ) -> Callable:
+            self.add( Metric( name, compute, inputs, dependencies ), replace )
+            return compute
+        return decorator
+
+    def requiredMetrics( self, names: Iterable[str], knownNames: Iterable[str] = () ) -> set[str]:
+        '''
+        Return the metrics and every metric they depend on, directly or not.
+        Metrics in knownNames are already computed, so their dependencies
+        aren't needed.
+        '''
+        knownNames = set( knownNames )
+        required: set[str] = set()
+        toVisit = list( names )
+        while toVisit:
+            name = toVisit.pop()
+            if name in required or name in knownNames:
+                continue
+            required.add( name )
+            toVisit.extend( self.metrics[ name ].dependencies )
+        return required
+
+    def requiredInputs( self, names: Iterable[str], knownNames: Iterable[str] = () ) -> set[str]:
+        '''
+        Return every input needed by the metrics, including the ones
+        needed by their dependencies. Metrics in knownNames are already
+        computed, so their inputs aren't needed.
+        '''
+        inputs: set[str] = set()
+        for name in self.requiredMetrics( names, knownNames ):
+            inputs.update( self.metrics[ name ].inputs )
+        return inputs
+
+    def evaluate( self,
+                  stock: Stock,
+                  names: Iterable[str],
+                  knownValues: Optional[dict[str, Any]] = None ) -> dict[str, Any]:
+        '''
+        Compute the metrics for the stock. Any exception raised while
+        computing a metric propagates to the caller.
+
+        knownValues holds metric values that were already computed elsewhere,
+        e.g. for many stocks at once. They're used as-is.
+        '''
+        names = list( names )
+        knownValues = knownValues or {}
+        ctx = MetricContext( self, stock, self.requiredInputs( names, knownValues ) )
+        ctx.values.update( knownValues )
+        return { name : ctx[ name ] for name in names }
+
+
+class MetricContext:
+    '''
+    Gives a metric's compute function access to the stock's inputs
+    and to the values of other metrics, loading and computing each
+    of them only once.
+    '''
+    def __init__( self, registry: MetricRegistry, stock: Stock, allowedInputs: set[str] ) -> None:
+        self.registry = registry
+        self.stock = stock
+        self.allowedInputs = allowedInputs
+        self.inputs: dict[str, Any] = {}
+        self.values: dict[str, Any] = {}
+
+    def input( self, name: str ) -> Any:
+        if name not in self.allowedInputs:
+            raise ValueError( "Input '%s' was not declared by the metrics being evaluated" % name )
+        if name not in self.inputs:
+            self.inputs[ name ] = getattr( self.stock, INPUT_TO_STOCK_ATTRIBUTE_MAP[ name ] )
+        return self.inputs[ name ]
+
+    def __getitem__( self, name: str ) -> Any:
+        if name not in self.values:
+            self.values[ name ] = self.registry.metrics[ name ].compute( self )
+        return self.values[ name ]
+
+
+defaultRegistry = MetricRegistry()
+registerMetric = defaultRegistry.register
+
+
+############
+# Built-in Metrics
+############
+# These give the same values as the corresponding Stock properties and methods,
+# but share intermediate results like the last closing price.
+
+@registerMetric( 'Close', inputs=[ 'history' ] )
+def close( ctx: MetricContext ) -> Any:
+    return ctx.input( 'history' )[ 'Close' ]
+
+@registerMetric( 'LastClosingPrice', dependencies=[ 'Close' ] )
+def lastClosingPrice( ctx: MetricContext ) -> float:
+    return ctx[ 'Close' ].iloc[ -1 ]
+
+@registerMetric( 'AllTimeHigh', dependencies=[ 'Close' ] )
+def allTimeHigh( ctx: MetricContext ) -> float:
+    return ctx[ 'Close' ].max()
+
+@registerMetric( 'PctFromATH', dependencies=[ 'LastClosingPrice', 'AllTimeHigh' ] )
+def pctFromAllTimeHigh( ctx: MetricContext ) -> float:
+    return 100 * ( ctx[ 'LastClosingPrice' ] - ctx[ 'AllTimeHigh' ] ) / ctx[ 'AllTimeHigh' ]
+
+@registerMetric( '52WkHigh', dependencies=[ 'Close' ] )
+def fiftyTwoWeekHigh( ctx: MetricContext ) -> float:
+    return ctx[ 'Close' ].iloc[ -252: ].max()
+
+@registerMetric( 'PctFrom52WkHigh', dependencies=[ 'LastClosingPrice', '52WkHigh' ] )
+def pctFrom52WeekHigh( ctx: MetricContext ) -> float:
+    high = ctx[ '52WkHigh' ]
+    return 100 * ( ctx[ 'LastClosingPrice' ] - high ) / high
+
+def _nDayReturn( ctx: MetricContext, n: int ) -> float:
+    oldPrice = ctx[ 'Close' ].iloc[ -( n + 1 ) ]
+    return 100 * ( ctx[ 'LastClosingPrice' ] - oldPrice ) / oldPrice
+
+@registerMetric( '1DayPctReturn', dependencies=[ 'Close', 'LastClosingPrice' ] )
+def oneDayReturn( ctx: MetricContext ) -> float:
+    return _nDayReturn( ctx, 1 )
+
+@registerMetric( '5DayPctReturn', dependencies=[ 'Close', 'LastClosingPrice' ] )
+def fiveDayReturn( ctx: MetricContext ) -> float:
+    return _nDayReturn( ctx, 5 )
+
+@registerMetric( 'LongName', inputs=[ 'info' ] )
+def longName( ctx: MetricContext ) -> str:
+    return ctx.input( 'info' )[ 'longName' ]
+
+@registerMetric( 'Sector', inputs=[ 'info' ] )
+def sector( ctx: MetricContext ) -> str:
+    return ctx.input( 'info' )[ 'sector' ]
+
+@registerMetric( 'ForwardPE', inputs=[ 'info' ] )
+def forwardPE( ctx: MetricContext ) -> float:
+    return ctx.input( 'info' )[ 'forwardPE' ]
+
+@registerMetric( 'DividendYield', inputs=[ 'info' ] )
+def dividendYield( ctx: MetricContext ) -> float:
+    # Assume that if the key doesn't exist, the value is zero.
+    return ctx.input( 'info' ).get( 'dividendYield', 0 ) * 100.0
+
+@registerMetric( 'ShortPercentOfFloat', inputs=[ 'info' ] )
+def shortPercentOfFloat( ctx: MetricContext ) -> float:
+    # Assume that if the key doesn't exist, the value is zero.
+    return ctx.input( 'info' ).get( 'shortPercentOfFloat', 0 ) * 100.0
+
+@registerMetric( 'MarketCap', inputs=[ 'fastInfo' ] )
+def marketCap( ctx: MetricContext ) -> str:
+    return '%.2e' % ctx.input( 'fastInfo' )[ 'marketCap' ]
+
+def _movingAverageMetric( n: int ) -> Metric:
+    # The windows share the rolling stats' one pass over the history.
+    return Metric( '%dDayMA' % n, lambda ctx: ctx.input( 'rollingStats' ).latest( 'mean', n ),
+                   inputs=[ 'rollingStats' ] )
+
+for _n in ( 20, 50, 100, 200 ):
+    defaultRegistry.add( _movingAverageMetric( _n ) )
+
+@registerMetric( 'YTDPctReturn', inputs=[ 'returns' ] )
+def ytdReturn( ctx: MetricContext ) -> float:
+    return float( ctx.input( 'returns' ).ytdReturn()[ 0 ] )
+
+def _nYearReturnMetric( n: int ) -> Metric:
+    return Metric( '%dYrPctReturn' % n, lambda ctx: float( ctx.input( 'returns' ).nYearReturn( n )[ 0 ] ),
+                   inputs=[ 'returns' ] )
+
+for _n in ( 1, 3, 5 ):
+    defaultRegistry.add( _nYearReturnMetric( _n ) )
+
+@registerMetric( 'TTMDividends', inputs=[ 'dividendIndex' ] )
+def trailingDividends( ctx: MetricContext ) -> float:
+    return float( ctx.input( 'dividendIndex' ).trailingTotal()[ 0 ] )
+
+@registerMetric( 'TTMDividendYield', dependencies=[ 'TTMDividends', 'LastClosingPrice' ] )
+def trailingDividendYield( ctx: MetricContext ) -> float:
+    # Computed from the dividends actually paid, unlike DividendYield.
+    return 100 * ctx[ 'TTMDividends' ] / ctx[ 'LastClosingPrice' ]
+
+@registerMetric( 'TTMDividendPayouts', inputs=[ 'dividendIndex' ] )
+def trailingDividendPayouts( ctx: MetricContext ) -> int:
+    return int( ctx.input( 'dividendIndex' ).payoutCount()[ 0 ] )
+
+def _dividendGrowthMetric( n: int ) -> Metric:
+    return Metric( '%dYrDividendGrowth' % n,
+                   lambda ctx: float( ctx.input( 'dividendIndex' ).growthRate( n )[ 0 ] ),
+                   inputs=[ 'dividendIndex' ] )
+
+for _n in ( 1, 5 ):
+    defaultRegistry.add( _dividendGrowthMetric( _n ) )
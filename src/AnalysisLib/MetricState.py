@@ -0,0 +1,461 @@
+#!/usr/bin/env python
+
+r"""
+A ticker's price metrics ( last close, all-time and n-day highs and lows,
+moving averages, n-day returns ) kept up-to-date one bar at a time, so a new
+bar costs O(1) work instead of a pass over the whole history.
+
+- All-time highs and lows are running maxima and minima.
+- n-day highs and lows each keep a monotonic deque of the bars that could
+  still become the window's extreme, so the front is always the answer.
+- Moving averages each keep a ring buffer of the window's closes and their
+  running sum. The sum is recomputed from the buffer every time it wraps
+  around, so rounding errors can't pile up.
+- n-day returns read the close n bars back from a short buffer.
+
+The last bar is kept apart from the others until a newer one arrives, so
+while a day is still trading, its bar can be revised as often as needed.
+Bars older than the last one can't be changed; rebuild the state for that.
+
+A state can be checkpointed to data/ProcessedData/MetricStates, and picked
+up from there later, as long as the closing prices haven't changed since.
+
+Every value matches the corresponding Stock method on the same closing prices.
+
+Example:
+   >>> state = MetricState.fromArrays( 'AAPL', dates, closes )
+   >>> writeCheckpoint( state )
+   >>> state = readCheckpoint( 'AAPL' )
+   >>> state.update( '2024-03-08', 170.73 )        # Today, so far
+   >>> state.update( '2024-03-08', 170.12 )        # Revised
+   >>> state.pctFromNDayHigh( 252 ), state.nDayMovingAverage( 200 )
+"""
+
+############
+# Imports
+############
+
+from typing import Any, Optional, Sequence
+from collections import deque
+import json, math, os
+
+import numpy as np
+from numpy.typing import ArrayLike
+
+from UtilLib import PriceStore
+from UtilLib.Util import absolutePathLocator
+
+
+############
+# Constants
+############
+
+CHECKPOINT_DIR = 'data/ProcessedData/MetricStates'
+
+# What the Screener's columns need.
+DEFAULT_HIGH_LOW_WINDOWS = ( 252, )
+DEFAULT_MOVING_AVERAGE_WINDOWS = ( 20, 50, 100, 200 )
+DEFAULT_RETURN_DAYS = ( 1, 5 )
+
+# Bump when the checkpoint layout changes, so old ones are rebuilt.
+CHECKPOINT_VERSION = 1
+
+
+############
+# Functions and Classes
+############
+
+def _day( date: Any ) -> str:
+    '''
+    The date as 'YYYY-MM-DD', dropping any time of day.
+    '''
+    return str( np.datetime64( date, 'D' ) )
+
+
+class _WindowExtreme:
+    '''
+    The max ( or min ) of the last `size` values pushed, skipping NaN.
+    Holds the values that are bigger ( or smaller ) than every value pushed
+    after them, oldest first, with their positions.
+    '''
+    def __init__( self, size: int, isMax: bool ) -> None:
+        self.size = size
+        self.isMax = isMax
+        self.entries: deque[tuple[int, float]] = deque()
+
+    def push( self, position: int, value: float ) -> None:
+        if self.size <= 0:
+            return
+        if not math.isnan( value ):
+            entries = self.entries
+            if self.isMax:
+                while entries and entries[ -1 ][ 1 ] <= value:
+                    entries.pop()
+            else:
+                while entries and entries[ -1 ][ 1 ] >= value:
+                    entries.pop()
+            entries.append( ( position, value ) )
+        while self.entries and self.entries[ 0 ][ 0 ] <= position - self.size:
+            self.entries.popleft()
+
+    @property
+    def value( self ) -> float:
+        return self.entries[ 0 ][ 1 ] if self.entries else math.nan
+
+
+class _WindowSum:
+    '''
+    The sum of the last `size` values pushed, and how many of them are NaN,
+    in a ring buffer.
+    '''
+    def __init__( self, size: int ) -> None:
+        self.size = size
+        self.values: list[float] = []
+        # Where the next value goes once the buffer is full.
+        self.position = 0
+        self.total = 0.0
+        self.numNaN = 0
+
+    def push( self, value: float ) -> None:
+        if self.size <= 0:
+            return
+        if len( self.values ) < self.size:
+            self.values.append( value )
+        else:
+            old = self.values[ self.position ]
+            if math.isnan( old ):
+                self.numNaN -= 1
+            else:
+                self.total -= old
+            self.values[ self.position ] = value
+            self.position = ( self.position + 1 ) % self.size
+        if math.isnan( value ):
+            self.numNaN += 1
+        else:
+            self.total += value
+        if self.position == 0 and len( self.values ) == self.size:
+            # Once per trip around the buffer, so it's still O(1) per value.
+            self.total = math.fsum( v for v in self.values if not math.isnan( v ) )
+
+
+class MetricState:
+    def __init__( self,
+                  ticker: str,
+                  highLowWindows: Sequence[int] = DEFAULT_HIGH_LOW_WINDOWS,
+                  movingAverageWindows: Sequence[int] = DEFAULT_MOVING_AVERAGE_WINDOWS,
+                  returnDays: Sequence[int] = DEFAULT_RETURN_DAYS ) -> None:
+        '''
+        An empty state. Add bars with update(), or build one from a whole
+        history with fromArrays().
+
+        Keyword arguments:
+           ticker               -- The ticker symbol
+           highLowWindows       -- The n of every nDayHigh( n ) and nDayLow( n ) to keep
+           movingAverageWindows -- The n of every nDayMovingAverage( n ) to keep
+           returnDays           -- The n of every nDayReturn( n ) to keep
+        '''
+        for n in [ *highLowWindows, *movingAverageWindows, *returnDays ]:
+            if n < 1:
+                raise ValueError( "A window must hold at least 1 bar, not %d" % n )
+        self.ticker = ticker
+        self.highLowWindows = tuple( sorted( set( highLowWindows ) ) )
+        self.movingAverageWindows = tuple( sorted( set( movingAverageWindows ) ) )
+        self.returnDays = tuple( sorted( set( returnDays ) ) )
+
+        self.numBars = 0
+        # The last bar, which update() can still revise. None before the first one.
+        self.lastDate: Optional[str] = None
+        self.lastClose = math.nan
+
+        # Everything below covers the bars before the last one. A window of
+        # n bars is the last bar and the n - 1 before it.
+        self.earlierHigh = math.nan
+        self.earlierLow = math.nan
+        self.highs = { n : _WindowExtreme( n - 1, isMax=True ) for n in self.highLowWindows }
+        self.lows = { n : _WindowExtreme( n - 1, isMax=False ) for n in self.highLowWindows }
+        self.sums = { n : _WindowSum( n - 1 ) for n in self.movingAverageWindows }
+        self.recentCloses: deque[float] = deque( maxlen=max( self.returnDays, default=0 ) )
+
+    def __len__( self ) -> int:
+        return self.numBars
+
+    @property
+    def _numEarlierBars( self ) -> int:
+        return self.numBars - ( self.lastDate is not None )
+
+    def _settle( self ) -> None:
+        '''
+        Add the last bar to the earlier ones, before a newer bar arrives.
+        '''
+        position = self._numEarlierBars
+        close = self.lastClose
+        self.earlierHigh = float( np.fmax( self.earlierHigh, close ) )
+        self.earlierLow = float( np.fmin( self.earlierLow, close ) )
+        for window in self.highs.values():
+            window.push( position, close )
+        for window in self.lows.values():
+            window.push( position, close )
+        for windowSum in self.sums.values():
+            windowSum.push( close )
+        self.recentCloses.append( close )
+
+    def update( self, date: Any, close: float ) -> None:
+        '''
+        Add a bar, or revise the last bar if it's for the same date.
+        Raises ValueError for a date before the last bar's.
+
+        Keyword arguments:
+           date  -- Anything np.datetime64() accepts, e.g. 'YYYY-MM-DD'
+           close -- The closing price, or the latest price of a day still trading
+        '''
+        day = _day( date )
+        close = float( close )
+        if self.lastDate is not None:
+            if day < self.lastDate:
+                raise ValueError( "Can't add a bar for %s to %s's metrics, which go up to %s" % \
+                                  ( day, self.ticker, self.lastDate ) )
+            if day == self.lastDate:
+                self.lastClose = close
+                return
+            self._settle()
+        self.lastDate = day
+        self.lastClose = close
+        self.numBars += 1
+
+    def appendBars( self, dates: ArrayLike, closes: ArrayLike ) -> int:
+        '''
+        update() with every bar from the last bar's date on, oldest first.
+        Earlier bars are skipped. Returns how many bars were used.
+        '''
+        days = np.asarray( dates ).astype( 'datetime64[D]' )
+        closes = np.asarray( closes, dtype=np.float64 )
+        if self.lastDate is not None:
+            keep = days >= np.datetime64( self.lastDate )
+            days, closes = days[ keep ], closes[ keep ]
+        for day, close in zip( days.tolist(), closes.tolist() ):
+            self.update( day, close )
+        return len( days )
+
+    @classmethod
+    def fromArrays( cls,
+                    ticker: str,
+                    dates: ArrayLike,
+                    closes: ArrayLike,
+                    highLowWindows: Sequence[int] = DEFAULT_HIGH_LOW_WINDOWS,
+                    movingAverageWindows: Sequence[int] = DEFAULT_MOVING_AVERAGE_WINDOWS,
+                    returnDays: Sequence[int] = DEFAULT_RETURN_DAYS ) -> 'MetricState':
+        '''
+        Build the state of a whole history ( dates and closes, oldest first )
+        with array operations, instead of adding its bars one by one.
+        '''
+        state = cls( ticker, highLowWindows, movingAverageWindows, returnDays )
+        days = np.asarray( dates ).astype( 'datetime64[D]' )
+        closes = np.asarray( closes, dtype=np.float64 )
+        if len( days ) != len( closes ):
+            raise ValueError( "Mismatched date and price arrays for %s" % ticker )
+        if not len( days ):
+            return state
+
+        state.numBars = len( closes )
+        state.lastDate = str( days[ -1 ] )
+        state.lastClose = float( closes[ -1 ] )
+        earlier = closes[ :-1 ]
+        if len( earlier ):
+            # np.fmax.reduce() skips NaN, and gives NaN if they're all NaN.
+            state.earlierHigh = float( np.fmax.reduce( earlier ) )
+            state.earlierLow = float( np.fmin.reduce( earlier ) )
+
+        for n in state.highLowWindows:
+            # The deques hold the values that beat every later one in the window.
+            start = max( 0, len( earlier ) - ( n - 1 ) )
+            window = earlier[ start: ]
+            for extreme, ufunc, beats in ( ( state.highs[ n ], np.fmax, np.greater ),
+                                           ( state.lows[ n ], np.fmin, np.less ) ):
+                later = np.full( len( window ), np.nan )
+                later[ :-1 ] = ufunc.accumulate( window[ ::-1 ] )[ ::-1 ][ 1: ]
+                keep = ~np.isnan( window ) & ( np.isnan( later ) | beats( window, later ) )
+                positions = np.flatnonzero( keep ) + start
+                extreme.entries.extend( zip( positions.tolist(), window[ keep ].tolist() ) )
+
+        for n in state.movingAverageWindows:
+            # Oldest first, so the ring buffer starts over at position 0.
+            windowSum = state.sums[ n ]
+            windowSum.values = earlier[ max( 0, len( earlier ) - ( n - 1 ) ): ].tolist()
+            windowSum.total = math.fsum( v for v in windowSum.values if not math.isnan( v ) )
+            windowSum.numNaN = sum( math.isnan( v ) for v in windowSum.values )
+
+        if state.recentCloses.maxlen:
+            state.recentCloses.extend( earlier[ -state.recentCloses.maxlen: ].tolist() )
+        return state
+
+    ##### Metrics #####
+    def _checkWindow( self, n: int, windows: Sequence[int], what: str ) -> None:
+        if n not in windows:
+            raise ValueError( "%s's metric state doesn't keep %d-day %s. It keeps %s" % \
+                              ( self.ticker, n, what, ", ".join( map( str, windows ) ) or 'none' ) )
+
+    @property
+    def lastClosingPrice( self ) -> float:
+        if self.lastDate is None:
+            raise IndexError( "%s has no closing prices" % self.ticker )
+        return self.lastClose
+
+    @property
+    def allTimeHigh( self ) -> float:
+        return float( np.fmax( self.earlierHigh, self.lastClose ) )
+
+    @property
+    def allTimeLow( self ) -> float:
+        return float( np.fmin( self.earlierLow, self.lastClose ) )
+
+    @property
+    def pctFromAllTimeHigh( self ) -> float:
+        return 100 * ( self.lastClosingPrice - self.allTimeHigh ) / self.allTimeHigh
+
+    def nDayHigh( self, n: int ) -> float:
+        '''
+        The max of the last n closes ( all of them if there are fewer ), skipping NaN.
+        '''
+        self._checkWindow( n, self.highLowWindows, 'highs' )
+        return float( np.fmax( self.highs[ n ].value, self.lastClose ) )
+
+    def nDayLow( self, n: int ) -> float:
+        self._checkWindow( n, self.highLowWindows, 'lows' )
+        return float( np.fmin( self.lows[ n ].value, self.lastClose ) )
+
+    def pctFromNDayHigh( self, n: int ) -> float:
+        high = self.nDayHigh( n )
+        return 100 * ( self.lastClosingPrice - high ) / high
+
+    def pctFromNDayLow( self, n: int ) -> float:
+        low = self.nDayLow( n )
+        return 100 * ( self.lastClosingPrice - low ) / low
+
+    def movingAverage( self, n: int ) -> float:
+        '''
+        The mean of the last n closes. NaN if there are fewer, or any of them is NaN.
+        '''
+        self._checkWindow( n, self.movingAverageWindows, 'moving averages' )
+        windowSum = self.sums[ n ]
+        if self.numBars < n or windowSum.numNaN or math.isnan( self.lastClose ):
+            return math.nan
+        return ( windowSum.total + self.lastClose ) / n
+
+    def nDayMovingAverage( self, n: int ) -> Optional[float]:
+        '''
+        Like movingAverage(), but None if the history isn't long enough, like Stock's.
+        '''
+        value = self.movingAverage( n )
+        return None if self.numBars < n else value
+
+    def nDayReturn( self, n: int ) -> float:
+        '''
+        Percent return since the close n bars before the last one.
+        Raises IndexError if the history isn't that long.
+        '''
+        self._checkWindow( n, self.returnDays, 'returns' )
+        if self.numBars < n + 1:
+            raise IndexError( "%s has %d closing prices, too few for a %d-day return" % \
+                              ( self.ticker, self.numBars, n ) )
+        oldPrice = self.recentCloses[ -n ]
+        return 100 * ( self.lastClose - oldPrice ) / oldPrice
+
+    ##### Checkpoints #####
+    def toDict( self ) -> dict[str, Any]:
+        return {
+            'version' : CHECKPOINT_VERSION,
+            'ticker' : self.ticker,
+            'highLowWindows' : list( self.highLowWindows ),
+            'movingAverageWindows' : list( self.movingAverageWindows ),
+            'returnDays' : list( self.returnDays ),
+            'numBars' : self.numBars,
+            'lastDate' : self.lastDate,
+            'lastClose' : self.lastClose,
+            'earlierHigh' : self.earlierHigh,
+            'earlierLow' : self.earlierLow,
+            'highs' : { str( n ) : list( w.entries ) for n, w in self.highs.items() },
+            'lows' : { str( n ) : list( w.entries ) for n, w in self.lows.items() },
+            'sums' : { str( n ) : [ s.values, s.position ] for n, s in self.sums.items() },
+            'recentCloses' : list( self.recentCloses ),
+        }
+
+    @classmethod
+    def fromDict( cls, d: dict[str, Any] ) -> 'MetricState':
+        if d.get( 'version' ) != CHECKPOINT_VERSION:
+            raise ValueError( "Unsupported metric state version %s" % d.get( 'version' ) )
+        state = cls( d[ 'ticker' ], d[ 'highLowWindows' ], d[ 'movingAverageWindows' ], d[ 'returnDays' ] )
+        state.numBars = d[ 'numBars' ]
+        state.lastDate = d[ 'lastDate' ]
+        state.lastClose = d[ 'lastClose' ]
+        state.earlierHigh = d[ 'earlierHigh' ]
+        state.earlierLow = d[ 'earlierLow' ]
+        for n in state.highLowWindows:
+            state.highs[ n ].entries.extend( ( p, v ) for p, v in d[ 'highs' ][ str( n ) ] )
+            state.lows[ n ].entries.extend( ( p, v ) for p, v in d[ 'lows' ][ str( n ) ] )
+        for n in state.movingAverageWindows:
+            windowSum = state.sums[ n ]
+            windowSum.values, windowSum.position = d[ 'sums' ][ str( n ) ]
+            windowSum.total = math.fsum( v for v in windowSum.values if not math.isnan( v ) )
+            windowSum.numNaN = sum( math.isnan( v ) for v in windowSum.values )
+        state.recentCloses.extend( d[ 'recentCloses' ] )
+        return state
+
+    def keeps( self,
+               highLowWindows: Sequence[int] = (),
+               movingAverageWindows: Sequence[int] = (),
+               returnDays: Sequence[int] = () ) -> bool:
+        '''
+        Returns whether the state keeps the metrics of all those windows.
+        '''
+        return set( highLowWindows ) <= set( self.highLowWindows ) \
+            and set( movingAverageWindows ) <= set( self.movingAverageWindows ) \
+            and set( returnDays ) <= set( self.returnDays )
+
+
+def checkpointPath( ticker: str, checkpointDir: str = '' ) -> str:
+    return os.path.join( checkpointDir or absolutePathLocator( CHECKPOINT_DIR ), '%s.json' % ticker )
+
+
+def writeCheckpoint( state: MetricState, checkpointDir: str = '' ) -> str:
+    '''
+    Save the state, and return the path it was saved to.
+    '''
+    path = checkpointPath( state.ticker, checkpointDir )
+    os.makedirs( os.path.dirname( path ), exist_ok=True )
+    tempPath = path[:-5] + '-tmp.json'
+    with open( tempPath, 'w' ) as f:
+        json.dump( state.toDict(), f )
+    os.replace( tempPath, path )
+    return path
+
+
+def hasFreshCheckpoint( ticker: str, checkpointDir: str = '', csvDir: str = '', npyDir: str = '' ) -> bool:
+    '''
+    Returns whether the checkpoint exists and is no older than the closing price files.
+    '''
+    try:
+        checkpointMtime = os.stat( checkpointPath( ticker, checkpointDir ) ).st_mtime
+    except FileNotFoundError:
+        return False
+    for path in ( PriceStore.csvPath( ticker, csvDir ), PriceStore.npyPaths( ticker, npyDir )[ 1 ] ):
+        try:
+            if os.stat( path ).st_mtime > checkpointMtime:
+                return False
+        except FileNotFoundError:
+            pass
+    return True
+
+
+def readCheckpoint( ticker: str, checkpointDir: str = '', csvDir: str = '', npyDir: str = '' ) -> Optional[MetricState]:
+    '''
+    Return the ticker's checkpointed state, or None if there's no checkpoint,
+    or the closing prices changed after it was written.
+    '''
+    if not hasFreshCheckpoint( ticker, checkpointDir, csvDir, npyDir ):
+        return None
+    try:
+        with open( checkpointPath( ticker, checkpointDir ), 'r' ) as f:
+            return MetricState.fromDict( json.load( f ) )
+    except ( OSError, ValueError, KeyError, TypeError ):
+        # A corrupt or outdated checkpoint; the closing prices are still good.
+        return None
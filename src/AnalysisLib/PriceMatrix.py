@@ -0,0 +1,117 @@
+#!/usr/bin/env python
+
+r"""
+Price metrics for a whole universe of tickers, computed with array
+operations instead of one Stock at a time.
+
+The closing prices are aligned on each ticker's most recent close: row -1 of
+the matrix holds every ticker's last close, row -2 the close before that, and
+so on, with NaN padding above shorter histories. This matches how the Stock
+methods index the history positionally ( e.g. iloc[ -n: ] ), so the values
+are identical to calling those methods one stock at a time.
+"""
+
+############
+# Imports
+############
+
+from functools import cached_property
+
+import numpy as np
+
+
+############
+# PriceMatrix
+############
+
+class PriceMatrix:
+    def __init__( self, closes: list[np.ndarray], depth: int = 253 ) -> None:
+        '''
+        Keyword arguments:
+           closes -- One array of closing prices per ticker, oldest first.
+           depth  -- How many trailing closes to keep in the aligned matrix.
+                     nDayHigh( n ) etc. need depth >= n, and nDayReturn( n )
+                     needs depth >= n + 1.
+        '''
+        self.depth = depth
+        self.lengths = np.array( [ len( c ) for c in closes ], dtype=np.int64 )
+
+        # Right-align the tail of every history.
+        self.values = np.full( ( depth, len( closes ) ), np.nan )
+        for column, close in enumerate( closes ):
+            k = min( len( close ), depth )
+            if k:
+                self.values[ depth - k:, column ] = close[ -k: ]
+
+        # Keep the full histories back to back for the all-time metrics.
+        self._flat = np.concatenate( closes ) if closes else np.array( [] )
+        self._starts = np.concatenate( ( [ 0 ], np.cumsum( self.lengths )[ :-1 ] ) ).astype( np.int64 )
+
+    def __len__( self ) -> int:
+        return len( self.lengths )
+
+    def hasAtLeast( self, nCloses: int ) -> np.ndarray:
+        '''
+        Boolean mask of the tickers with at least nCloses closing prices.
+        '''
+        return self.lengths >= nCloses
+
+    def _reduceHistories( self, ufunc: np.ufunc ) -> np.ndarray:
+        # np.fmax/np.fmin skip NaN like pandas' max()/min() do.
+        # reduceat can't reduce empty histories, so leave those as NaN.
+        result = np.full( len( self ), np.nan )
+        nonEmpty = self.lengths > 0
+        if nonEmpty.any():
+            result[ nonEmpty ] = ufunc.reduceat( self._flat, self._starts[ nonEmpty ] )
+        return result
+
+    def _checkDepth( self, n: int ) -> None:
+        if n > self.depth:
+            raise ValueError( "PriceMatrix only holds the last %d closes, "
+                              "but %d were needed" % ( self.depth, n ) )
+
+    ##### Basic Price Metrics #####
+    @cached_property
+    def allTimeHigh( self ) -> np.ndarray:
+        return self._reduceHistories( np.fmax )
+
+    @cached_property
+    def allTimeLow( self ) -> np.ndarray:
+        return self._reduceHistories( np.fmin )
+
+    @property
+    def lastClosingPrice( self ) -> np.ndarray:
+        return self.values[ -1 ]
+
+    @property
+    def pctFromAllTimeHigh( self ) -> np.ndarray:
+        with np.errstate( divide='ignore', invalid='ignore' ):
+            return 100 * ( self.lastClosingPrice - self.allTimeHigh ) / self.allTimeHigh
+
+    ##### Intermediate Price Metrics #####
+    def nDayHigh( self, n: int ) -> np.ndarray:
+        self._checkDepth( n )
+        return np.fmax.reduce( self.values[ -n: ], axis=0 )
+
+    def nDayLow( self, n: int ) -> np.ndarray:
+        self._checkDepth( n )
+        return np.fmin.reduce( self.values[ -n: ], axis=0 )
+
+    def pctFromNDayHigh( self, n: int ) -> np.ndarray:
+        high = self.nDayHigh( n )
+        with np.errstate( divide='ignore', invalid='ignore' ):
+            return 100 * ( self.lastClosingPrice - high ) / high
+
+    def pctFromNDayLow( self, n: int ) -> np.ndarray:
+        low = self.nDayLow( n )
+        with np.errstate( divide='ignore', invalid='ignore' ):
+            return 100 * ( self.lastClosingPrice - low ) / low
+
+    def nDayReturn( self, n: int ) -> np.ndarray:
+        '''
+        Only meaningful for tickers where hasAtLeast( n + 1 ) is True.
+        '''
+        self._checkDepth( n + 1 )
+        oldPrice = self.values[ -( n + 1 ) ]
+        with np.errstate( divide='ignore', invalid='ignore' ):
+            return 100 * ( self.lastClosingPrice - oldPrice ) / oldPrice
@@ -0,0 +1,214 @@
+#!/usr/bin/env python
+
+r"""
+A single memory-mapped panel of closing prices for the whole universe.
+
+The panel lives in data/ProcessedData/PricePanel:
+   - dates.npy: the sorted trading dates of every ticker combined (datetime64[D]).
+   - close.npy: a float64 matrix with one row per date and one column
+                per ticker. Dates a ticker has no price for are NaN.
+                It's stored column-major, so each ticker's history is
+                contiguous on disk.
+   - tickers.json: the ticker of each column, in order.
+
+close.npy is opened with np.load( ..., mmap_mode='r' ), so slicing a ticker
+or a date range only reads those pages from disk, and every process that
+opens the panel shares the same pages through the OS page cache.
+
+Example:
+   >>> panel = PricePanel()
+   >>> panel.closeSeries( 'AAPL', start='2024-01-01' )
+   >>> panel.closeDf( [ 'AAPL', 'MSFT' ], start='2023-01-01', end='2023-12-31' )
+"""
+
+############
+# Imports
+############
+
+from typing import Optional
+import os, json, shutil
+from functools import cached_property
+
+import numpy as np
+import pandas as pd
+from pandas import DataFrame, Series
+
+from UtilLib import PriceStore
+from UtilLib.Util import absolutePathLocator
+
+
+############
+# Constants
+############
+
+PANEL_DIR = 'data/ProcessedData/PricePanel'
+DATES_FILENAME = 'dates.npy'
+CLOSE_FILENAME = 'close.npy'
+TICKERS_FILENAME = 'tickers.json'
+
+
+############
+# Functions and Classes
+############
+
+def buildPricePanel( tickers: Optional[list[str]] = None,
+                     panelDir: str = '',
+                     csvDir: str = '',
+                     npyDir: str = '' ) -> int:
+    '''
+    Build the panel from the per-ticker closing price files, and return
+    the number of tickers in it.
+
+    The new panel is written to a temporary directory and then swapped in,
+    so processes that already have the old panel open keep reading it.
+
+    Keyword arguments:
+       tickers  -- Tickers to include. Defaults to every ticker with a
+                   closing price CSV.
+       panelDir -- Where to write the panel. Defaults to PANEL_DIR.
+       csvDir, npyDir -- Where to read the closing prices from.
+    '''
+    panelDir = panelDir or absolutePathLocator( PANEL_DIR )
+    if tickers is None:
+        csvs = os.listdir( csvDir or absolutePathLocator( PriceStore.CSV_DIR ) )
+        tickers = [ filename[:-4] for filename in csvs if filename.endswith( '.csv' ) ]
+    tickers = sorted( tickers )
+
+    tickerDates = []
+    tickerCloses = []
+    for ticker in tickers:
+        df = PriceStore.readClosingPriceDf( ticker, csvDir, npyDir )
+        tickerDates.append( df.index.to_numpy().astype( 'datetime64[D]' ) )
+        tickerCloses.append( df[ 'Close' ].to_numpy( dtype=np.float64 ) )
+
+    if tickerDates:
+        allDates = np.unique( np.concatenate( tickerDates ) )
+    else:
+        allDates = np.array( [], dtype='datetime64[D]' )
+
+    tempDir = panelDir + '-tmp'
+    shutil.rmtree( tempDir, ignore_errors=True )
+    os.makedirs( tempDir )
+
+    np.save( os.path.join( tempDir, DATES_FILENAME ), allDates, allow_pickle=False )
+    close = np.lib.format.open_memmap( os.path.join( tempDir, CLOSE_FILENAME ), mode='w+',
+                                       dtype=np.float64,
+                                       shape=( len( allDates ), len( tickers ) ),
+                                       fortran_order=True )
+    close[:] = np.nan
+    for column, ( dates, prices ) in enumerate( zip( tickerDates, tickerCloses ) ):
+        rows = np.searchsorted( allDates, dates )
+        close[ rows, column ] = prices
+    close.flush()
+    del close
+
+    with open( os.path.join( tempDir, TICKERS_FILENAME ), 'w' ) as f:
+        json.dump( tickers, f )
+
+    # Swap the new panel into place.
+    oldDir = panelDir + '-old'
+    shutil.rmtree( oldDir, ignore_errors=True )
+    if os.path.exists( panelDir ):
+        os.rename( panelDir, oldDir )
+    os.rename( tempDir, panelDir )
+    shutil.rmtree( oldDir, ignore_errors=True )
+    return len( tickers )
+
+
+class PricePanel:
+    '''
+    Read-only view of the panel built by buildPricePanel().
+    Nothing is read from disk until it's needed.
+    '''
+    def __init__( self, panelDir: str = '' ) -> None:
+        self.panelDir = panelDir or absolutePathLocator( PANEL_DIR )
+
+    @cached_property
+    def tickers( self ) -> list[str]:
+        with open( os.path.join( self.panelDir, TICKERS_FILENAME ), 'r' ) as f:
+            tickers: list[str] = json.load( f )
+        return tickers
+
+    @cached_property
+    def tickerToColumnMap( self ) -> dict[str, int]:
+        return { ticker : column for column, ticker in enumerate( self.tickers ) }
+
+    @cached_property
+    def dates( self ) -> pd.DatetimeIndex:
+        dates = np.load( os.path.join( self.panelDir, DATES_FILENAME ), allow_pickle=False )
+        return pd.DatetimeIndex( dates.astype( 'datetime64[ns]' ), name='Date' )
+
+    @cached_property
+    def closeArray( self ) -> np.ndarray:
+        '''
+        The memory-mapped ( dates x tickers ) matrix of closing prices.
+        '''
+        return np.load( os.path.join( self.panelDir, CLOSE_FILENAME ),
+                        mmap_mode='r', allow_pickle=False )
+
+    def __contains__( self, ticker: str ) -> bool:
+        return ticker in self.tickerToColumnMap
+
+    def __len__( self ) -> int:
+        return len( self.tickers )
+
+    def column( self, ticker: str ) -> int:
+        '''
+        Return the panel column holding the ticker's prices.
+        Raises KeyError if the ticker isn't in the panel.
+        '''
+        return self.tickerToColumnMap[ ticker ]
+
+    def rowSlice( self, start: Optional[str] = None, end: Optional[str] = None ) -> slice:
+        '''
+        Return the rows between the start and end dates, inclusive.
+        Dates can be anything pd.Timestamp() accepts, e.g. 'YYYY-MM-DD'.
+        '''
+        startRow = 0 if start is None else \
+            int( self.dates.searchsorted( pd.Timestamp( start ), side='left' ) )
+        endRow = len( self.dates ) if end is None else \
+            int( self.dates.searchsorted( pd.Timestamp( end ), side='right' ) )
+        return slice( startRow, endRow )
+
+    def closeSeries( self,
+                     ticker: str,
+                     start: Optional[str] = None,
+                     end: Optional[str] = None,
+                     dropna: bool = True ) -> Series:
+        '''
+        Return the closing prices of one ticker between the start and end dates.
+        By default, dates the ticker has no price for are dropped.
+        '''
+        rows = self.rowSlice( start, end )
+        values = np.array( self.closeArray[ rows, self.column( ticker ) ] )
+        series = pd.Series( values, index=self.dates[ rows ], name=ticker )
+        return series.dropna() if dropna else series
+
+    def closeDf( self,
+                 tickers: Optional[list[str]] = None,
+                 start: Optional[str] = None,
+                 end: Optional[str] = None ) -> DataFrame:
+        '''
+        Return a DataFrame of closing prices with one column per ticker,
+        reading only the requested tickers and dates.
+        '''
+        if tickers is None:
+            tickers = self.tickers
+        rows = self.rowSlice( start, end )
+        columns = [ self.column( ticker ) for ticker in tickers ]
+        values = self.closeArray[ rows ][ :, columns ]
+        return pd.DataFrame( values, index=self.dates[ rows ], columns=tickers )
+
+
+############
+# main()
+############
+def main() -> None:
+    nTickers = buildPricePanel()
+    panel = PricePanel()
+    print( "Built a price panel with %d tickers and %d dates in %s" % \
+           ( nTickers, len( panel.dates ), panel.panelDir ) )
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,156 @@
+#!/usr/bin/env python
+
+r"""
+Calendar-aware returns ( n-year, year-to-date, since a date, between two
+dates ) for one ticker or a whole universe at once.
+
+A return between two dates uses the last closing price on or before each
+date, so weekends, holidays and gaps in the data don't shift the anchors
+the way counting rows would. NaN closes are skipped. A return is NaN when
+the history doesn't reach back to the start date.
+
+Every ticker's ( date, price ) pairs are kept back to back in one sorted
+array, keyed by ( ticker, date ), so a single np.searchsorted call finds
+the anchor prices of every ticker at once.
+
+Example:
+   >>> calculator = ReturnCalculator( [ datesA, datesB ], [ closesA, closesB ] )
+   >>> calculator.ytdReturn()
+   array([ 12.3, -4.5 ])
+   >>> calculator.returnBetween( '2020-02-19', '2020-03-23' )
+"""
+
+############
+# Imports
+############
+
+from typing import Sequence, Union
+
+import numpy as np
+import pandas as pd
+from numpy.typing import ArrayLike
+
+
+############
+# Constants
+############
+
+# Keys are tickerIndex * KEY_STRIDE + KEY_OFFSET + days since 1970, so each
+# ticker's keys are sorted and come after the previous ticker's.
+KEY_STRIDE = 1 << 32
+KEY_OFFSET = 1 << 31
+
+# A date, or one date per ticker. Strings can be anything np.datetime64() accepts.
+Dates = Union[str, np.datetime64, ArrayLike]
+
+
+############
+# ReturnCalculator
+############
+
+def toDays( dates: Dates ) -> np.ndarray:
+    '''
+    Convert dates to datetime64[D], dropping any time of day.
+    '''
+    return np.asarray( dates, dtype='datetime64[D]' )
+
+
+def nYearsBefore( dates: Dates, n: int ) -> np.ndarray:
+    '''
+    The same day n years earlier. Feb 29 becomes Feb 28 in years without one.
+    '''
+    days = np.atleast_1d( toDays( dates ) )
+    shifted = pd.DatetimeIndex( days.astype( 'datetime64[ns]' ) ) - pd.DateOffset( years=n )
+    return shifted.to_numpy().astype( 'datetime64[D]' )
+
+
+def endOfPreviousYear( dates: Dates ) -> np.ndarray:
+    '''
+    Dec 31 of the year before each date, i.e. the anchor of a year-to-date return.
+    '''
+    days = np.atleast_1d( toDays( dates ) )
+    return days.astype( 'datetime64[Y]' ).astype( 'datetime64[D]' ) - np.timedelta64( 1, 'D' )
+
+
+class ReturnCalculator:
+    def __init__( self, dates: Sequence[ArrayLike], closes: Sequence[ArrayLike] ) -> None:
+        '''
+        Keyword arguments:
+           dates  -- One array of sorted dates per ticker, as datetime64 or
+                     'YYYY-MM-DD' strings.
+           closes -- The matching closing prices.
+        '''
+        keys = []
+        prices = []
+        for i, ( tickerDates, tickerCloses ) in enumerate( zip( dates, closes ) ):
+            tickerCloses = np.asarray( tickerCloses, dtype=np.float64 )
+            days = toDays( tickerDates ).astype( np.int64 )
+            if len( days ) != len( tickerCloses ):
+                raise ValueError( "Ticker %d has %d dates but %d closing prices" % \
+                                  ( i, len( days ), len( tickerCloses ) ) )
+            valid = ~np.isnan( tickerCloses )
+            keys.append( i * KEY_STRIDE + KEY_OFFSET + days[ valid ] )
+            prices.append( tickerCloses[ valid ] )
+
+        self.numTickers = len( keys )
+        self.lengths = np.array( [ len( k ) for k in keys ], dtype=np.int64 )
+        self._starts = np.concatenate( ( [ 0 ], np.cumsum( self.lengths ) ) ).astype( np.int64 )
+        self._keys = np.concatenate( keys ) if keys else np.array( [], dtype=np.int64 )
+        self._prices = np.concatenate( prices ) if prices else np.array( [] )
+
+        # The date and price of each ticker's last close, NaT/NaN if it has none.
+        hasPrices = self.lengths > 0
+        lastPositions = self._starts[ 1: ][ hasPrices ] - 1
+        self.lastDates = np.full( self.numTickers, np.datetime64( 'NaT' ), dtype='datetime64[D]' )
+        self.lastDates[ hasPrices ] = ( self._keys[ lastPositions ] % KEY_STRIDE - KEY_OFFSET ).astype( 'datetime64[D]' )
+        self.lastCloses = np.full( self.numTickers, np.nan )
+        self.lastCloses[ hasPrices ] = self._prices[ lastPositions ]
+
+    def __len__( self ) -> int:
+        return self.numTickers
+
+    def pricesAsOf( self, dates: Dates ) -> np.ndarray:
+        '''
+        Return each ticker's last closing price on or before the date
+        ( or its own date, given one per ticker ), NaN if there's none.
+        '''
+        days = np.broadcast_to( toDays( dates ), ( self.numTickers, ) )
+        result = np.full( self.numTickers, np.nan )
+        known = ~np.isnat( days )
+        tickerIndices = np.arange( self.numTickers )[ known ]
+        targets = tickerIndices * KEY_STRIDE + KEY_OFFSET + days[ known ].astype( np.int64 )
+        positions = np.searchsorted( self._keys, targets, side='right' ) - 1
+        # A position before the ticker's first close belongs to the previous ticker.
+        found = positions >= self._starts[ tickerIndices ]
+        result[ tickerIndices[ found ] ] = self._prices[ positions[ found ] ]
+        return result
+
+    def returnBetween( self, start: Dates, end: Dates ) -> np.ndarray:
+        '''
+        Percent return of each ticker from the start date to the end date.
+        '''
+        startPrices = self.pricesAsOf( start )
+        endPrices = self.pricesAsOf( end )
+        with np.errstate( divide='ignore', invalid='ignore' ):
+            return 100 * ( endPrices - startPrices ) / startPrices
+
+    def returnSince( self, start: Dates ) -> np.ndarray:
+        '''
+        Percent return of each ticker from the start date to its last close.
+        '''
+        startPrices = self.pricesAsOf( start )
+        with np.errstate( divide='ignore', invalid='ignore' ):
+            return 100 * ( self.lastCloses - startPrices ) / startPrices
+
+    def nYearReturn( self, n: int ) -> np.ndarray:
+        '''
+        Percent return over the n years up to each ticker's last close.
+        '''
+        return self.returnSince( nYearsBefore( self.lastDates, n ) )
+
+    def ytdReturn( self ) -> np.ndarray:
+        '''
+        Percent return from the last close of the previous year,
+        for the year of each ticker's last close.
+        '''
+        return self.returnSince( endOfPreviousYear( self.lastDates ) )
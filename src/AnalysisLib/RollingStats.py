@@ -0,0 +1,243 @@
+#!/usr/bin/env python
+
+r"""
+Rolling mean, standard deviation, min and max of a price series, for
+many window lengths at once.
+
+Everything is built from a few passes over the series that every window
+shares:
+   - cumulative sums of the values, their squares and the count of non-NaN
+     values, so any window's mean and standard deviation is a difference
+     of two entries;
+   - running maxima and minima from the end of the series, so the max or
+     min of the last n values is a single lookup.
+Full rolling series of min and max use the van Herk/Gil-Werman algorithm,
+which gets the same O(N) bound as a monotonic deque per window but runs as
+array operations instead of a Python loop.
+
+The rolling series match pandas' series.rolling( n ).mean() / .std() /
+.min() / .max(): entry i covers the n values ending at i, and is NaN when
+any of them is NaN or there are fewer than n. Means and standard deviations
+agree with pandas to floating-point rounding, not bit for bit.
+
+Example:
+   >>> stats = RollingStats( closeArray )
+   >>> stats.latest( 'mean', 200 )                   # O(1) after the first call
+   >>> stats.compute( [ 20, 50, 100, 200 ], [ 'mean', 'max' ] )
+   >>> stats.trailingMax( 252 )                      # 52-week high, skipping NaN
+"""
+
+############
+# Imports
+############
+
+from typing import Iterable
+from functools import cached_property
+
+import numpy as np
+
+
+############
+# Constants
+############
+
+STATS = ( 'mean', 'std', 'min', 'max' )
+
+
+############
+# RollingStats
+############
+
+def _slidingReduce( values: np.ndarray, n: int, ufunc: np.ufunc ) -> np.ndarray:
+    '''
+    Reduce every window of n values with np.fmax or np.fmin, using the
+    van Herk/Gil-Werman algorithm: split the values into blocks of n,
+    so every window is the end of one block plus the start of the next.
+    '''
+    length = len( values )
+    result = np.full( length, np.nan )
+    if n > length:
+        return result
+    numBlocks = -( -length // n )
+    padded = np.full( numBlocks * n, np.nan )
+    padded[ :length ] = values
+    blocks = padded.reshape( numBlocks, n )
+    # prefix[ i ] reduces from the start of i's block to i,
+    # suffix[ i ] reduces from i to the end of i's block.
+    prefix = ufunc.accumulate( blocks, axis=1 ).ravel()
+    suffix = ufunc.accumulate( blocks[ :, ::-1 ], axis=1 )[ :, ::-1 ].ravel()
+    result[ n - 1: ] = ufunc( suffix[ :length - n + 1 ], prefix[ n - 1:length ] )
+    return result
+
+
+class RollingStats:
+    def __init__( self, values: np.ndarray ) -> None:
+        '''
+        Keyword arguments:
+           values -- The series, e.g. closing prices, oldest first.
+        '''
+        self.values = np.asarray( values, dtype=np.float64 )
+        self._cache: dict[tuple[str, int], np.ndarray] = {}
+
+    def __len__( self ) -> int:
+        return len( self.values )
+
+    ##### One pass over the series, shared by every window #####
+    @cached_property
+    def _reference( self ) -> float:
+        # Sums of the values minus a typical value lose less precision.
+        valid = self.values[ ~np.isnan( self.values ) ]
+        return float( valid.mean() ) if len( valid ) else 0.0
+
+    @cached_property
+    def _cumulativeSums( self ) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        '''
+        Cumulative sums of the values, their squares and the number of
+        non-NaN values, with a leading 0 so window [ i, j ) is S[ j ] - S[ i ].
+        '''
+        valid = ~np.isnan( self.values )
+        # Accumulate in extended precision where the platform has it, since
+        # a window's variance is the difference of two large sums of squares.
+        centered = np.where( valid, self.values - self._reference, 0.0 ).astype( np.longdouble )
+        sums = np.concatenate( ( [ 0.0 ], np.cumsum( centered ) ) )
+        squares = np.concatenate( ( [ 0.0 ], np.cumsum( centered * centered ) ) )
+        counts = np.concatenate( ( [ 0 ], np.cumsum( valid ) ) )
+        return sums, squares, counts
+
+    @cached_property
+    def _changeCounts( self ) -> np.ndarray:
+        '''
+        _changeCounts[ i ] is how many times the value changes between
+        consecutive entries in values[ :i + 1 ], so a window is constant
+        when the count is the same at both of its ends.
+        '''
+        return np.concatenate( ( [ 0 ], np.cumsum( self.values[ 1: ] != self.values[ :-1 ] ) ) )
+
+    @cached_property
+    def _maxFromEnd( self ) -> np.ndarray:
+        # _maxFromEnd[ i ] is the max of values[ i: ], skipping NaN.
+        return np.fmax.accumulate( self.values[ ::-1 ] )[ ::-1 ]
+
+    @cached_property
+    def _minFromEnd( self ) -> np.ndarray:
+        return np.fmin.accumulate( self.values[ ::-1 ] )[ ::-1 ]
+
+    ##### Full rolling series #####
+    def _windowSums( self, n: int, ends: np.ndarray | int ) -> tuple:
+        '''
+        Sum, sum of squares and count of the n values ending just before each index in ends.
+        '''
+        sums, squares, counts = self._cumulativeSums
+        starts = ends - n
+        return ( sums[ ends ] - sums[ starts ],
+                 squares[ ends ] - squares[ starts ],
+                 counts[ ends ] - counts[ starts ] )
+
+    def _meanFromSums( self, n: int, windowSum: np.ndarray, count: np.ndarray ) -> np.ndarray:
+        return np.where( count == n, self._reference + windowSum / n, np.nan )
+
+    def _stdFromSums( self, n: int, windowSum: np.ndarray, windowSquares: np.ndarray,
+                      count: np.ndarray ) -> np.ndarray:
+        if n < 2:
+            return np.full( np.shape( windowSum ), np.nan )
+        variance = np.maximum( ( windowSquares - windowSum * windowSum / n ) / ( n - 1 ), 0.0 )
+        return np.where( count == n, np.sqrt( variance ), np.nan )
+
+    def _computeSeries( self, stat: str, n: int ) -> np.ndarray:
+        length = len( self.values )
+        if stat in ( 'min', 'max' ):
+            ufunc = np.fmax if stat == 'max' else np.fmin
+            result = _slidingReduce( self.values, n, ufunc )
+            if n <= length:
+                # Like pandas, windows with a NaN have no value.
+                counts = self._cumulativeSums[ 2 ]
+                result[ n - 1: ][ counts[ n: ] - counts[ :length - n + 1 ] < n ] = np.nan
+            return result
+
+        result = np.full( length, np.nan )
+        if n > length:
+            return result
+        windowSum, windowSquares, count = self._windowSums( n, np.arange( n, length + 1 ) )
+        if stat == 'mean':
+            result[ n - 1: ] = self._meanFromSums( n, windowSum, count )
+        elif n > 1:
+            result[ n - 1: ] = self._stdFromSums( n, windowSum, windowSquares, count )
+            # Rounding can leave a tiny variance in windows where every value
+            # is the same, and sqrt() would magnify it. Those are exactly 0.
+            changes = self._changeCounts
+            isConstant = changes[ n - 1: ] == changes[ :length - n + 1 ]
+            result[ n - 1: ][ isConstant & ( count == n ) ] = 0.0
+        return result
+
+    def _check( self, stat: str, n: int ) -> None:
+        if stat not in STATS:
+            raise ValueError( "Unknown rolling statistic '%s'. Use one of %s" % ( stat, ", ".join( STATS ) ) )
+        if n < 1:
+            raise ValueError( "The window must hold at least 1 value, not %d" % n )
+
+    def series( self, stat: str, n: int ) -> np.ndarray:
+        '''
+        Return the rolling statistic over windows of n values, like
+        pandas' rolling( n ).<stat>(). Results are cached per window.
+        Don't modify the returned array.
+        '''
+        self._check( stat, n )
+        key = ( stat, n )
+        if key not in self._cache:
+            self._cache[ key ] = self._computeSeries( stat, n )
+        return self._cache[ key ]
+
+    def compute( self, windows: Iterable[int], stats: Iterable[str] = STATS ) -> dict[tuple[str, int], np.ndarray]:
+        '''
+        Return every ( stat, n ) rolling series for the given windows and stats.
+        '''
+        stats = list( stats )
+        return { ( stat, n ) : self.series( stat, n ) for n in windows for stat in stats }
+
+    ##### Latest values only #####
+    def latest( self, stat: str, n: int ) -> float:
+        '''
+        The last value of series( stat, n ), in O(1) time once the shared
+        passes over the series are done.
+        '''
+        self._check( stat, n )
+        key = ( stat, n )
+        if key in self._cache:
+            return float( self._cache[ key ][ -1 ] ) if len( self.values ) else np.nan
+        length = len( self.values )
+        if n > length:
+            return np.nan
+        windowSum, windowSquares, count = self._windowSums( n, length )
+        if count < n:
+            return np.nan
+        if stat == 'mean':
+            return float( self._meanFromSums( n, windowSum, count ) )
+        if stat == 'max':
+            return self.trailingMax( n )
+        if stat == 'min':
+            return self.trailingMin( n )
+        if n > 1 and self._changeCounts[ length - 1 ] == self._changeCounts[ length - n ]:
+            return 0.0
+        return float( self._stdFromSums( n, windowSum, windowSquares, count ) )
+
+    def trailingMax( self, n: int ) -> float:
+        '''
+        The max of the last n values ( all of them if there are fewer ),
+        skipping NaN, like series.iloc[ -n: ].max().
+        '''
+        if n < 1:
+            raise ValueError( "The window must hold at least 1 value, not %d" % n )
+        if not len( self.values ):
+            return np.nan
+        return float( self._maxFromEnd[ max( len( self.values ) - n, 0 ) ] )
+
+    def trailingMin( self, n: int ) -> float:
+        '''
+        The min of the last n values ( all of them if there are fewer ),
+        skipping NaN, like series.iloc[ -n: ].min().
+        '''
+        if n < 1:
+            raise ValueError( "The window must hold at least 1 value, not %d" % n )
+        if not len( self.values ):
+            return np.nan
+        return float( self._minFromEnd[ max( len( self.values ) - n, 0 ) ] )
@@ -4,14 +4,22 @@
 # Imports
 ############
 
-from typing import Optional
+from typing import Callable, Optional
 import os
 from functools import cached_property
+from concurrent.futures import ThreadPoolExecutor
 
+import numpy as np
 import pandas as pd
 from pandas import DataFrame
 
-from AnalysisLib import Stock
+from AnalysisLib import Stock, LiveQuotes
+from AnalysisLib.MetricState import MetricState
+from AnalysisLib.PricePanel import PricePanel
+from AnalysisLib.PriceMatrix import PriceMatrix
+from AnalysisLib.ReturnCalculator import ReturnCalculator
+from AnalysisLib.DividendIndex import DividendIndex
+from AnalysisLib.MetricRegistry import MetricRegistry, defaultRegistry
 from UtilLib.Util import absolutePathLocator
 
 
@@ -19,14 +27,46 @@ from UtilLib.Util import absolutePathLocator
 # Functions and Classes
 ############
 
+def _movingAverageColumn( n: int ) -> Callable[[MetricState], float]:
+    return lambda s: s.movingAverage( n )
+
+
 class Screener:
-    def __init__( self, tickers: Optional[list[str]] = None, useLiveStatus: bool = False ) -> None:
+    def __init__( self,
+                  tickers: Optional[list[str]] = None,
+                  useLiveStatus: bool = False,
+                  vectorized: bool = False,
+                  columns: Optional[list[str]] = None,
+                  registry: MetricRegistry = defaultRegistry,
+                  useMetricState: bool = False ) -> None:
+        '''
+        vectorized specifies if the price columns should be computed for
+        all the stocks at once with array operations, instead of one stock
+        at a time. Both modes give the same DataFrame.
+
+        columns lists the metrics to include in the DataFrame. Each one
+        must be registered in the registry. See AnalysisLib/MetricRegistry.py.
+
+        useLiveStatus lays the latest bars from Yahoo! Finance over the local
+        price histories. Call refresh() to rebuild the DataFrame with newer ones.
+
+        useMetricState takes the price columns from each stock's metric state
+        ( see AnalysisLib/MetricState.py ) instead of its full history, so
+        with useLiveStatus, a refresh only costs O(1) per stock and new bar.
+        It applies when the DataFrame isn't vectorized.
+        '''
         if tickers is None:
             relativeCsvDirPath = 'data/RawData/DailyPriceCsvs/'
             csvDirPath = absolutePathLocator( relativeCsvDirPath )
             csvs = os.listdir( csvDirPath )
             tickers = [ filename[:-4] for filename in csvs if filename.endswith( '.csv' ) ]
         self.stocks = [ Stock.Stock( t, useLiveStatus ) for t in sorted( tickers ) ]
+        self.useLiveStatus = useLiveStatus
+        self.vectorized = vectorized
+        self.useMetricState = useMetricState
+        self.registry = registry
+        if columns is not None:
+            self.columns = columns
 
     def getSectors( self ) -> list[str]:
         sectors = set()
@@ -37,56 +77,238 @@ class Screener:
                 pass
         return sorted( list( sectors ) )
 
+    def refresh( self ) -> None:
+        '''
+        Recompute the DataFrame the next time it's used, with the latest live data.
+        '''
+        self.__dict__.pop( 'df', None )
+
+    def refreshLiveData( self, numWorkers: int = 8 ) -> None:
+        '''
+        Download the latest bars of every stock in one request, and fetch
+        the stale info the columns need from several threads at once,
+        instead of one stock at a time while building the rows.
+        Fresh data in the live quote cache isn't fetched again.
+        '''
+        if not self.stocks:
+            return
+
+        cache = LiveQuotes.getSharedCache()
+        staleStocks = [ stock for stock in self.stocks if cache.peek( stock.ticker, 'quote' ) is None ]
+
+        # Start from the earliest last local date, so no stock's bars leave a gap.
+        lastLocalDates = []
+        for stock in staleStocks:
+            try:
+                if self.useMetricState:
+                    # Saves reading the whole history.
+                    lastDate = stock.localMetricState.lastDate
+                    dates = np.array( [ lastDate ] if lastDate else [], dtype='datetime64[D]' )
+                else:
+                    dates = stock.history.priceArrays[ 0 ]
+            except ( OSError, ValueError ):
+                continue
+            if len( dates ):
+                lastLocalDates.append( dates[ -1 ] )
+        start = str( min( lastLocalDates ) ) if lastLocalDates else None
+        try:
+            cache.refreshQuotes( [ stock.ticker for stock in staleStocks ], start=start )
+        except Exception as e:
+            # Each stock falls back to its local history.
+            print( "[ERROR] Could not get the latest quotes: %s" % e )
+
+        fields = self.registry.requiredInputs( self.columns ) & { 'info', 'fastInfo' }
+        def prefetch( stock: Stock.Stock ) -> None:
+            for field in fields:
+                try:
+                    getattr( stock.liveStatus, field )
+                except Exception as e:
+                    print( "[ERROR] Could not get live %s for %s: %s" % ( field, stock.ticker, e ) )
+        with ThreadPoolExecutor( max_workers=max( 1, numWorkers ) ) as executor:
+            list( executor.map( prefetch, self.stocks ) )
+
+    @cached_property
+    def pricePanel( self ) -> PricePanel:
+        return PricePanel()
+
+    def closingPricesDf( self, start: Optional[str] = None, end: Optional[str] = None ) -> DataFrame:
+        '''
+        Return the closing prices of the screener's stocks between the
+        start and end dates, with one column per ticker.
+        Only the requested slice is read from the memory-mapped price panel.
+        '''
+        tickers = [ stock.ticker for stock in self.stocks if stock.ticker in self.pricePanel ]
+        return self.pricePanel.closeDf( tickers, start, end )
+
+
+    # Edit the columns list with the stuff you want to include.
+    # Make sure the metric registry supports each column.
+    columns = [ "LongName",
+                "Sector",
+                "MarketCap",
+                "LastClosingPrice",
+                "AllTimeHigh",
+                "1DayPctReturn",
+                "5DayPctReturn",
+                "PctFrom52WkHigh",
+                "DividendYield",
+                "ForwardPE",
+    ]
+
+    # Columns the vectorized mode computes from a PriceMatrix, along with
+    # how many closing prices a stock needs for the value to exist.
+    # ( With fewer, the Stock methods raise an IndexError. )
+    vectorizedColumnMap: dict[str, tuple[Callable[[PriceMatrix], np.ndarray], int]] = {
+        "AllTimeHigh" : ( lambda m: m.allTimeHigh, 0 ),
+        "PctFrom52WkHigh" : ( lambda m: m.pctFromNDayHigh( 252 ), 1 ),
+        "LastClosingPrice" : ( lambda m: m.lastClosingPrice, 1 ),
+        "1DayPctReturn" : ( lambda m: m.nDayReturn( 1 ), 2 ),
+        "5DayPctReturn" : ( lambda m: m.nDayReturn( 5 ), 6 ),
+    }
+
+    # Columns the vectorized mode computes from a ReturnCalculator over every
+    # stock's dates and prices. They're NaN when the history is too short.
+    vectorizedReturnColumnMap: dict[str, Callable[[ReturnCalculator], np.ndarray]] = {
+        "YTDPctReturn" : lambda r: r.ytdReturn(),
+        "1YrPctReturn" : lambda r: r.nYearReturn( 1 ),
+        "3YrPctReturn" : lambda r: r.nYearReturn( 3 ),
+        "5YrPctReturn" : lambda r: r.nYearReturn( 5 ),
+    }
 
-    columnTitleToCodeLineMap = {
-        "LongName" : "stock.longName",
-        "Sector" : "stock.sector",
-        "AllTimeHigh" : "stock.allTimeHigh",
-        "PctFrom52WkHigh" : "stock.pctFromNDayHigh( 252 )",
-        "LastClosingPrice": "stock.lastClosingPrice",
-        "DividendYield" : "stock.dividendYield * 100.0",
-        "ForwardPE" : "stock.forwardPE",
-        "1DayPctReturn" : "stock.nDayReturn( 1 )",
-        "5DayPctReturn" : "stock.nDayReturn( 5 )",
-        "MarketCap" : "'%.2e' % stock.marketCap",
-        "ShortPercentOfFloat" : "stock.shortPercentOfFloat * 100.0"
+    # Columns the vectorized mode computes from a DividendIndex over every
+    # stock's dividends, as of today.
+    vectorizedDividendColumnMap: dict[str, Callable[[DividendIndex], np.ndarray]] = {
+        "TTMDividends" : lambda d: d.trailingTotal(),
+        "TTMDividendPayouts" : lambda d: d.payoutCount(),
+        "1YrDividendGrowth" : lambda d: d.growthRate( 1 ),
+        "5YrDividendGrowth" : lambda d: d.growthRate( 5 ),
+    }
+
+    # Columns the metric state mode takes from each stock's MetricState.
+    metricStateColumnMap: dict[str, Callable[[MetricState], float]] = {
+        "LastClosingPrice" : lambda s: s.lastClosingPrice,
+        "AllTimeHigh" : lambda s: s.allTimeHigh,
+        "PctFromATH" : lambda s: s.pctFromAllTimeHigh,
+        "52WkHigh" : lambda s: s.nDayHigh( 252 ),
+        "PctFrom52WkHigh" : lambda s: s.pctFromNDayHigh( 252 ),
+        "1DayPctReturn" : lambda s: s.nDayReturn( 1 ),
+        "5DayPctReturn" : lambda s: s.nDayReturn( 5 ),
+        **{ "%dDayMA" % n : _movingAverageColumn( n ) for n in ( 20, 50, 100, 200 ) },
     }
 
     @cached_property
     def df( self ) -> DataFrame:
-        # Edit the columns list with the stuff you want to include.
-        # Make sure columnTitleToCodeLineMap supports each column.
-        columns = [ "LongName",
-                    "Sector",
-                    "MarketCap",
-                    "LastClosingPrice",
-                    "AllTimeHigh",
-                    "1DayPctReturn",
-                    "5DayPctReturn",
-                    "PctFrom52WkHigh",
-                    "DividendYield",
-                    "ForwardPE",
-        ]
+        if self.useLiveStatus:
+            self.refreshLiveData()
+        if self.vectorized:
+            return self._vectorizedDf()
+
+        rows = []
+        for stock in self.stocks:
+            values = self.row( stock )
+            if values is not None:
+                rows.append( ( stock.ticker, values ) )
+        return self.dfFromRows( rows )
+
+    def row( self, stock: Stock.Stock ) -> Optional[dict]:
+        '''
+        Return the stock's value for each column, or None if any of them
+        can't be computed. Lets a caller build the DataFrame from rows
+        computed as each stock's data comes in. See dfFromRows().
+        '''
+        try:
+            knownValues = self._metricStateValues( stock ) if self.useMetricState else None
+            return self.registry.evaluate( stock, self.columns, knownValues )
+        except Exception as e:
+            print( e )
+            print( "failed to create DataFrame row for %s" % stock.ticker )
+            return None
+
+    def _metricStateValues( self, stock: Stock.Stock ) -> dict:
+        requiredColumns = self.registry.requiredMetrics( self.columns )
+        columnMap = { c : f for c, f in self.metricStateColumnMap.items() if c in requiredColumns }
+        if not columnMap:
+            return {}
+        state = stock.metricState
+        return { c : f( state ) for c, f in columnMap.items() }
+
+    def dfFromRows( self, rows: list[tuple[str, dict]] ) -> DataFrame:
+        '''
+        Build the DataFrame from ( ticker, row ) pairs in any order.
+        '''
+        rows = sorted( rows, key=lambda r: r[ 0 ] )
+        data = { c : [ values[ c ] for _, values in rows ] for c in self.columns }
+        df = pd.DataFrame( data, index=[ ticker for ticker, _ in rows ] )
+        df = df.round( 2 )
+        return df
+
+    def _vectorizedDf( self ) -> DataFrame:
+        columns = self.columns
+        # Also compute the columns' dependencies, e.g. TTMDividendYield's
+        # TTMDividends and LastClosingPrice, so the registry doesn't have to.
+        requiredColumns = self.registry.requiredMetrics( columns )
+        priceColumns = [ c for c in self.vectorizedColumnMap if c in requiredColumns ]
+        returnColumns = [ c for c in self.vectorizedReturnColumnMap if c in requiredColumns ]
+        dividendColumns = [ c for c in self.vectorizedDividendColumnMap if c in requiredColumns ]
+        minCloses = max( [ self.vectorizedColumnMap[ c ][ 1 ] for c in priceColumns ], default=0 )
+
+        # Load every stock's closing prices ( and their dates, if a return
+        # column needs them, and its dividends, if a dividend column does ),
+        # then compute each of those columns for all of them at once.
+        dates = []
+        closes = []
+        dividendDates = []
+        dividendAmounts = []
+        loaded = []
+        for stock in self.stocks:
+            try:
+                if returnColumns:
+                    stockDates, close = stock.priceArrays
+                else:
+                    stockDates, close = np.array( [], dtype='datetime64[D]' ), stock.closeArray
+                if dividendColumns:
+                    stockDividendDates, amounts = stock.dividendArrays
+                else:
+                    stockDividendDates, amounts = np.array( [], dtype='datetime64[D]' ), np.array( [] )
+                loaded.append( True )
+            except Exception as e:
+                print( e )
+                stockDates, close = np.array( [], dtype='datetime64[D]' ), np.array( [] )
+                stockDividendDates, amounts = np.array( [], dtype='datetime64[D]' ), np.array( [] )
+                loaded.append( False )
+            dates.append( stockDates )
+            closes.append( close )
+            dividendDates.append( stockDividendDates )
+            dividendAmounts.append( amounts )
+        matrix = PriceMatrix( closes )
+        priceValues = { c : self.vectorizedColumnMap[ c ][ 0 ]( matrix ) for c in priceColumns }
+        if returnColumns:
+            calculator = ReturnCalculator( dates, closes )
+            priceValues.update( { c : self.vectorizedReturnColumnMap[ c ]( calculator ) for c in returnColumns } )
+        if dividendColumns:
+            dividendIndex = DividendIndex( dividendDates, dividendAmounts )
+            priceValues.update( { c : self.vectorizedDividendColumnMap[ c ]( dividendIndex ) for c in dividendColumns } )
+        hasEnoughCloses = matrix.hasAtLeast( minCloses )
 
         data: dict[str, list] = { c : [] for c in columns }
         tickers = []
 
-        for stock in self.stocks:
+        for i, stock in enumerate( self.stocks ):
+            if not loaded[ i ] or not hasEnoughCloses[ i ]:
+                if loaded[ i ]:
+                    print( "%s has fewer than %d closing prices" % ( stock.ticker, minCloses ) )
+                print( "failed to create DataFrame row for %s" % stock.ticker )
+                continue
             try:
-                # First make sure we can collect all the values.
-                values = []
+                # The remaining columns come from the registry as usual.
+                knownValues = { c : columnValues[ i ] for c, columnValues in priceValues.items() }
+                values = self.registry.evaluate( stock, columns, knownValues )
                 for column in columns:
-                    value = eval( self.columnTitleToCodeLineMap[ column ] )
-                    values.append( value )
-                # Now insert the values into the dictionary.
-                for i, v in enumerate( values ):
-                    column = columns[ i ]
-                    data[ column ].append( v )
+                    data[ column ].append( values[ column ] )
                 tickers.append( stock.ticker )
             except Exception as e:
                 print( e )
                 print( "failed to create DataFrame row for %s" % stock.ticker )
-                pass
         df = pd.DataFrame( data, index=tickers )
         df = df.round( 2 )
         return df
@@ -4,41 +4,110 @@
 # Imports
 ############
 
-from typing import Optional
+from typing import Any, Callable, Mapping, Optional, TypeVar
 
-import datetime, json
+import json, datetime
 from functools import cached_property
 
+import numpy as np
 import pandas as pd
 from pandas import DataFrame
-import yfinance as yf
 
 
 from UtilLib.Util import absolutePathLocator
+from UtilLib import PriceStore, RequestGovernor
+from AnalysisLib import FundamentalsTable
+from AnalysisLib.RollingStats import RollingStats
+from AnalysisLib.ReturnCalculator import ReturnCalculator
+from AnalysisLib import DividendIndex, LiveQuotes, MetricState
+from AnalysisLib.LiveQuotes import LiveQuoteCache
 
 
 ############
 # Stock
 ############
 
+T = TypeVar( 'T' )
+
+
 class LiveStatus:
     """
-    Provides the latest data directly from Yahoo! Finance
+    Provides the latest data directly from Yahoo! Finance.
+
+    Each field is kept in a LiveQuoteCache until its time-to-live runs out,
+    so a long-running process keeps seeing new data. See AnalysisLib/LiveQuotes.py.
     """
-    def __init__( self, yfTicker: yf.Ticker ) -> None:
-        self.yfTicker = yfTicker
+    def __init__( self,
+                  ticker: str,
+                  history: Optional['History'] = None,
+                  cache: Optional[LiveQuoteCache] = None ) -> None:
+        '''
+        Keyword arguments:
+           ticker  -- The ticker symbol
+           history -- The locally stored data the latest bars are laid over.
+           cache   -- Defaults to the shared cache.
+        '''
+        self.ticker = ticker
+        self.history = history or History( ticker )
+        self.cache = cache or LiveQuotes.getSharedCache()
+        # The bars updateMetricState() last used, so the same ones aren't used twice.
+        self.appliedBars: Optional[DataFrame] = None
 
     @cached_property
+    def yfTicker( self ) -> Any:
+        # yfinance ( and the networking stack under it ) takes a while to
+        # import, so wait until live data is actually needed.
+        import yfinance as yf
+        return yf.Ticker( self.ticker )
+
+    def _request( self, func: Callable[[], Any] ) -> Any:
+        return RequestGovernor.getSharedGovernor().call( RequestGovernor.YAHOO_HOST, func )
+
+    @property
     def info( self ) -> dict:
-        return self.yfTicker.info
+        return self.cache.get( self.ticker, 'info', lambda: self._request( lambda: self.yfTicker.info ) )
 
-    @cached_property
+    @property
     def fastInfo( self ) -> dict:
-        return dict(self.yfTicker.fast_info)
+        return self.cache.get( self.ticker, 'fastInfo',
+                               lambda: self._request( lambda: dict( self.yfTicker.fast_info ) ) )
 
-    @cached_property
+    @property
+    def fullHistoryDf( self ) -> DataFrame:
+        '''
+        The whole price history, downloaded from Yahoo! Finance.
+        '''
+        return self.cache.get( self.ticker, 'history',
+                               lambda: self._request( lambda: self.yfTicker.history( period='max' ) ) )
+
+    @property
     def maxHistoryDf( self ) -> DataFrame:
-        return self.yfTicker.history( period='max' )
+        '''
+        The locally stored closing prices with the latest bars laid over them,
+        or the whole history from Yahoo! Finance if nothing is stored locally.
+        '''
+        try:
+            localDf = self.history.maxHistoryDf
+        except ( OSError, ValueError ):
+            return self.fullHistoryDf
+        return self.cache.patchHistory( self.ticker, localDf )
+
+    def updateMetricState( self, state: MetricState.MetricState ) -> MetricState.MetricState:
+        '''
+        Update the state with the latest bars, at O(1) cost per bar.
+        '''
+        lastDate = datetime.date.fromisoformat( state.lastDate ) if state.lastDate else None
+        bars = self.cache.latestBars( self.ticker, lastDate )
+        if bars is not self.appliedBars:
+            state.appendBars( bars.index.to_numpy(), bars[ 'Close' ].to_numpy() )
+            self.appliedBars = bars
+        return state
+
+    def invalidate( self ) -> None:
+        '''
+        Drop the cached data, so the next read fetches it again.
+        '''
+        self.cache.invalidate( self.ticker )
 
 
 class History:
@@ -51,8 +120,14 @@ class History:
     def __init__( self, ticker: str ) -> None:
         self.ticker = ticker
 
+    # The fields the Screener uses come from the fundamentals table when it's
+    # up-to-date, and the full JSON is only loaded for the other fields.
+    # See AnalysisLib/FundamentalsTable.py.
     @cached_property
-    def info( self ) -> dict:
+    def info( self ) -> Mapping[str, Any]:
+        tableDict = FundamentalsTable.getSharedTable().info( self.ticker )
+        if tableDict is not None:
+            return tableDict
         relativeFilePath = 'data/RawData/YahooFinanceInfo/%s.json' % self.ticker
         filePath = absolutePathLocator( relativeFilePath )
         with open( filePath, 'r' ) as f:
@@ -60,7 +135,10 @@ class History:
         return d
 
     @cached_property
-    def fastInfo( self ) -> dict:
+    def fastInfo( self ) -> Mapping[str, Any]:
+        tableDict = FundamentalsTable.getSharedTable().fastInfo( self.ticker )
+        if tableDict is not None:
+            return tableDict
         relativeFilePath = 'data/RawData/YahooFinanceFastInfo/%s.json' % self.ticker
         filePath = absolutePathLocator( relativeFilePath )
         with open( filePath, 'r' ) as f:
@@ -69,11 +147,25 @@ class History:
 
     @cached_property
     def maxHistoryDf( self ) -> DataFrame:
-        relativeFilePath = 'data/ProcessedData/DailyClosingPriceCsvs/%s.csv' % self.ticker
-        filePath = absolutePathLocator( relativeFilePath )
-        df = pd.read_csv( filePath, index_col='Date', parse_dates=True,
-                          na_values=[ 'nan' ] )
-        return df
+        # Reads the binary closing price arrays if they're up-to-date,
+        # and the CSV otherwise.
+        return PriceStore.readClosingPriceDf( self.ticker )
+
+    @cached_property
+    def closeArray( self ) -> np.ndarray:
+        if 'maxHistoryDf' in self.__dict__:
+            # Already loaded, so reuse it.
+            return self.maxHistoryDf[ 'Close' ].to_numpy( dtype=np.float64 )
+        if 'priceArrays' in self.__dict__:
+            return self.priceArrays[ 1 ]
+        return PriceStore.readCloseArray( self.ticker )
+
+    @cached_property
+    def priceArrays( self ) -> tuple[np.ndarray, np.ndarray]:
+        if 'maxHistoryDf' in self.__dict__:
+            return ( self.maxHistoryDf.index.to_numpy().astype( 'datetime64[D]' ),
+                     self.maxHistoryDf[ 'Close' ].to_numpy( dtype=np.float64 ) )
+        return PriceStore.readPriceArrays( self.ticker )
 
 class Stock:
     def __init__( self, ticker: str, useLiveStatus: bool = False ) -> None:
@@ -84,14 +176,22 @@ class Stock:
              this way can be slow.
         """
         self.ticker = ticker
-        self.yfTicker = yf.Ticker( ticker )
 
         self.useLiveStatus = useLiveStatus
-        self.liveStatus = LiveStatus( self.yfTicker )
         self.history = History( ticker )
+        self.liveStatus = LiveStatus( ticker, self.history )
+        # Values computed from the price history, with the history they came from.
+        self.derivedCache: dict[str, tuple[Optional[DataFrame], Any]] = {}
 
-    @cached_property
-    def info( self ) -> dict:
+    @property
+    def yfTicker( self ) -> Any:
+        '''
+        The yf.Ticker behind the live status, created on first use.
+        '''
+        return self.liveStatus.yfTicker
+
+    @property
+    def info( self ) -> Mapping[str, Any]:
         if not self.useLiveStatus:
             return self.history.info
         try:
@@ -99,8 +199,8 @@ class Stock:
         except Exception as e:
             return self.history.info
 
-    @cached_property
-    def fastInfo( self ) -> dict:
+    @property
+    def fastInfo( self ) -> Mapping[str, Any]:
         if not self.useLiveStatus:
             return self.history.fastInfo
         try:
@@ -108,7 +208,7 @@ class Stock:
         except Exception as e:
             return self.history.fastInfo
 
-    @cached_property
+    @property
     def maxHistoryDf( self ) -> DataFrame:
         if not self.useLiveStatus:
             return self.history.maxHistoryDf
@@ -117,6 +217,82 @@ class Stock:
         except Exception as e:
             return self.history.maxHistoryDf
 
+    @property
+    def closeArray( self ) -> np.ndarray:
+        '''
+        The closing prices as a NumPy array, oldest first.
+        Reading local files this way skips building the history DataFrame.
+        '''
+        if not self.useLiveStatus:
+            return self.history.closeArray
+        return self.maxHistoryDf[ 'Close' ].to_numpy( dtype=np.float64 )
+
+    @property
+    def priceArrays( self ) -> tuple[np.ndarray, np.ndarray]:
+        '''
+        The dates ( datetime64[D] ) and closing prices, oldest first.
+        '''
+        if not self.useLiveStatus:
+            return self.history.priceArrays
+        # Keep the exchange's local dates when dropping the time zone.
+        dates = pd.DatetimeIndex( self.maxHistoryDf.index ).tz_localize( None )
+        return ( dates.to_numpy().astype( 'datetime64[D]' ),
+                 self.maxHistoryDf[ 'Close' ].to_numpy( dtype=np.float64 ) )
+
+    @cached_property
+    def localMetricState( self ) -> MetricState.MetricState:
+        '''
+        The running price metrics of the locally stored closing prices, read
+        from the checkpoint if it's up-to-date. See AnalysisLib/MetricState.py.
+        '''
+        state = MetricState.readCheckpoint( self.ticker )
+        if state is not None and state.keeps( MetricState.DEFAULT_HIGH_LOW_WINDOWS,
+                                              MetricState.DEFAULT_MOVING_AVERAGE_WINDOWS,
+                                              MetricState.DEFAULT_RETURN_DAYS ):
+            return state
+        try:
+            dates, close = self.history.priceArrays
+        except ( OSError, ValueError ):
+            if not self.useLiveStatus:
+                raise
+            # Nothing stored locally, so start from the whole history from Yahoo! Finance.
+            dates, close = self.priceArrays
+        return MetricState.MetricState.fromArrays( self.ticker, dates, close )
+
+    @property
+    def metricState( self ) -> MetricState.MetricState:
+        '''
+        The price metrics, updated one bar at a time instead of recomputed
+        from the whole history. With useLiveStatus, the latest bars are
+        applied to the local state first.
+        '''
+        state = self.localMetricState
+        if self.useLiveStatus:
+            try:
+                self.liveStatus.updateMetricState( state )
+            except Exception as e:
+                # Like the other live fields, fall back to the local data.
+                pass
+        return state
+
+    def invalidate( self ) -> None:
+        '''
+        With useLiveStatus, drop the cached live data, so it's fetched again.
+        '''
+        self.liveStatus.invalidate()
+
+    def _derived( self, name: str, build: Callable[[], T] ) -> T:
+        '''
+        Cache a value computed from the price history. With useLiveStatus,
+        it's computed again whenever the live history changes.
+        '''
+        source = self.maxHistoryDf if self.useLiveStatus else None
+        cached = self.derivedCache.get( name )
+        if cached is None or cached[ 0 ] is not source:
+            cached = ( source, build() )
+            self.derivedCache[ name ] = cached
+        return cached[ 1 ]
+
     @cached_property
     def financialsDf( self ) -> DataFrame:
         relativeFilePath = 'data/RawData/FinacialsFromMacrotrends/%s.csv' % self.ticker
@@ -184,17 +360,25 @@ class Stock:
         df = pd.read_csv( filePath )
         return df
 
+    @cached_property
+    def dividendArrays( self ) -> tuple[np.ndarray, np.ndarray]:
+        '''
+        The payment dates ( datetime64[D] ) and amounts of the past dividends,
+        oldest first. Reads the shared dividend table when it's up-to-date.
+        '''
+        return DividendIndex.readDividendArrays( self.ticker )
+
+    @cached_property
+    def dividendIndex( self ) -> DividendIndex.DividendIndex:
+        dates, amounts = self.dividendArrays
+        return DividendIndex.DividendIndex( [ dates ], [ amounts ] )
+
     @property
     def oneYearDividendTotal( self ) -> float:
         '''
         The sum of the dividends paid out in the last year.
         '''
-        df = self.dividends.copy()
-        df.Date = df.Date.apply( lambda x: x[:10])
-        df[ 'Date' ] = pd.to_datetime(df['Date'])
-        oneYearAgo = datetime.datetime.now() - datetime.timedelta(365)
-        oneYearDividendTotal = df[ df[ 'Date' ] >= oneYearAgo ].Dividends.sum()
-        return oneYearDividendTotal
+        return float( self.dividendIndex.trailingTotal()[ 0 ] )
 
     @property
     def dividendYield( self ) -> float:
@@ -232,13 +416,20 @@ class Stock:
         return 100 * ( self.lastClosingPrice - self.allTimeHigh ) / self.allTimeHigh
 
     ##### Intermediate Price Metrics #####
+    @property
+    def rollingStats( self ) -> RollingStats:
+        '''
+        Rolling mean, std, min and max of the closing prices for any windows,
+        sharing one pass over the history and caching each window.
+        See AnalysisLib/RollingStats.py.
+        '''
+        return self._derived( 'rollingStats', lambda: RollingStats( self.closeArray ) )
+
     def nDayHigh( self, n: int ) -> float:
-        idx = -1 * n
-        return self.maxHistoryDf[ 'Close' ].iloc[ idx: ].max()
+        return self.rollingStats.trailingMax( n )
 
     def nDayLow( self, n: int ) -> float:
-        idx = -1 * n
-        return self.maxHistoryDf[ 'Close' ].iloc[ idx: ].min()
+        return self.rollingStats.trailingMin( n )
 
     def pctFromNDayHigh( self, n: int ) -> float:
         high = self.nDayHigh( n )
@@ -253,14 +444,41 @@ class Stock:
         oldPrice = self.maxHistoryDf[ 'Close' ].iloc[ idx ]
         return 100 * ( self.lastClosingPrice - oldPrice ) / oldPrice
 
+    @property
+    def returnCalculator( self ) -> ReturnCalculator:
+        '''
+        Finds the closing price as of any date by binary search over the dates.
+        '''
+        def build() -> ReturnCalculator:
+            dates, close = self.priceArrays
+            return ReturnCalculator( [ dates ], [ close ] )
+        return self._derived( 'returnCalculator', build )
+
     def nYearReturn( self, n: int ) -> float:
-        # TODO: Fill me in
-        return 0
+        '''
+        Percent return since the last close on or before the same day n years ago.
+        NaN if the history doesn't go back that far.
+        '''
+        return float( self.returnCalculator.nYearReturn( n )[ 0 ] )
 
     @property
     def ytdReturn( self ) -> float:
-        # TODO: Fill me in
-        return 0
+        '''
+        Percent return since the last close of the previous year.
+        '''
+        return float( self.returnCalculator.ytdReturn()[ 0 ] )
+
+    def returnSince( self, date: str ) -> float:
+        '''
+        Percent return since the last close on or before the date ( 'YYYY-MM-DD' ).
+        '''
+        return float( self.returnCalculator.returnSince( date )[ 0 ] )
+
+    def returnBetween( self, start: str, end: str ) -> float:
+        '''
+        Percent return between the last closes on or before the start and end dates.
+        '''
+        return float( self.returnCalculator.returnBetween( start, end )[ 0 ] )
 
     ##### Moving Averages #####
     def nDayMovingAverageDf( self, n : int ) -> DataFrame:
@@ -272,12 +490,10 @@ class Stock:
         return dfMa
 
     def nDayMovingAverage( self, n : int ) -> Optional[float]:
-        if len( self.maxHistoryDf ) < n:
+        if len( self.rollingStats ) < n:
             # Can't have an n-day moving average if the history isn't long enough.
             return None
-        dfMa = self.nDayMovingAverageDf( n )
-        columnName = '%dd MA' % n
-        return dfMa[ columnName ].iloc[-1]
+        return self.rollingStats.latest( 'mean', n )
 
 
 ############
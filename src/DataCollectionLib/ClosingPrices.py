@@ -0,0 +1,200 @@
+#!/usr/bin/env python
+
+'''
+Generate the closing price files ( see UtilLib/PriceStore.py ) from the raw
+daily price CSVs, along with a checkpoint of each ticker's running price
+metrics ( see AnalysisLib/MetricState.py ), and keep track of them in the
+data catalog.
+
+A ticker's closing prices record the content hash of the raw CSV they were
+generated from, so they only need regenerating when that hash changes.
+
+Example:
+   >>> catalog = DataCatalog()
+   >>> for ticker in findStaleTickers( catalog, tickers ):
+   ...    recordInCatalog( catalog, generateClosingPrices( ticker ) )
+'''
+
+
+##################
+# IMPORTS
+##################
+import os, io
+from concurrent.futures import ProcessPoolExecutor
+from typing import NamedTuple, Optional
+
+import numpy as np
+import pandas as pd
+
+from UtilLib.Util import absolutePathLocator
+from UtilLib import PriceStore
+from AnalysisLib import MetricState, PricePanel
+from DataCollectionLib import DataCatalog as Catalog
+from DataCollectionLib.DataCatalog import DataCatalog
+
+
+##################
+# CONSTANTS
+##################
+RAW_CSV_DIR = 'data/RawData/DailyPriceCsvs'
+
+# Which files to write: CSVs, NumPy arrays, or both.
+OUTPUT_FORMATS = [ 'csv', 'npy', 'both' ]
+
+
+##################
+# CLASSES
+##################
+
+class GeneratedPrices( NamedTuple ):
+   ticker: str
+   rowCount: int
+   lastBarDate: Optional[str]
+   # Hash of the raw CSV the closing prices were generated from.
+   rawHash: str
+
+
+##################
+# FUNCTIONS
+##################
+
+def rawCsvPath( ticker: str ) -> str:
+   return os.path.join( absolutePathLocator( RAW_CSV_DIR ), '%s.csv' % ticker )
+
+
+def rawCsvTickers() -> list[str]:
+   '''
+   Return every ticker with a raw daily price CSV.
+   '''
+   return [ filename[:-4] for filename in os.listdir( absolutePathLocator( RAW_CSV_DIR ) )
+            if filename.endswith( '.csv' ) ]
+
+
+def _outputPath( ticker: str, outputFormat: str ) -> str:
+   if outputFormat == 'npy':
+      return PriceStore.npyPaths( ticker )[ 1 ]
+   return PriceStore.csvPath( ticker )
+
+
+def generateClosingPrices( ticker: str, outputFormat: str = 'both' ) -> GeneratedPrices:
+   '''
+   Write the ticker's closing price files from its raw CSV.
+   '''
+   # Read the raw CSV, hashing the same bytes that get parsed,
+   # and keep only the Date and Close columns.
+   with open( rawCsvPath( ticker ), 'rb' ) as f:
+      raw = f.read()
+   df = pd.read_csv( io.BytesIO( raw ), usecols=[ 'Date', 'Close' ], dtype={ 'Date' : str } )
+
+   # Forget the full timestamp; keep only the date.
+   # Casting to a 10-character string type truncates every date at once.
+   dates = df[ 'Date' ].to_numpy().astype( 'U10' )
+
+   # Round to the nearest cent. Python's formatting rounds each price's exact
+   # value correctly, which np.round() doesn't always do, and mapping the
+   # bound method skips a Python-level function call per price.
+   prices = list( map( '%.2f'.__mod__, df[ 'Close' ].to_numpy( dtype=np.float64 ).tolist() ) )
+
+   if outputFormat in ( 'csv', 'both' ):
+      # Write the condensed data into a new CSV.
+      csvPath = PriceStore.csvPath( ticker )
+      os.makedirs( os.path.dirname( csvPath ), exist_ok=True )
+      with open( csvPath, 'w' ) as f:
+         f.write( 'Date,Close\n' )
+         f.write( ''.join( map( '%s,%s\n'.__mod__, zip( dates.tolist(), prices ) ) ) )
+
+   # Write the arrays after the CSV so that they're never older than it.
+   # They're built from the rounded strings, so they hold exactly the
+   # values that reading the CSV would give.
+   closes = np.array( prices, dtype=np.float64 )
+   if outputFormat in ( 'npy', 'both' ):
+      PriceStore.writeClosingPriceArrays( ticker, dates, closes )
+   # Last, so the checkpoint is never older than the closing prices it came from.
+   MetricState.writeCheckpoint( MetricState.MetricState.fromArrays( ticker, dates, closes ) )
+   lastBarDate = str( dates[ -1 ] ) if len( dates ) else None
+   return GeneratedPrices( ticker, len( dates ), lastBarDate, Catalog.hashBytes( raw ) )
+
+
+def _isCurrent( rawEntry: Optional[Catalog.CatalogEntry], closingEntry: Optional[Catalog.CatalogEntry] ) -> bool:
+   return rawEntry is not None and closingEntry is not None \
+      and rawEntry.contentHash is not None \
+      and rawEntry.contentHash == closingEntry.contentHash
+
+
+def isUpToDate( catalog: DataCatalog, ticker: str, outputFormat: str = 'both' ) -> bool:
+   '''
+   Returns whether the ticker's closing prices were generated from
+   the current version of its raw CSV.
+   '''
+   rawEntry = catalog.lookup( ticker, Catalog.DAILY_PRICES, rawCsvPath( ticker ) )
+   closingEntry = catalog.lookup( ticker, Catalog.CLOSING_PRICES, _outputPath( ticker, outputFormat ) )
+   return _isCurrent( rawEntry, closingEntry )
+
+
+def findStaleTickers( catalog: DataCatalog, tickers: list[str], outputFormat: str = 'both' ) -> list[str]:
+   '''
+   Like isUpToDate(), for many tickers at once: returns the tickers whose
+   closing prices need regenerating, with two catalog queries in total.
+   '''
+   rawEntries = catalog.lookupAll( Catalog.DAILY_PRICES, { t : rawCsvPath( t ) for t in tickers } )
+   closingEntries = catalog.lookupAll( Catalog.CLOSING_PRICES,
+                                       { t : _outputPath( t, outputFormat ) for t in tickers } )
+   return [ t for t in tickers if not _isCurrent( rawEntries.get( t ), closingEntries.get( t ) ) ]
+
+
+def recordInCatalog( catalog: DataCatalog, generated: GeneratedPrices ) -> None:
+   ticker = generated.ticker
+   rawEntry = catalog.lookup( ticker, Catalog.DAILY_PRICES, rawCsvPath( ticker ) )
+   if rawEntry is None or rawEntry.contentHash is None:
+      # The raw CSV was written without the catalog, so record it now.
+      catalog.record( ticker, Catalog.DAILY_PRICES, generated.rowCount, generated.lastBarDate,
+                      generated.rawHash )
+      sourceHash = generated.rawHash
+   else:
+      # A raw CSV that rows were appended to has a hash chained from the
+      # appends ( see DataCatalog.recordAppend() ), not the file's hash,
+      # so compare against whatever the raw entry holds.
+      sourceHash = rawEntry.contentHash
+   # Derived datasets record the hash of the source they were built from.
+   catalog.record( ticker, Catalog.CLOSING_PRICES, generated.rowCount, generated.lastBarDate,
+                   sourceHash )
+
+
+def generateAll( tickers: list[str], outputFormat: str = 'both', numWorkers: int = 1 ) -> list[GeneratedPrices]:
+   '''
+   Generate the closing prices of every ticker, across a pool of processes
+   if there are enough of them. Tickers that fail are reported and left out.
+   '''
+   results = []
+   if numWorkers <= 1 or len( tickers ) <= 1:
+      for ticker in tickers:
+         try:
+            results.append( generateClosingPrices( ticker, outputFormat ) )
+         except Exception as e:
+            print( "[ERROR] Could not generate closing prices for %s" % ticker )
+            print( e )
+      return results
+
+   with ProcessPoolExecutor( max_workers=min( numWorkers, len( tickers ) ) ) as executor:
+      futures = [ executor.submit( generateClosingPrices, t, outputFormat ) for t in tickers ]
+      for ticker, future in zip( tickers, futures ):
+         try:
+            results.append( future.result() )
+         except Exception as e:
+            print( "[ERROR] Could not generate closing prices for %s" % ticker )
+            print( e )
+   return results
+
+
+def updatePricePanel( tickers: list[str], changed: bool = True ) -> bool:
+   '''
+   Consolidate the tickers' closing prices into the memory-mapped price panel,
+   unless nothing changed and the panel already holds exactly those tickers.
+   Returns whether the panel was rebuilt.
+   '''
+   panelPath = absolutePathLocator( PricePanel.PANEL_DIR )
+   if changed or not os.path.exists( panelPath ) \
+      or set( PricePanel.PricePanel().tickers ) != set( tickers ):
+      PricePanel.buildPricePanel( tickers )
+      return True
+   return False
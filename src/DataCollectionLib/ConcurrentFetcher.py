@@ -0,0 +1,154 @@
+#!/usr/bin/env python
+
+'''
+Run data-collection functions for many tickers concurrently.
+
+Each ticker is handled by one worker thread, which runs the ticker's tasks
+one after another. A task that fails or raises only affects that task,
+so the other tasks and tickers carry on. All workers share one rate limiter,
+which caps how many tasks ( i.e. requests ) start per second overall.
+
+Example:
+   >>> tasks = [ ( 'prices', lambda t: RawDataUtil.getDailyPriceCsv( t, '%s.csv' % t ) ),
+   ...           ( 'info', lambda t: RawDataUtil.getYahooFinanceInfoDict( t, '%s.json' % t ) ) ]
+   >>> summary = ConcurrentFetcher.fetchAll( [ 'AAPL', 'MSFT' ], tasks, numWorkers=4,
+   ...                                       maxRequestsPerSecond=5 )
+   >>> print( summary.report() )
+'''
+
+
+##################
+# IMPORTS
+##################
+import threading, time
+from typing import Callable, Optional, Sequence
+from concurrent.futures import ThreadPoolExecutor
+
+from UtilLib.RateLimiter import RateLimiter
+
+
+##################
+# CLASSES
+##################
+
+# A task has a name and a function that takes a ticker and returns 0 on success,
+# like the functions in RawDataUtil.
+FetchTask = tuple[str, Callable[[str], int]]
+
+
+class FetchSummary:
+   def __init__( self, tickers: list[str] ) -> None:
+      self.tickers = tickers
+      self.tickerToFailedTasksMap: dict[str, list[str]] = {}
+      self.numTasksRun = 0
+      self.numTasksSkipped = 0
+      self.elapsedSeconds = 0.0
+
+   @property
+   def succeededTickers( self ) -> list[str]:
+      return [ t for t in self.tickers if t not in self.tickerToFailedTasksMap ]
+
+   @property
+   def failedTickers( self ) -> list[str]:
+      return [ t for t in self.tickers if t in self.tickerToFailedTasksMap ]
+
+   @property
+   def tasksPerSecond( self ) -> float:
+      return self.numTasksRun / self.elapsedSeconds if self.elapsedSeconds else 0.0
+
+   def report( self ) -> str:
+      lines = [ "Fetched %d tickers in %.1fs ( %.1f tasks/s, %d tasks skipped ): %d succeeded, %d failed" % \
+                ( len( self.tickers ), self.elapsedSeconds, self.tasksPerSecond, self.numTasksSkipped,
+                  len( self.succeededTickers ), len( self.failedTickers ) ) ]
+      for ticker in self.failedTickers:
+         lines.append( "   %s: %s" % ( ticker, ", ".join( self.tickerToFailedTasksMap[ ticker ] ) ) )
+      return "\n".join( lines )
+
+
+##################
+# FUNCTIONS
+##################
+
+def fetchTicker( ticker: str,
+                 tasks: Sequence[FetchTask],
+                 rateLimiter: Optional[RateLimiter] = None,
+                 skipTask: Optional[Callable[[str, str], bool]] = None ) -> tuple[list[str], int]:
+   '''
+   Run the ticker's tasks one after another, as one of fetchAll()'s workers
+   does, and return the names of the tasks that failed and how many were skipped.
+   Callers that stream tickers in can use it directly.
+
+   Keyword arguments:
+      ticker      -- The ticker symbol
+      tasks       -- ( name, function ) pairs to run, in order
+      rateLimiter -- Shared cap on how many tasks start per second, if any
+      skipTask    -- Like in fetchAll()
+   '''
+   failedTasks = []
+   numSkipped = 0
+   for name, func in tasks:
+      if skipTask is not None and skipTask( name, ticker ):
+         numSkipped += 1
+         continue
+      if rateLimiter is not None:
+         rateLimiter.acquire()
+      try:
+         if func( ticker ) != 0:
+            failedTasks.append( name )
+      except Exception as e:
+         print( "[ERROR] %s failed for %s: %s" % ( name, ticker, e ) )
+         failedTasks.append( name )
+   return failedTasks, numSkipped
+
+
+def fetchAll( tickers: list[str],
+              tasks: Sequence[FetchTask],
+              numWorkers: int = 8,
+              maxRequestsPerSecond: Optional[float] = None,
+              showProgress: bool = True,
+              skipTask: Optional[Callable[[str, str], bool]] = None,
+              afterTicker: Optional[Callable[[str], None]] = None ) -> FetchSummary:
+   '''
+   Run every task for every ticker, and return a summary of what failed.
+
+   Keyword arguments:
+      tickers              -- The ticker symbols
+      tasks                -- ( name, function ) pairs to run for each ticker, in order
+      numWorkers           -- How many tickers to work on at the same time
+      maxRequestsPerSecond -- Global cap on how many tasks start per second.
+                              None means no cap.
+      showProgress         -- Print a line each time a ticker finishes
+      skipTask             -- Optional function taking a task name and a ticker,
+                              which returns True if the task can be skipped
+                              ( e.g. because its data is up-to-date ).
+                              Skipped tasks don't count against the rate cap.
+      afterTicker          -- Optional function called with each ticker once
+                              all of its tasks have run, e.g. to free what
+                              they kept for the ticker.
+   '''
+   summary = FetchSummary( tickers )
+   rateLimiter = RateLimiter( maxRequestsPerSecond )
+   lock = threading.Lock()
+   numDone = 0
+
+   def worker( ticker: str ) -> None:
+      nonlocal numDone
+      failedTasks, numSkipped = fetchTicker( ticker, tasks, rateLimiter, skipTask )
+      if afterTicker is not None:
+         afterTicker( ticker )
+      with lock:
+         summary.numTasksRun += len( tasks ) - numSkipped
+         summary.numTasksSkipped += numSkipped
+         if failedTasks:
+            summary.tickerToFailedTasksMap[ ticker ] = failedTasks
+         numDone += 1
+         if showProgress:
+            status = "FAILED: " + ", ".join( failedTasks ) if failedTasks else "OK"
+            print( "[%d/%d] %s %s" % ( numDone, len( tickers ), ticker, status ) )
+
+   start = time.monotonic()
+   with ThreadPoolExecutor( max_workers=max( 1, numWorkers ) ) as executor:
+      # list() re-raises anything unexpected from the workers.
+      list( executor.map( worker, tickers ) )
+   summary.elapsedSeconds = time.monotonic() - start
+   return summary
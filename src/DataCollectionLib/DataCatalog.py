@@ -0,0 +1,211 @@
+#!/usr/bin/env python
+
+'''
+A small SQLite catalog that tracks how fresh each ticker's data files are.
+
+For every ( ticker, dataset ) pair, the catalog records when the data was last
+updated, how many rows it holds, the date of its last bar, and a hash of its
+content. The update scripts look entries up to decide whether a file needs
+refreshing without opening the file itself.
+
+Derived datasets ( e.g. CLOSING_PRICES, built from DAILY_PRICES ) record the
+content hash of the source they were built from, so a derived file only needs
+rebuilding when its source's hash changes.
+
+Example:
+   >>> catalog = DataCatalog()
+   >>> catalog.isFresh( 'AAPL', INFO )
+   False
+   >>> catalog.recordFile( 'AAPL', INFO, 'data/RawData/YahooFinanceInfo/AAPL.json' )
+   >>> catalog.isFresh( 'AAPL', INFO )
+   True
+'''
+
+
+##################
+# IMPORTS
+##################
+import os, sqlite3, hashlib, datetime, threading
+from typing import NamedTuple, Optional
+
+from UtilLib import Util, TradingCalendar
+
+
+##################
+# CONSTANTS
+##################
+CATALOG_PATH = 'data/catalog.sqlite'
+
+# Datasets
+DAILY_PRICES = 'dailyPrices'
+INFO = 'info'
+FAST_INFO = 'fastInfo'
+DIVIDENDS = 'dividends'
+FINANCIALS = 'financials'
+CLOSING_PRICES = 'closingPrices'
+
+# How long a dataset stays fresh after it's updated.
+# DAILY_PRICES is fresh as long as its last bar is the last completed session instead.
+DATASET_TO_MAX_AGE_MAP = {
+   INFO : datetime.timedelta( hours=20 ),
+   FAST_INFO : datetime.timedelta( hours=20 ),
+   DIVIDENDS : datetime.timedelta( hours=20 ),
+   FINANCIALS : datetime.timedelta( days=30 ),
+}
+
+
+##################
+# CLASSES
+##################
+
+class CatalogEntry( NamedTuple ):
+   ticker: str
+   dataset: str
+   lastUpdated: str   # ISO timestamp
+   rowCount: Optional[int]
+   lastBarDate: Optional[str]   # 'YYYY-MM-DD'
+   contentHash: Optional[str]
+
+   @property
+   def lastUpdatedDatetime( self ) -> datetime.datetime:
+      return datetime.datetime.fromisoformat( self.lastUpdated )
+
+
+def hashBytes( data: bytes ) -> str:
+   return hashlib.sha1( data ).hexdigest()
+
+
+def hashFile( path: str ) -> str:
+   with open( path, 'rb' ) as f:
+      return hashBytes( f.read() )
+
+
+def _fileMatchesEntry( path: str, entry: CatalogEntry ) -> bool:
+   '''
+   Returns whether the file exists and wasn't modified after the entry was recorded.
+   '''
+   try:
+      fileMtime = os.stat( path ).st_mtime
+   except FileNotFoundError:
+      return False
+   return fileMtime <= entry.lastUpdatedDatetime.timestamp() + 1
+
+
+class DataCatalog:
+   def __init__( self, path: str = '' ) -> None:
+      self.path = path or Util.absolutePathLocator( CATALOG_PATH )
+      # The catalog is shared by the fetcher's worker threads.
+      self.lock = threading.Lock()
+      self.connection = sqlite3.connect( self.path, check_same_thread=False )
+      self.connection.execute( 'PRAGMA journal_mode=WAL' )
+      self.connection.execute( 'PRAGMA synchronous=NORMAL' )
+      self.connection.execute( '''
+         CREATE TABLE IF NOT EXISTS entries (
+            ticker TEXT NOT NULL,
+            dataset TEXT NOT NULL,
+            lastUpdated TEXT NOT NULL,
+            rowCount INTEGER,
+            lastBarDate TEXT,
+            contentHash TEXT,
+            PRIMARY KEY ( ticker, dataset )
+         )''' )
+      self.connection.commit()
+
+   def close( self ) -> None:
+      self.connection.close()
+
+   def get( self, ticker: str, dataset: str ) -> Optional[CatalogEntry]:
+      with self.lock:
+         row = self.connection.execute(
+            'SELECT * FROM entries WHERE ticker = ? AND dataset = ?',
+            ( ticker, dataset ) ).fetchone()
+      return CatalogEntry( *row ) if row else None
+
+   def getAll( self, dataset: str ) -> dict[str, CatalogEntry]:
+      '''
+      Return every ticker's entry for the dataset, with a single query.
+      '''
+      with self.lock:
+         rows = self.connection.execute(
+            'SELECT * FROM entries WHERE dataset = ?', ( dataset, ) ).fetchall()
+      return { row[ 0 ] : CatalogEntry( *row ) for row in rows }
+
+   def record( self,
+               ticker: str,
+               dataset: str,
+               rowCount: Optional[int] = None,
+               lastBarDate: Optional[str] = None,
+               contentHash: Optional[str] = None ) -> None:
+      '''
+      Record that the ticker's dataset was just updated.
+      '''
+      lastUpdated = datetime.datetime.now().isoformat()
+      with self.lock:
+         self.connection.execute(
+            'INSERT OR REPLACE INTO entries VALUES ( ?, ?, ?, ?, ?, ? )',
+            ( ticker, dataset, lastUpdated, rowCount, lastBarDate, contentHash ) )
+         self.connection.commit()
+
+   def recordFile( self,
+                   ticker: str,
+                   dataset: str,
+                   path: str,
+                   rowCount: Optional[int] = None,
+                   lastBarDate: Optional[str] = None ) -> None:
+      '''
+      Record a file that was just written, hashing its content.
+      '''
+      self.record( ticker, dataset, rowCount, lastBarDate, hashFile( path ) )
+
+   def recordAppend( self,
+                     ticker: str,
+                     dataset: str,
+                     path: str,
+                     appendedBytes: bytes,
+                     nAppendedRows: int,
+                     lastBarDate: str ) -> None:
+      '''
+      Record rows that were just appended to a file. The new hash is chained
+      from the previous one, so the file doesn't have to be read again.
+      '''
+      previous = self.get( ticker, dataset )
+      if previous is None or previous.contentHash is None or previous.rowCount is None:
+         self.recordFile( ticker, dataset, path, None, lastBarDate )
+         return
+      contentHash = hashBytes( previous.contentHash.encode() + appendedBytes )
+      self.record( ticker, dataset, previous.rowCount + nAppendedRows, lastBarDate, contentHash )
+
+   def lookup( self, ticker: str, dataset: str, path: str = '' ) -> Optional[CatalogEntry]:
+      '''
+      Like get(), but if a path is given, ignore the entry when the file
+      is missing or was modified after the entry was recorded
+      ( e.g. by something that doesn't update the catalog ).
+      Only the file's metadata is read.
+      '''
+      entry = self.get( ticker, dataset )
+      if entry is None or not path:
+         return entry
+      return entry if _fileMatchesEntry( path, entry ) else None
+
+   def lookupAll( self, dataset: str, tickerToPathMap: dict[str, str] ) -> dict[str, CatalogEntry]:
+      '''
+      Like lookup() for many tickers at once, with a single query.
+      Tickers without a valid entry are left out.
+      '''
+      tickerToEntryMap = self.getAll( dataset )
+      return { ticker : tickerToEntryMap[ ticker ] for ticker, path in tickerToPathMap.items()
+               if ticker in tickerToEntryMap and _fileMatchesEntry( path, tickerToEntryMap[ ticker ] ) }
+
+   def isFresh( self, ticker: str, dataset: str, path: str = '' ) -> bool:
+      '''
+      Return whether the ticker's dataset is recent enough to skip updating it.
+      '''
+      entry = self.lookup( ticker, dataset, path )
+      if entry is None:
+         return False
+      if dataset == DAILY_PRICES:
+         return entry.lastBarDate is not None and TradingCalendar.isUpToDate( entry.lastBarDate )
+      maxAge = DATASET_TO_MAX_AGE_MAP.get( dataset )
+      if maxAge is None:
+         return False
+      return datetime.datetime.now() - entry.lastUpdatedDatetime < maxAge
@@ -0,0 +1,244 @@
+#!/usr/bin/env python
+
+'''
+Extract one table from a large HTML page without building a tree of the whole page.
+
+The scrapers only need one table from each page, but BeautifulSoup parses all
+of the page's markup into Python objects first. This module streams the page
+through the standard library's HTMLParser, only keeps the text of the target
+table's cells, and stops as soon as that table is closed.
+
+The results match what BeautifulSoup( html, 'html.parser' ) gives:
+   - Tables are counted in document order, like soup.find_all( 'table' ).
+   - A row's cells are all the td/th elements inside it, and a cell's text
+     is all the text inside it, like row.find_all( 'td' ) and cell.text.
+     Text in <script>, <style>, <template>, <rt> and <rp> elements and in
+     comments is skipped, and whitespace-only text is collapsed.
+   - Unclosed tags stay open until the end tag of an enclosing element,
+     the way BeautifulSoup's html.parser builder handles them.
+
+Example:
+   >>> table = HtmlTableExtractor.extractTable( html, tableIndex=1 )
+   >>> table.headerText()
+   'Company'
+   >>> [ cells[ 1 ] for cells in table.dataRows()[ 1: ] ]
+   [ 'MMM', 'AXP', ... ]
+'''
+
+
+##################
+# IMPORTS
+##################
+from html.parser import HTMLParser
+from typing import NamedTuple, Optional
+
+
+##################
+# CONSTANTS
+##################
+
+# Elements that never have an end tag, so they're never left open.
+# Same list as BeautifulSoup's HTMLTreeBuilder.
+VOID_ELEMENTS = { 'area', 'base', 'br', 'col', 'embed', 'hr', 'img', 'input', 'keygen',
+                  'link', 'menuitem', 'meta', 'param', 'source', 'track', 'wbr',
+                  'basefont', 'bgsound', 'command', 'frame', 'image', 'isindex',
+                  'nextid', 'spacer' }
+
+# Elements whose text isn't part of the page's visible text.
+SKIPPED_TEXT_ELEMENTS = { 'script', 'style', 'template', 'rt', 'rp' }
+
+# Elements in which whitespace-only text is kept as-is. Elsewhere, it's
+# collapsed to a single newline or space.
+PRESERVE_WHITESPACE_ELEMENTS = { 'pre', 'textarea' }
+ASCII_SPACES = set( '\x20\x0a\x09\x0c\x0d' )
+
+CELL_TAGS = { 'td', 'th' }
+
+
+##################
+# CLASSES
+##################
+
+class Cell( NamedTuple ):
+   tag: str   # 'td' or 'th'
+   text: str
+
+
+class Table:
+   def __init__( self, rows: list[list[Cell]], firstHeaderCell: Optional[Cell] ) -> None:
+      self.rows = rows
+      self.firstHeaderCell = firstHeaderCell
+
+   def dataRows( self ) -> list[list[str]]:
+      '''
+      Returns the text of the td cells in each row, like
+      [ [ c.text for c in row.find_all( 'td' ) ] for row in table.find_all( 'tr' ) ].
+      '''
+      return [ [ cell.text for cell in row if cell.tag == 'td' ] for row in self.rows ]
+
+   def headerText( self ) -> Optional[str]:
+      '''
+      Returns the text of the table's first th cell, like table.find( 'th' ).text.
+      '''
+      return self.firstHeaderCell.text if self.firstHeaderCell is not None else None
+
+
+class _OpenCell:
+   def __init__( self, tag: str ) -> None:
+      self.tag = tag
+      self.textParts: list[str] = []
+
+
+class _TableFound( Exception ):
+   '''
+   Raised to stop parsing once the target table is closed.
+   '''
+
+
+class _TableParser( HTMLParser ):
+   def __init__( self, tableIndex: int ) -> None:
+      super().__init__( convert_charrefs=True )
+      self.tableIndex = tableIndex
+      self.numTablesSeen = 0
+      # Names of the open tags outside the target table.
+      self.outerTags: list[str] = []
+      # Open tags inside the target table, including the table itself.
+      # Each entry holds the tag and, for cells, the cell being read.
+      self.openTags: list[tuple[str, Optional[_OpenCell]]] = []
+      self.openCells: list[_OpenCell] = []
+      # How many open elements ( inside or outside the table ) skip or preserve text.
+      self.numOpenSkippedElements = 0
+      self.numOpenPreserveElements = 0
+      # Text since the last tag or comment.
+      self.currentData: list[str] = []
+      self.rows: list[list[_OpenCell]] = []
+      self.openRows: list[list[_OpenCell]] = []
+      # The first th, which might not be in any row.
+      self.firstHeaderCell: Optional[_OpenCell] = None
+      self.found = False
+
+   def _updateOpenCounts( self, tag: str, delta: int ) -> None:
+      if tag in SKIPPED_TEXT_ELEMENTS:
+         self.numOpenSkippedElements += delta
+      elif tag in PRESERVE_WHITESPACE_ELEMENTS:
+         self.numOpenPreserveElements += delta
+
+   def _flushData( self ) -> None:
+      '''
+      Add the text since the last tag or comment to the open cells.
+      '''
+      if not self.currentData:
+         return
+      data = ''.join( self.currentData )
+      self.currentData = []
+      if self.numOpenSkippedElements:
+         return
+      if not self.numOpenPreserveElements and all( c in ASCII_SPACES for c in data ):
+         data = '\n' if '\n' in data else ' '
+      for cell in self.openCells:
+         # Text belongs to every cell it's inside.
+         cell.textParts.append( data )
+
+   def handle_starttag( self, tag: str, attrs: list ) -> None:
+      self._flushData()
+      if tag in VOID_ELEMENTS:
+         return
+      if not self.openTags:
+         # Outside the target table, we only need to count tables
+         # and keep track of which tags are open.
+         if tag == 'table':
+            self.numTablesSeen += 1
+            if self.numTablesSeen == self.tableIndex + 1:
+               self.found = True
+               self.openTags.append( ( tag, None ) )
+               return
+         self.outerTags.append( tag )
+         self._updateOpenCounts( tag, 1 )
+         return
+
+      cell = None
+      if tag == 'tr':
+         row: list[_OpenCell] = []
+         self.rows.append( row )
+         self.openRows.append( row )
+      elif tag in CELL_TAGS:
+         cell = _OpenCell( tag )
+         if tag == 'th' and self.firstHeaderCell is None:
+            self.firstHeaderCell = cell
+         # A cell belongs to every row it's inside.
+         for openRow in self.openRows:
+            openRow.append( cell )
+         self.openCells.append( cell )
+      self._updateOpenCounts( tag, 1 )
+      self.openTags.append( ( tag, cell ) )
+
+   def handle_endtag( self, tag: str ) -> None:
+      self._flushData()
+      # Close the most recent matching tag, and any tags left open inside it.
+      # An end tag that doesn't match any open tag is ignored.
+      for i in range( len( self.openTags ) - 1, -1, -1 ):
+         if self.openTags[ i ][ 0 ] == tag:
+            while len( self.openTags ) > i:
+               self._pop()
+            if not self.openTags:
+               raise _TableFound()
+            return
+      for i in range( len( self.outerTags ) - 1, -1, -1 ):
+         if self.outerTags[ i ] == tag:
+            for outerTag in self.outerTags[ i: ]:
+               self._updateOpenCounts( outerTag, -1 )
+            del self.outerTags[ i: ]
+            if self.openTags:
+               # This closes an element around the target table, so the table too.
+               raise _TableFound()
+            return
+
+   def _pop( self ) -> None:
+      tag, cell = self.openTags.pop()
+      if tag == 'tr':
+         self.openRows.pop()
+      elif cell is not None:
+         self.openCells.pop()
+      self._updateOpenCounts( tag, -1 )
+
+   def handle_data( self, data: str ) -> None:
+      if self.openCells:
+         self.currentData.append( data )
+
+   def handle_comment( self, data: str ) -> None:
+      self._flushData()
+
+   def handle_decl( self, decl: str ) -> None:
+      self._flushData()
+
+   def handle_pi( self, data: str ) -> None:
+      self._flushData()
+
+   def unknown_decl( self, data: str ) -> None:
+      self._flushData()
+
+
+##################
+# FUNCTIONS
+##################
+
+def extractTable( html: str, tableIndex: int = 0 ) -> Table:
+   '''
+   Returns the page's table at the given position, counting from 0 in document order.
+   Raises IndexError if the page has fewer tables.
+   '''
+   parser = _TableParser( tableIndex )
+   try:
+      parser.feed( html )
+      parser.close()
+      parser._flushData()
+   except _TableFound:
+      pass
+   if not parser.found:
+      raise IndexError( "The page only has %d tables" % parser.numTablesSeen )
+   def toCell( openCell: _OpenCell ) -> Cell:
+      return Cell( openCell.tag, ''.join( openCell.textParts ) )
+
+   rows = [ [ toCell( cell ) for cell in row ] for row in parser.rows ]
+   firstHeaderCell = toCell( parser.firstHeaderCell ) if parser.firstHeaderCell is not None else None
+   return Table( rows, firstHeaderCell )
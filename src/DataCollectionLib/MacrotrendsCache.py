@@ -0,0 +1,216 @@
+#!/usr/bin/env python
+
+'''
+A persistent cache of Macrotrends pages, keyed by ( ticker, metric ).
+
+Each entry holds the page's raw HTML ( compressed ) and the year -> value map
+parsed from it, so a cache hit skips both the browser and the HTML parser.
+Annual fundamentals change at most a few times a year, so entries stay valid
+for a TTL that can be set per metric. When the cache grows past maxBytes,
+the least recently used entries are evicted.
+
+Example:
+   >>> cache = MacrotrendsCache()
+   >>> cache.put( 'JPM', 'net-income', html, { 2022 : 37676000000.0 } )
+   >>> cache.get( 'JPM', 'net-income' ).yearToValueMap
+   {2022: 37676000000.0}
+   >>> print( cache.stats.report() )
+   Macrotrends cache: 1 hits, 0 misses ( 0 expired ), 0 evictions
+'''
+
+
+##################
+# IMPORTS
+##################
+import json, sqlite3, threading, time, zlib
+from typing import NamedTuple, Optional
+
+from UtilLib import Util
+
+
+##################
+# CONSTANTS
+##################
+CACHE_PATH = 'data/macrotrends-cache.sqlite'
+
+DEFAULT_TTL_SECONDS = 30 * 24 * 60 * 60
+
+# Metrics whose pages change more often than DEFAULT_TTL_SECONDS allows for.
+METRIC_TO_TTL_SECONDS_MAP: dict[str, float] = {}
+
+DEFAULT_MAX_BYTES = 200 * 1024 * 1024
+
+
+##################
+# CLASSES
+##################
+
+class CachedPage( NamedTuple ):
+   html: str
+   yearToValueMap: Optional[dict[int, float]]   # None if the page hasn't been parsed.
+   fetchedAt: float   # Seconds since the epoch
+
+
+class CacheStats:
+   def __init__( self ) -> None:
+      self.hits = 0
+      self.misses = 0
+      self.expired = 0
+      self.evictions = 0
+
+   @property
+   def hitRate( self ) -> float:
+      lookups = self.hits + self.misses
+      return self.hits / lookups if lookups else 0.0
+
+   def report( self ) -> str:
+      return "Macrotrends cache: %d hits, %d misses ( %d expired ), %d evictions" % \
+             ( self.hits, self.misses, self.expired, self.evictions )
+
+
+class MacrotrendsCache:
+   def __init__( self,
+                 path: str = '',
+                 maxBytes: int = DEFAULT_MAX_BYTES,
+                 defaultTtlSeconds: float = DEFAULT_TTL_SECONDS ) -> None:
+      '''
+      Keyword arguments:
+         path              -- SQLite file to keep the cache in. Defaults to CACHE_PATH.
+         maxBytes          -- Evict the least recently used pages when the
+                              compressed HTML takes up more than this.
+         defaultTtlSeconds -- How long pages stay valid, unless their metric
+                              is in METRIC_TO_TTL_SECONDS_MAP.
+      '''
+      self.path = path or Util.absolutePathLocator( CACHE_PATH )
+      self.maxBytes = maxBytes
+      self.defaultTtlSeconds = defaultTtlSeconds
+      self.stats = CacheStats()
+      # The cache is shared by the threads loading pages.
+      self.lock = threading.Lock()
+      self.connection = sqlite3.connect( self.path, check_same_thread=False )
+      self.connection.execute( 'PRAGMA journal_mode=WAL' )
+      self.connection.execute( '''
+         CREATE TABLE IF NOT EXISTS pages (
+            ticker TEXT NOT NULL,
+            metric TEXT NOT NULL,
+            fetchedAt REAL NOT NULL,
+            lastAccessed REAL NOT NULL,
+            html BLOB NOT NULL,
+            parsed TEXT,
+            size INTEGER NOT NULL,
+            PRIMARY KEY ( ticker, metric )
+         )''' )
+      self.connection.commit()
+
+   def close( self ) -> None:
+      self.connection.close()
+
+   def ttlSeconds( self, metric: str ) -> float:
+      return METRIC_TO_TTL_SECONDS_MAP.get( metric, self.defaultTtlSeconds )
+
+   def get( self, ticker: str, metric: str ) -> Optional[CachedPage]:
+      '''
+      Return the cached page, or None if it's missing or older than its TTL.
+      '''
+      now = time.time()
+      with self.lock:
+         row = self.connection.execute(
+            'SELECT fetchedAt, html, parsed FROM pages WHERE ticker = ? AND metric = ?',
+            ( ticker, metric ) ).fetchone()
+         if row is None:
+            self.stats.misses += 1
+            return None
+         fetchedAt, html, parsed = row
+         if now - fetchedAt > self.ttlSeconds( metric ):
+            self.stats.misses += 1
+            self.stats.expired += 1
+            return None
+         self.stats.hits += 1
+         self.connection.execute(
+            'UPDATE pages SET lastAccessed = ? WHERE ticker = ? AND metric = ?',
+            ( now, ticker, metric ) )
+         self.connection.commit()
+
+      yearToValueMap = None
+      if parsed is not None:
+         # JSON turns the integer keys into strings.
+         yearToValueMap = { int( year ) : value for year, value in json.loads( parsed ).items() }
+      return CachedPage( zlib.decompress( html ).decode(), yearToValueMap, fetchedAt )
+
+   def put( self,
+            ticker: str,
+            metric: str,
+            html: str,
+            yearToValueMap: Optional[dict[int, float]] = None ) -> None:
+      now = time.time()
+      compressedHtml = zlib.compress( html.encode() )
+      parsed = json.dumps( yearToValueMap ) if yearToValueMap is not None else None
+      with self.lock:
+         self.connection.execute(
+            'INSERT OR REPLACE INTO pages VALUES ( ?, ?, ?, ?, ?, ?, ? )',
+            ( ticker, metric, now, now, compressedHtml, parsed, len( compressedHtml ) ) )
+         self._evict()
+         self.connection.commit()
+
+   def putParsed( self, ticker: str, metric: str, yearToValueMap: dict[int, float] ) -> None:
+      '''
+      Store the values parsed from a page that's already cached. The page
+      keeps its fetchedAt, so its TTL still runs from when it was loaded.
+      '''
+      with self.lock:
+         self.connection.execute(
+            'UPDATE pages SET parsed = ? WHERE ticker = ? AND metric = ?',
+            ( json.dumps( yearToValueMap ), ticker, metric ) )
+         self.connection.commit()
+
+   def _evict( self ) -> None:
+      '''
+      Delete the least recently used pages until the cache fits in maxBytes.
+      Call with the lock held.
+      '''
+      totalBytes = self.connection.execute( 'SELECT COALESCE( SUM( size ), 0 ) FROM pages' ).fetchone()[ 0 ]
+      if totalBytes <= self.maxBytes:
+         return
+      rows = self.connection.execute(
+         'SELECT ticker, metric, size FROM pages ORDER BY lastAccessed' ).fetchall()
+      for ticker, metric, size in rows:
+         if totalBytes <= self.maxBytes:
+            break
+         self.connection.execute( 'DELETE FROM pages WHERE ticker = ? AND metric = ?', ( ticker, metric ) )
+         totalBytes -= size
+         self.stats.evictions += 1
+
+   def invalidate( self, ticker: str, metric: Optional[str] = None ) -> None:
+      '''
+      Drop the ticker's page for the metric, or all of its pages if metric is None.
+      '''
+      with self.lock:
+         if metric is None:
+            self.connection.execute( 'DELETE FROM pages WHERE ticker = ?', ( ticker, ) )
+         else:
+            self.connection.execute( 'DELETE FROM pages WHERE ticker = ? AND metric = ?', ( ticker, metric ) )
+         self.connection.commit()
+
+   def clear( self ) -> None:
+      with self.lock:
+         self.connection.execute( 'DELETE FROM pages' )
+         self.connection.commit()
+
+
+##################
+# FUNCTIONS
+##################
+
+_sharedCache: Optional[MacrotrendsCache] = None
+_sharedCacheLock = threading.Lock()
+
+
+def getSharedCache() -> MacrotrendsCache:
+   '''
+   Returns the cache MacrotrendsUtil uses, opening it on first use.
+   '''
+   global _sharedCache
+   with _sharedCacheLock:
+      if _sharedCache is None:
+         _sharedCache = MacrotrendsCache()
+      return _sharedCache
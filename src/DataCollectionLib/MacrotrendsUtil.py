@@ -22,13 +22,18 @@ Tools for scraping and parsing data from Macrotrends.
 ##### IMPORTS
 ################
 import re, argparse
-
-from bs4 import BeautifulSoup
+from typing import Optional
+from concurrent.futures import ThreadPoolExecutor
 
 import pandas as pd
 from pandas import DataFrame
 
 from UtilLib.Util import getPageSourceUsingSelenium
+from UtilLib import RequestGovernor
+from DataCollectionLib import DataCatalog as Catalog
+from DataCollectionLib import HtmlTableExtractor
+from DataCollectionLib import MacrotrendsCache
+from DataCollectionLib.DataCatalog import DataCatalog
 
 ################
 ##### CONSTANTS
@@ -50,19 +55,35 @@ ESSENTIAL_METRICS = [ 'net-income',
                       'eps-earnings-per-share-diluted'
 ]
 
+# How many pages getDataFrame() loads at the same time.
+DEFAULT_NUM_WORKERS = 4
+
+# Minimum time between two page loads from macrotrends.net, no matter
+# how many threads are loading pages. Cached pages don't count.
+DEFAULT_POLITENESS_DELAY = 1.0
+
+# Page loads go through the shared RequestGovernor, which also slows down,
+# retries and stops for a while when macrotrends.net pushes back.
+RequestGovernor.getSharedGovernor().configureHost( RequestGovernor.MACROTRENDS_HOST,
+                                                   1.0 / DEFAULT_POLITENESS_DELAY )
+
 
 ################
 ##### FUNCTIONS
 ################
 
-def getPageSource( ticker: str, metric: str ) -> str:
+def getPageSource( ticker: str, metric: str, bypassCache: bool = False ) -> str:
    '''
    Returns a string with the HTML corresponding to the Macrotrends page
    for the given ticker and metric.
 
+   Pages are kept in the MacrotrendsCache, so this only loads the page
+   if the cache doesn't have a recent copy.
+
    Params:
       ticker - ticker symbol of the comapny.
       metric - financial metric of interest, with dashes separating each word.
+      bypassCache - Load the page even if it's cached, and cache the new copy.
 
    Example:
       If ticker == "JPM" and metric == "net-income",
@@ -74,19 +95,85 @@ def getPageSource( ticker: str, metric: str ) -> str:
        "Automated access to our data is prohibited by our data provider."
    TODO: Find a way past this.
    '''
+   cache = MacrotrendsCache.getSharedCache()
+   if not bypassCache:
+      cachedPage = cache.get( ticker, metric )
+      if cachedPage is not None:
+         return cachedPage.html
+   html = _loadPage( ticker, metric )
+   # Only cache pages with data, so a blocked load ( see above ) is tried
+   # again next time instead of being served from the cache until it expires.
+   try:
+      yearToValueMap = parseAnnualData( html )
+   except ValueError:
+      return html
+   cache.put( ticker, metric, html, yearToValueMap )
+   return html
+
+
+def setPolitenessDelay( seconds: float ) -> None:
+   '''
+   Set the minimum time between two page loads from macrotrends.net.
+   0 means no delay.
+   '''
+   RequestGovernor.getSharedGovernor().configureHost( RequestGovernor.MACROTRENDS_HOST,
+                                                      1.0 / seconds if seconds > 0 else None )
+
+
+def _loadPage( ticker: str, metric: str ) -> str:
    tickerStr = "%s/%s" % ( ticker, ticker.lower() )
    url = MACROTRENDS_URL_TEMPLATE % ( tickerStr, metric )
-   return getPageSourceUsingSelenium( url )
+   return RequestGovernor.getSharedGovernor().call( RequestGovernor.MACROTRENDS_HOST,
+                                                    getPageSourceUsingSelenium, url )
+
+
+def parseAnnualData( html: str ) -> dict[int, float]:
+   '''
+   Returns the year -> value map from the annual table of a Macrotrends page.
+   '''
+   # The annual values are in the first table.
+   try:
+      annualDataTable = HtmlTableExtractor.extractTable( html, 0 )
+   except IndexError:
+      raise ValueError( "The page has no annual data table" )
+
+   # Some tables show values in Millions of US $
+   tableHeader = annualDataTable.headerText()
+   if tableHeader is None:
+      raise ValueError( "The annual data table has no header" )
+   multiplyByOneMillion = 'Millions of US $' in tableHeader
+
+   # Go through each row of the table ( except the header row ),
+   # and extract the year and the value.
+   yearToValueMap = {}
+   for cells in annualDataTable.dataRows()[ 1: ]:
+      year = int( cells[ 0 ] )
+      valueStr = re.sub( "[^0-9-.]", "", cells[ 1 ] )
+
+      # Sometimes the cell just contains "$", with no digits. In that case,
+      # default to 0.
+      value = float( valueStr ) if valueStr else 0
+
+      if multiplyByOneMillion:
+         value = value * 1000000
+      yearToValueMap[ year ] = value
+
+   return yearToValueMap
 
 
-def getAnnualData( ticker: str, metric: str ) -> dict[int, float]:
+def getAnnualData( ticker: str, metric: str, bypassCache: bool = False ) -> dict[int, float]:
    '''
    Returns a dictionary where the key is the year and the value
    is the value of the metric for that year.
 
+   The parsed values are cached along with the page, so a cache hit
+   doesn't load or parse anything.
+
    Params:
       ticker - ticker symbol of the comapny.
       metric - financial metric of interest, with dashes separating each word.
+      bypassCache - Load and parse the page even if it's cached,
+                    and cache the new values.
 
    Example:
       >>> dataDict = MacrotrendsUtil.getAnnualData( 'JPM', 'net-income' )
@@ -100,39 +187,32 @@ def getAnnualData( ticker: str, metric: str ) -> dict[int, float]:
 
    IMPORTANT: Macrotrends only shows roughly the most recent 13 years of data.
    '''
-   data = getPageSource( ticker, metric )
-   soup = BeautifulSoup( data, 'html.parser' )
-
-   # Find the table with the annual values.
-   tables = soup.find_all( 'table' )
-   annualDataTable = tables[ 0 ]
-   tableRows = annualDataTable.find_all( 'tr' )
-
-   # Some tables show values in Millions of US $
-   tableHeader = annualDataTable.find( 'th' ).text
-   multiplyByOneMillion = 'Millions of US $' in tableHeader
-
-   # Go through each row of the table ( except the header row ),
-   # and extract the year and the value.
-   yearToValueMap = {}
-   for row in tableRows[ 1: ]:
-      cells = row.find_all( 'td' )
-      year = int( cells[ 0 ].text )
-      valueStr = re.sub( "[^0-9-.]", "", cells[ 1 ].text )
-
-      # Sometimes the cell just contains "$", with no digits. In that case,
-      # default to 0.
-      value = float( valueStr ) if valueStr else 0
-
-      if multiplyByOneMillion:
-         value = value * 1000000
-      yearToValueMap[ year ] = value
-
+   cache = MacrotrendsCache.getSharedCache()
+   if not bypassCache:
+      cachedPage = cache.get( ticker, metric )
+      if cachedPage is not None:
+         if cachedPage.yearToValueMap is not None:
+            return cachedPage.yearToValueMap
+         # The page was cached, but never parsed.
+         # Keep it as it is, so it still expires when it would have.
+         try:
+            yearToValueMap = parseAnnualData( cachedPage.html )
+         except ValueError:
+            # Nothing to parse ( e.g. a blocked load ), so load it again.
+            cache.invalidate( ticker, metric )
+         else:
+            cache.putParsed( ticker, metric, yearToValueMap )
+            return yearToValueMap
+
+   html = _loadPage( ticker, metric )
+   yearToValueMap = parseAnnualData( html )
+   cache.put( ticker, metric, html, yearToValueMap )
    return yearToValueMap
 
 def dumpAnnualData( ticker: str,
                     metric: str,
-                    useCurrencyFormat: bool = False
+                    useCurrencyFormat: bool = False,
+                    bypassCache: bool = False
 ) -> None:
    '''
    Dumps annual data for the given ticker and metric.
@@ -143,6 +223,7 @@ def dumpAnnualData( ticker: str,
       ticker - ticker symbol of the comapny.
       metric - financial metric of interest, with dashes separating each word.
       useCurrencyFormat - Use currency format, e.g., "$420,666.69".
+      bypassCache - Load the page even if it's cached.
 
    Example:
       >>> MacrotrendsUtil.dumpAnnualData( 'GOOG', 'net-income' )
@@ -151,7 +232,7 @@ def dumpAnnualData( ticker: str,
       2007	4204000000.00
       etc.
    '''
-   yearToValueMap = getAnnualData( ticker, metric )
+   yearToValueMap = getAnnualData( ticker, metric, bypassCache )
    for year in sorted( yearToValueMap.keys() ):
       value = yearToValueMap[ year ]
       if useCurrencyFormat:
@@ -160,14 +241,24 @@ def dumpAnnualData( ticker: str,
       else:
          print( "%d\t%.2f" % ( year, value ) )
 
-def getDataFrame( tickers: list[str], metrics: list[str] ) -> DataFrame:
+def getDataFrame( tickers: list[str],
+                  metrics: list[str],
+                  bypassCache: bool = False,
+                  numWorkers: int = DEFAULT_NUM_WORKERS ) -> DataFrame:
    '''
    Given a list of tickers and a list of metrics, create a DataFrame
    where each row contains the metrics for a given year and a given ticker.
 
+   The pages for every ( ticker, metric ) pair are loaded concurrently,
+   but the rows always come out in the same order: by ticker in the
+   given order, then by year. If a metric can't be loaded for a ticker,
+   its values are left as NaN.
+
    Params:
       tickers - list of strings.
       metrics - list of strings.
+      bypassCache - Load the pages even if they're cached.
+      numWorkers - How many pages to load at the same time.
 
    Example:
       >>> tickers = [ 'GOOG', 'AMZN' ]
@@ -181,24 +272,29 @@ def getDataFrame( tickers: list[str], metrics: list[str] ) -> DataFrame:
       3  2008   GOOG  4.227000e+09  2.179600e+10
       4  2009   GOOG  6.520000e+09  2.365100e+10
    '''
-   tickerToAnnualDataMap = {}
-
-   for ticker in tickers:
-      yearToDataMap: dict[int, dict[str, float]] = {}
-
-      for metric in metrics:
-         try:
-            yearToValueMap = getAnnualData( ticker, metric )
-         except:
-            # If we can't get data for a certain metric, just continue
-            # and fill in what we can.
-            print( "*** Failed to get %s for %s" % ( metric, ticker ) )
-            continue
-         for year, value in yearToValueMap.items():
-            if year not in yearToDataMap:
-               yearToDataMap[ year ] = {}
-            yearToDataMap[ year ][ metric ] = value
-      tickerToAnnualDataMap[ ticker ] = yearToDataMap
+   def getAnnualDataOrNone( tickerAndMetric: tuple[str, str] ) -> Optional[dict[int, float]]:
+      ticker, metric = tickerAndMetric
+      try:
+         return getAnnualData( ticker, metric, bypassCache )
+      except Exception:
+         # If we can't get data for a certain metric, just continue
+         # and fill in what we can.
+         print( "*** Failed to get %s for %s" % ( metric, ticker ) )
+         return None
+
+   pairs = [ ( ticker, metric ) for ticker in tickers for metric in metrics ]
+   with ThreadPoolExecutor( max_workers=max( 1, numWorkers ) ) as executor:
+      results = list( executor.map( getAnnualDataOrNone, pairs ) )
+
+   tickerToAnnualDataMap: dict[str, dict[int, dict[str, float]]] = { ticker : {} for ticker in tickers }
+   for ( ticker, metric ), yearToValueMap in zip( pairs, results ):
+      if yearToValueMap is None:
+         continue
+      yearToDataMap = tickerToAnnualDataMap[ ticker ]
+      for year, value in yearToValueMap.items():
+         if year not in yearToDataMap:
+            yearToDataMap[ year ] = {}
+         yearToDataMap[ year ][ metric ] = value
 
    columnNames = [ 'Year', 'Ticker' ] + metrics
    rowList = []
@@ -206,9 +302,9 @@ def getDataFrame( tickers: list[str], metrics: list[str] ) -> DataFrame:
    for ticker in tickers:
       yearToDataMap = tickerToAnnualDataMap[ ticker ]
       for year in sorted( yearToDataMap.keys() ):
-         row = [ year, ticker ]
+         row: list = [ year, ticker ]
          for metric in metrics:
-            row.append( yearToDataMap[ year ][ metric ] )
+            row.append( yearToDataMap[ year ].get( metric, float( 'nan' ) ) )
          rowList.append( row )
 
    df = pd.DataFrame( rowList, columns=columnNames )
@@ -216,19 +312,38 @@ def getDataFrame( tickers: list[str], metrics: list[str] ) -> DataFrame:
 
 
 
-def getFinancialsCsv( ticker: str, dest: str = '' ) -> int:
+def getFinancialsCsv( ticker: str,
+                      dest: str = '',
+                      catalog: Optional[DataCatalog] = None,
+                      bypassCache: bool = False,
+                      numWorkers: int = DEFAULT_NUM_WORKERS ) -> int:
+   '''
+   If a catalog is given, skip the download when the ticker's
+   financials were fetched recently, and record the new file otherwise.
+   bypassCache loads the pages even if they're in the MacrotrendsCache.
+   numWorkers is how many of the ticker's pages to load at the same time.
+   '''
+   if not dest:
+      dest = './%s.csv' % ticker
+   if catalog is not None and catalog.isFresh( ticker, Catalog.FINANCIALS, dest ):
+      print( "Macrotrends financials info for %s is up-to-date" % ticker )
+      return 0
    print( "Getting Macrotrends financials info for %s" % ticker )
    try:
-      df = getDataFrame( [ ticker ], ESSENTIAL_METRICS )
+      df = getDataFrame( [ ticker ], ESSENTIAL_METRICS, bypassCache, numWorkers )
    except Exception as e:
       print( "[ERROR] Could not get Macrotrends financials info for %s" % ticker )
       print( e )
       return 1
+   if df.empty:
+      # Don't overwrite the existing CSV with nothing.
+      print( "[ERROR] Could not get any Macrotrends financials info for %s" % ticker )
+      return 1
    df = df.set_index( 'Year' )
    df = df.drop( [ 'Ticker' ], axis=1 )
-   if not dest:
-      dest = './%s.csv' % ticker
    df.to_csv( dest )
+   if catalog is not None:
+      catalog.recordFile( ticker, Catalog.FINANCIALS, dest, rowCount=len( df ) )
    return 0
 
 
@@ -242,6 +357,9 @@ def main() -> None:
    parser.add_argument( '-c', dest='useCurrencyFormat',
                         action='store_true',
                         help="Print the values with dollar signs and commas." )
+   parser.add_argument( '-n', '--no-cache', dest='bypassCache',
+                        action='store_true',
+                        help="Load the pages even if they're cached." )
    args = parser.parse_args()
 
    for ticker in args.tickers:
@@ -252,7 +370,8 @@ def main() -> None:
                                           metricWithDashesRemoved ) )
          try:
             dumpAnnualData( ticker, metric,
-                            useCurrencyFormat=args.useCurrencyFormat )
+                            useCurrencyFormat=args.useCurrencyFormat,
+                            bypassCache=args.bypassCache )
             print()
          except Exception as e:
             print( "[ERROR] Failed to get data for %s %s: %s" % \
@@ -261,6 +380,7 @@ def main() -> None:
                  str( e ) ) )
             continue
       print
+   print( MacrotrendsCache.getSharedCache().stats.report() )
 
 if __name__ == '__main__':
    main()
@@ -0,0 +1,212 @@
+#!/usr/bin/env python
+
+'''
+Run items through a chain of stages, each with its own worker threads,
+connected by bounded queues, so a later stage starts on an item as soon as
+an earlier stage hands it over instead of waiting for the whole batch.
+
+A stage's function takes one item and returns ( or yields ) the items it
+hands to the next stage: none, one, or several. A stage whose function
+raises only loses that item; the rest carry on. When the next stage's queue
+is full, the stage waits, so a fast stage can't run far ahead of a slow one.
+
+Example:
+   >>> stages = [ Stage( 'download', lambda batch: downloadAll( batch ), numWorkers=1 ),
+   ...            Stage( 'process', lambda ticker: [ process( ticker ) ], numWorkers=4 ) ]
+   >>> result = runPipeline( batches, stages )
+   >>> print( result.report() )
+   >>> result.outputs
+'''
+
+
+##################
+# IMPORTS
+##################
+import threading, time, queue
+from typing import Any, Callable, Iterable, Optional
+
+
+##################
+# CONSTANTS
+##################
+
+# Put on a queue after its last item.
+_END = object()
+
+
+##################
+# CLASSES
+##################
+
+class Stage:
+   def __init__( self,
+                 name: str,
+                 func: Callable[[Any], Optional[Iterable[Any]]],
+                 numWorkers: int = 1,
+                 queueSize: int = 0 ) -> None:
+      '''
+      Keyword arguments:
+         name       -- Shown in the report
+         func       -- Takes an item, and returns the items for the next stage.
+                       None hands over nothing.
+         numWorkers -- How many threads run the function at the same time
+         queueSize  -- How many items can wait for this stage.
+                       0 means the pipeline's default.
+      '''
+      self.name = name
+      self.func = func
+      self.numWorkers = max( 1, numWorkers )
+      self.queueSize = queueSize
+
+
+class StageStats:
+   def __init__( self, name: str, numWorkers: int ) -> None:
+      self.name = name
+      self.numWorkers = numWorkers
+      self.numIn = 0
+      self.numOut = 0
+      self.numFailed = 0
+      # Seconds spent in the stage's function, summed over its workers.
+      self.busySeconds = 0.0
+      # Seconds spent waiting for the next stage to take an item.
+      self.blockedSeconds = 0.0
+      # The queue's length each time a worker took an item from it.
+      self.queueDepthTotal = 0
+      self.maxQueueDepth = 0
+      self.firstStart: Optional[float] = None
+      self.lastEnd: Optional[float] = None
+
+   @property
+   def activeSeconds( self ) -> float:
+      '''
+      From when the stage took its first item to when it finished its last one.
+      '''
+      if self.firstStart is None or self.lastEnd is None:
+         return 0.0
+      return self.lastEnd - self.firstStart
+
+   @property
+   def itemsPerSecond( self ) -> float:
+      return self.numIn / self.activeSeconds if self.activeSeconds else 0.0
+
+   @property
+   def meanQueueDepth( self ) -> float:
+      return self.queueDepthTotal / self.numIn if self.numIn else 0.0
+
+   @property
+   def utilization( self ) -> float:
+      '''
+      Fraction of the workers' active time spent in the stage's function.
+      '''
+      if not self.activeSeconds:
+         return 0.0
+      return self.busySeconds / ( self.activeSeconds * self.numWorkers )
+
+
+class PipelineResult:
+   def __init__( self, stageStats: list[StageStats] ) -> None:
+      self.stageStats = stageStats
+      # Everything the last stage handed over, in the order it finished.
+      self.outputs: list[Any] = []
+      self.elapsedSeconds = 0.0
+
+   def report( self ) -> str:
+      lines = [ "Pipeline finished in %.1fs" % self.elapsedSeconds,
+                "   %-16s %7s %7s %7s %9s %8s %8s %10s %9s" % \
+                ( 'stage', 'in', 'out', 'failed', 'items/s', 'busy', 'blocked', 'queue avg', 'queue max' ) ]
+      for stats in self.stageStats:
+         lines.append( "   %-16s %7d %7d %7d %9.1f %7.1fs %7.1fs %10.1f %9d" % \
+                       ( stats.name, stats.numIn, stats.numOut, stats.numFailed, stats.itemsPerSecond,
+                         stats.busySeconds, stats.blockedSeconds, stats.meanQueueDepth, stats.maxQueueDepth ) )
+      return "\n".join( lines )
+
+
+##################
+# FUNCTIONS
+##################
+
+def runPipeline( items: Iterable[Any], stages: list[Stage], queueSize: int = 64 ) -> PipelineResult:
+   '''
+   Run the items through the stages, and return the last stage's outputs
+   along with each stage's statistics.
+
+   Keyword arguments:
+      items     -- The first stage's input. Read lazily, as the first stage has room.
+      stages    -- The stages, in order
+      queueSize -- How many items can wait for a stage that doesn't set its own
+   '''
+   result = PipelineResult( [ StageStats( s.name, s.numWorkers ) for s in stages ] )
+   queues: list[queue.Queue] = [ queue.Queue( maxsize=s.queueSize or queueSize ) for s in stages ]
+   lock = threading.Lock()
+   numWorkersLeft = [ s.numWorkers for s in stages ]
+
+   def handOver( stageNum: int, item: Any ) -> None:
+      if stageNum + 1 < len( stages ):
+         queues[ stageNum + 1 ].put( item )
+      else:
+         with lock:
+            result.outputs.append( item )
+
+   def work( stageNum: int ) -> None:
+      stage = stages[ stageNum ]
+      stats = result.stageStats[ stageNum ]
+      inbox = queues[ stageNum ]
+      while True:
+         depth = inbox.qsize()
+         item = inbox.get()
+         if item is _END:
+            with lock:
+               numWorkersLeft[ stageNum ] -= 1
+               isLastWorker = numWorkersLeft[ stageNum ] == 0
+            if isLastWorker and stageNum + 1 < len( stages ):
+               # Nothing more is coming, so the next stage can finish too.
+               queues[ stageNum + 1 ].put( _END )
+            elif not isLastWorker:
+               # Let the stage's other workers see it.
+               inbox.put( _END )
+            return
+
+         start = time.monotonic()
+         blockedSeconds = 0.0
+         numOut = 0
+         failed = False
+         try:
+            outputs = stage.func( item )
+            for output in outputs if outputs is not None else []:
+               handOverStart = time.monotonic()
+               handOver( stageNum, output )
+               blockedSeconds += time.monotonic() - handOverStart
+               numOut += 1
+         except Exception as e:
+            print( "[ERROR] %s failed for %s: %s" % ( stage.name, item, e ) )
+            failed = True
+         end = time.monotonic()
+
+         with lock:
+            stats.numIn += 1
+            stats.numOut += numOut
+            stats.numFailed += failed
+            stats.busySeconds += end - start - blockedSeconds
+            stats.blockedSeconds += blockedSeconds
+            stats.queueDepthTotal += depth
+            stats.maxQueueDepth = max( stats.maxQueueDepth, depth )
+            # Workers can take the lock in any order, so keep the earliest
+            # start and the latest end rather than the last ones recorded.
+            stats.firstStart = start if stats.firstStart is None else min( stats.firstStart, start )
+            stats.lastEnd = end if stats.lastEnd is None else max( stats.lastEnd, end )
+
+   start = time.monotonic()
+   threads = [ threading.Thread( target=work, args=( stageNum, ), daemon=True )
+               for stageNum, stage in enumerate( stages ) for _ in range( stage.numWorkers ) ]
+   for thread in threads:
+      thread.start()
+   if stages:
+      for item in items:
+         queues[ 0 ].put( item )
+      queues[ 0 ].put( _END )
+   else:
+      result.outputs = list( items )
+   for thread in threads:
+      thread.join()
+   result.elapsedSeconds = time.monotonic() - start
+   return result
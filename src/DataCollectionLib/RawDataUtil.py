@@ -4,60 +4,193 @@
 ##################
 # IMPORTS
 ##################
-import os, subprocess, json
+import os, subprocess, json, datetime
+from typing import Any, Callable, Optional, TypeVar
 
 import pandas as pd
+from pandas import DataFrame
 import yfinance as yf
 
-from UtilLib import Util
+from UtilLib import Util, TradingCalendar, RequestGovernor
+from DataCollectionLib import DataCatalog as Catalog
+from DataCollectionLib.DataCatalog import DataCatalog
 
 
 
+##################
+# CONSTANTS
+##################
+T = TypeVar( 'T' )
+
+
 ##################
 # FUNCTIONS
 ##################
 
-def getDailyPriceCsv( ticker: str, dest: str = '' ) -> int:
+def _requestYahoo( func: Callable[..., T], *args: Any, **kwargs: Any ) -> T:
+   '''
+   Send a request to Yahoo! Finance through the shared RequestGovernor, which
+   retries throttled and failed requests and slows down when Yahoo pushes back.
+   '''
+   return RequestGovernor.getSharedGovernor().call( RequestGovernor.YAHOO_HOST, func, *args, **kwargs )
+
+
+def _lastBarDate( data: DataFrame | pd.Series ) -> Optional[str]:
+   return str( data.index[ -1 ] )[ :10 ] if len( data ) else None
+
+
+def _isFresh( catalog: Optional[DataCatalog], ticker: str, dataset: str, dest: str ) -> bool:
+   '''
+   Check the catalog, if there is one, to see if the file needs updating.
+   '''
+   if catalog is not None and catalog.isFresh( ticker, dataset, dest ):
+      print( "%s data for %s is already up-to-date" % ( dataset, ticker ) )
+      return True
+   return False
+
+
+def getDailyPriceCsv( ticker: str, dest: str = '', catalog: Optional[DataCatalog] = None ) -> int:
    '''
    Get daily price info for a stock in csv format.
 
    Keyword arguments:
-      ticker -- The ticker symbol
-      dest   -- Path to the directory where we want the CSV file
+      ticker  -- The ticker symbol
+      dest    -- Path to the directory where we want the CSV file
+      catalog -- If given, skip tickers the catalog says are up-to-date,
+                 and record the new file in it.
    '''
+   return YahooTickerCollector( ticker, catalog ).getDailyPriceCsv( dest )
+
+
+# Columns of the DataFrame returned by yf.Ticker.history(), in order.
+# Funds also get a 'Capital Gains' column.
+HISTORY_COLUMNS = [ 'Open', 'High', 'Low', 'Close', 'Volume',
+                    'Dividends', 'Stock Splits', 'Capital Gains' ]
+
 
-   # Fetch Yahoo Finance data into a Python DataFrame
+def _readLastLine( path: str ) -> str:
+   '''
+   Return the last non-empty line of a file, reading only the end of it.
+   '''
+   with open( path, 'rb' ) as f:
+      fileSize = f.seek( 0, os.SEEK_END )
+      chunkSize = 4096
+      while True:
+         readSize = min( chunkSize, fileSize )
+         f.seek( fileSize - readSize )
+         lines = f.read( readSize ).splitlines()
+         lines = [ line for line in lines if line.strip() ]
+         # Unless we've read the whole file, the first line may be cut off.
+         if readSize == fileSize or len( lines ) > 1:
+            return lines[ -1 ].decode() if lines else ''
+         chunkSize *= 2
+
+
+def _readHeader( path: str ) -> list[str]:
+   with open( path, 'r' ) as f:
+      return f.readline().strip().split( ',' )
+
+
+def getLastDateInCsv( dest: str ) -> Optional[str]:
+   '''
+   Return the last date ( 'YYYY-MM-DD' ) in a daily price CSV,
+   or None if the CSV doesn't exist or holds no valid data.
+
+   Only the end of the file is read, so this takes the same time
+   no matter how long the history is.
+   '''
    try:
-      print( "Getting daily price data for %s" % ticker )
-      df = yf.Ticker( ticker ).history( period='max' )
-   except Exception as e:
-      print( "[ERROR] Could not get daily price data for %s" % ticker )
-      print( e )
-      return 1
+      lastLine = _readLastLine( dest )
+      dateStr = lastLine.split( ',' )[ 0 ][ :10 ]
+      datetime.datetime.strptime( dateStr, '%Y-%m-%d' )
+      return dateStr
+   except Exception:
+      # Missing file, empty file, or just the header row.
+      return None
 
-   df = df.round( 2 )
-   # Write the DataFrame into a CSV
-   if not dest:
-      dest = './%s.csv' % ticker
-   df.to_csv( dest )
-   return 0
+
+def _appendPriceRows( dest: str, df: DataFrame ) -> Optional[bytes]:
+   '''
+   Append newly fetched rows to an existing daily price CSV,
+   and return the bytes that were appended.
+
+   The rows are written in place with a single write, and the file is
+   truncated back to its original size if that fails, so it never holds
+   part of an update. If the new rows have columns the CSV doesn't
+   ( e.g. a fund's first capital gain ), the whole file is rewritten instead,
+   and None is returned.
+   '''
+   df = df.copy()
+   df.index = df.index.astype( str )
+   df.index.name = 'Date'
+
+   header = _readHeader( dest )
+   existingColumns = header[ 1: ]
+   if header[ 0 ] != 'Date' or not set( df.columns ) <= set( existingColumns ):
+      existingDf = pd.read_csv( dest, index_col='Date' )
+      finalDf = pd.concat( [ existingDf, df ] )
+      tempDest = dest + '.tmp'
+      finalDf.to_csv( tempDest )
+      os.replace( tempDest, dest )
+      return None
+
+   rowsBytes = df.reindex( columns=existingColumns ).to_csv( header=False ).encode()
+   with open( dest, 'rb+' ) as f:
+      originalSize = f.seek( 0, os.SEEK_END )
+      if originalSize > 0:
+         f.seek( originalSize - 1 )
+         if f.read( 1 ) != b'\n':
+            rowsBytes = b'\n' + rowsBytes
+      try:
+         f.write( rowsBytes )
+         f.flush()
+         os.fsync( f.fileno() )
+      except Exception:
+         f.truncate( originalSize )
+         raise
+   return rowsBytes
+
+
+def _recordAppendedRows( catalog: Optional[DataCatalog], ticker: str, dest: str,
+                         df: DataFrame, appendedBytes: Optional[bytes] ) -> None:
+   if catalog is None:
+      return
+   lastBarDate = _lastBarDate( df )
+   if appendedBytes is None or lastBarDate is None:
+      catalog.recordFile( ticker, Catalog.DAILY_PRICES, dest, None, lastBarDate )
+   else:
+      catalog.recordAppend( ticker, Catalog.DAILY_PRICES, dest,
+                            appendedBytes, len( df ), lastBarDate )
+
+
+def _lastDateInPriceCsv( catalog: Optional[DataCatalog], ticker: str, dest: str ) -> Optional[str]:
+   '''
+   Return the last date in the ticker's price CSV, from the catalog if
+   it knows, and from the end of the file otherwise.
+   '''
+   if catalog is not None:
+      entry = catalog.lookup( ticker, Catalog.DAILY_PRICES, dest )
+      if entry is not None and entry.lastBarDate is not None:
+         return entry.lastBarDate
+   return getLastDateInCsv( dest )
 
 
-def getDailyPriceCsvFast( ticker: str, dest: str = '' ) -> int:
+def getDailyPriceCsvFast( ticker: str, dest: str = '', catalog: Optional[DataCatalog] = None ) -> int:
+   '''
+   Like getDailyPriceCsv(), but if the CSV already holds data, only fetch
+   the days after its last date and append them to the file.
+   '''
    if not dest:
       dest = './%s.csv' % ticker
 
-   # Check if the CSV already exists and holds valid data..
-   try:
-      existingDf = pd.read_csv( dest )
-      lastDateInExistingCsv = existingDf.iloc[ -1 ][ 'Date' ]
-   except Exception as e:
+   # Check if the CSV already exists and holds valid data.
+   lastDateInExistingCsv = _lastDateInPriceCsv( catalog, ticker, dest )
+   if lastDateInExistingCsv is None:
       # A valid CSV does not already exist,
       # so download the whole CSV.
-      getDailyPriceCsv( ticker, dest )
-      return 0
+      return getDailyPriceCsv( ticker, dest, catalog )
 
-   if Util.isMostRecentWeekday( lastDateInExistingCsv ):
+   if TradingCalendar.isUpToDate( lastDateInExistingCsv ):
       print( "Daily price data for %s is already up-to-date" % ticker )
       return 0
 
@@ -66,90 +199,342 @@ def getDailyPriceCsvFast( ticker: str, dest: str = '' ) -> int:
    startDate = Util.shiftDateStr( lastDateInExistingCsv, 1 )
    try:
       print( "Updating daily price data for %s" % ticker )
-      df = yf.Ticker( ticker ).history( start=startDate )
+      df = _requestYahoo( yf.Ticker( ticker ).history, start=startDate )
    except Exception as e:
       print( "[ERROR] Could not get daily price data for %s" % ticker )
       print( e )
       return 1
 
-   # Write the df we got from yfinance to a CSV and read it back.
-   # This helps us cleanly concatenate it to exsitingDf.
+   # Never duplicate a day that's already in the CSV.
    df = df.round( 2 )
-   tempFilename = '%s-tmp.csv' % ticker
-   df.to_csv( tempFilename )
-   df1 = pd.read_csv( tempFilename )
-
-   # Concatenate the existing data with the latest data,
-   # and write it to a CSV.
-   finalDf = pd.concat( [ existingDf, df1 ] )
-   finalDf.set_index( 'Date', inplace=True )
-   finalDf.to_csv( dest )
-
-   # Clean up temporary file.
-   os.system( 'rm %s' % tempFilename )
+   df = df[ pd.DatetimeIndex( df.index ).strftime( '%Y-%m-%d' ) >= startDate ]
+   if not df.empty:
+      appendedBytes = _appendPriceRows( dest, df )
+      _recordAppendedRows( catalog, ticker, dest, df, appendedBytes )
    return 0
 
 
-def getYahooFinanceInfoDict( ticker: str, dest: str = '' ) -> int:
+def _splitBatchDownload( data: DataFrame, tickers: list[str] ) -> dict[str, DataFrame]:
+   '''
+   Split the result of yf.download( ..., group_by='ticker' ) into one
+   DataFrame per ticker, shaped like what yf.Ticker.history() returns.
+   '''
+   tickerToDfMap: dict[str, DataFrame] = {}
+   for ticker in tickers:
+      if ticker not in data.columns.get_level_values( 0 ):
+         continue
+      tickerData = data[ ticker ]
+      assert isinstance( tickerData, DataFrame ) # Reassure mypy that it's not a Series.
+      columns = [ c for c in HISTORY_COLUMNS if c in tickerData.columns ]
+      # Downloads align every ticker on the same dates, so drop the
+      # rows of dates this ticker has no data for.
+      df = tickerData[ columns ].dropna( how='all', subset=[ 'Open', 'High', 'Low', 'Close' ] )
+      if df.empty:
+         continue
+      if not df[ 'Volume' ].isna().any():
+         df = df.astype( { 'Volume' : 'int64' } )
+      df.columns.name = None
+      tickerToDfMap[ ticker ] = df
+   return tickerToDfMap
+
+
+def getDailyPriceCsvsBatch( tickers: list[str],
+                            destDir: str,
+                            batchSize: int = 100,
+                            incremental: bool = True,
+                            catalog: Optional[DataCatalog] = None,
+                            dividendsDestDir: str = '' ) -> dict[str, int]:
+   '''
+   Get daily price info for many stocks, downloading many tickers per
+   call to yfinance instead of one, and write one CSV per ticker
+   ( the same files getDailyPriceCsv() writes ).
+
+   When incremental is True, tickers whose CSV already holds data only
+   fetch the days after their last date, and tickers are grouped by that
+   start date so each group can be downloaded together. Otherwise,
+   every ticker gets its full history.
+
+   Returns a map from each ticker to 0 on success and 1 on failure.
+
+   Keyword arguments:
+      tickers     -- The ticker symbols
+      destDir     -- Directory holding the <ticker>.csv files
+      batchSize   -- Maximum number of tickers per download
+      incremental -- Only fetch the days missing from existing CSVs
+      catalog     -- If given, use it to find the last dates and to skip
+                     up-to-date tickers without opening their CSVs,
+                     and record the new files in it.
+      dividendsDestDir -- If given, also write the <ticker>.csv dividend files
+                          ( the same files getDividendsCsv() writes ) for the
+                          tickers whose full history was downloaded, from the
+                          history's Dividends column.
+   '''
+   # Group the tickers by the start date they need. None means the full history.
+   startDateToTickersMap: dict[Optional[str], list[str]] = {}
+   results = {}
+   numDividendFiles = 0
+   for ticker in tickers:
+      if _isFresh( catalog, ticker, Catalog.DAILY_PRICES, os.path.join( destDir, '%s.csv' % ticker ) ):
+         results[ ticker ] = 0
+         continue
+      startDate = None
+      if incremental:
+         lastDate = _lastDateInPriceCsv( catalog, ticker, os.path.join( destDir, '%s.csv' % ticker ) )
+         if lastDate is not None:
+            if TradingCalendar.isUpToDate( lastDate ):
+               print( "Daily price data for %s is already up-to-date" % ticker )
+               results[ ticker ] = 0
+               continue
+            startDate = Util.shiftDateStr( lastDate, 1 )
+      startDateToTickersMap.setdefault( startDate, [] ).append( ticker )
+
+   for startDate, groupTickers in startDateToTickersMap.items():
+      for i in range( 0, len( groupTickers ), batchSize ):
+         batch = groupTickers[ i : i + batchSize ]
+         try:
+            print( "Getting daily price data for %d tickers starting from %s" % \
+                   ( len( batch ), startDate or 'the beginning' ) )
+            # yf.download() keeps per-ticker errors to itself, so only the failure
+            # of a whole download gets retried. Those tickers just come back missing.
+            if startDate is None:
+               data = _requestYahoo( yf.download, batch, period='max', group_by='ticker', actions=True,
+                                     ignore_tz=False, progress=False )
+            else:
+               data = _requestYahoo( yf.download, batch, start=startDate, group_by='ticker', actions=True,
+                                     ignore_tz=False, progress=False )
+            tickerToDfMap = _splitBatchDownload( data, batch )
+         except Exception as e:
+            print( "[ERROR] Could not get daily price data for %s" % ", ".join( batch ) )
+            print( e )
+            results.update( { ticker : 1 for ticker in batch } )
+            continue
+
+         for ticker in batch:
+            dest = os.path.join( destDir, '%s.csv' % ticker )
+            if ticker not in tickerToDfMap:
+               if startDate is None:
+                  print( "[ERROR] Could not get daily price data for %s" % ticker )
+                  results[ ticker ] = 1
+               else:
+                  # No new trading days since the last update.
+                  results[ ticker ] = 0
+               continue
+            if startDate is None and dividendsDestDir:
+               _writeDividendsCsv( ticker, os.path.join( dividendsDestDir, '%s.csv' % ticker ),
+                                   _dividendsFromHistory( tickerToDfMap[ ticker ] ), catalog )
+               numDividendFiles += 1
+            df = tickerToDfMap[ ticker ].round( 2 )
+            if startDate is None:
+               df.to_csv( dest )
+               if catalog is not None:
+                  catalog.recordFile( ticker, Catalog.DAILY_PRICES, dest, len( df ), _lastBarDate( df ) )
+            else:
+               # Never duplicate a day that's already in the CSV.
+               df = df[ pd.DatetimeIndex( df.index ).strftime( '%Y-%m-%d' ) >= startDate ]
+               if not df.empty:
+                  appendedBytes = _appendPriceRows( dest, df )
+                  _recordAppendedRows( catalog, ticker, dest, df, appendedBytes )
+            results[ ticker ] = 0
+   if dividendsDestDir:
+      print( "Wrote dividends for %d tickers from their price histories" % numDividendFiles )
+   return results
+
+
+def getYahooFinanceInfoDict( ticker: str, dest: str = '', catalog: Optional[DataCatalog] = None ) -> int:
    '''
    Fetch dictionary of info and metrics for the given ticker,
    and save it in a JSON.
       This info includes things like forwardPE and dividendYield.
    '''
-   try:
-      print( "Getting Yahoo! Finance info dict for %s" % ticker )
-      infoDict = yf.Ticker( ticker ).info
-   except Exception as e:
-      print( "[ERROR] Could not get info for %s" % ticker )
-      print( e )
-      return 1
-
-   if not dest:
-      dest = './%s.json' % ticker
-
-   with open( dest, 'w' ) as f:
-      f.write( json.dumps( infoDict, indent=4, sort_keys=True ) )
-   return 0
+   return YahooTickerCollector( ticker, catalog ).getInfoDict( dest )
 
 
-def getYahooFinanceFastInfo( ticker: str, dest: str = '' ) -> int:
+def getYahooFinanceFastInfo( ticker: str, dest: str = '', catalog: Optional[DataCatalog] = None ) -> int:
    '''
    Fetch dictionary of fast_info and metrics for the given ticker,
    and save it in a JSON.
       This info includes things like shares outstanding and market cap.
    '''
-   try:
-      print( "Getting Yahoo! Finance fast_info dict for %s" % ticker )
-      infoDict = dict( yf.Ticker( ticker ).fast_info )
-   except Exception as e:
-      print( "[ERROR] Could not get info for %s" % ticker )
-      print( e )
-      return 1
+   return YahooTickerCollector( ticker, catalog ).getFastInfo( dest )
 
-   if not dest:
-      dest = './%s.json' % ticker
 
-   with open( dest, 'w' ) as f:
-      f.write( json.dumps( infoDict, indent=4, sort_keys=True ) )
-   return 0
+def getDividendsCsv( ticker: str, dest: str = '', catalog: Optional[DataCatalog] = None ) -> int:
+   return YahooTickerCollector( ticker, catalog ).getDividendsCsv( dest )
 
 
-def getDividendsCsv( ticker: str, dest: str = '' ) -> int:
-   if not dest:
-      dest = './%s.csv' % ticker
+def _dividendsFromHistory( df: DataFrame ) -> pd.Series:
+   '''
+   Pick the dividend payments out of a price history's Dividends column,
+   in the same shape as yf.Ticker.dividends.
 
-   try:
-      print( "Getting Dividend history for %s" % ticker )
-      dividends = yf.Ticker( ticker ).dividends
-      dividends.to_csv( dest )
-   except Exception as e:
-      print( "[ERROR] Could not get info for %s. Writing empty CSV." % ticker )
-      print( e )
+   Use the history before rounding it, since dividends often have more
+   than two decimal places.
+   '''
+   if 'Dividends' not in df.columns:
+      return pd.Series( [], index=pd.DatetimeIndex( [], name='Date' ), name='Dividends', dtype=float )
+   dividends = df[ 'Dividends' ]
+   dividends = dividends[ dividends.fillna( 0 ) != 0 ]
+   return dividends.rename_axis( 'Date' ).rename( 'Dividends' )
+
+
+def _writeDividendsCsv( ticker: str, dest: str, dividends: pd.Series, catalog: Optional[DataCatalog] ) -> None:
+   dividends.to_csv( dest )
+   if catalog is not None:
+      catalog.recordFile( ticker, Catalog.DIVIDENDS, dest, len( dividends ), _lastBarDate( dividends ) )
+
+
+class YahooTickerCollector:
+   '''
+   Collects the Yahoo! Finance files for one ticker from a single yf.Ticker,
+   with as few requests as possible.
+
+   The full price history already has a Dividends column, so once the prices
+   have been fetched, the dividends file is written from them instead of being
+   downloaded again. Each file is still skipped if the catalog says it's
+   up-to-date.
+
+   Example:
+      >>> collector = YahooTickerCollector( 'AAPL', catalog )
+      >>> collector.getDailyPriceCsv( 'AAPL-prices.csv' )
+      >>> collector.getDividendsCsv( 'AAPL-dividends.csv' )   # No request
+      >>> collector.numRequests, collector.numRequestsSaved
+      (1, 1)
+   '''
+   def __init__( self, ticker: str, catalog: Optional[DataCatalog] = None ) -> None:
+      self.ticker = ticker
+      self.catalog = catalog
+      self.yfTicker = yf.Ticker( ticker )
+      # The full history, kept from when the prices are fetched until the
+      # dividends are written from it.
+      self.history: Optional[DataFrame] = None
+      # Requests sent to Yahoo! Finance, and requests that would have been
+      # sent if each file were fetched with its own yf.Ticker.
+      self.numRequests = 0
+      self.numRequestsSaved = 0
+      # 0 or 1 for each dataset, filled in by collectTickerData().
+      self.results: dict[str, int] = {}
+
+   def _fetchHistory( self ) -> DataFrame:
+      self.numRequests += 1
+      self.history = _requestYahoo( self.yfTicker.history, period='max' )
+      return self.history
+
+   def getDailyPriceCsv( self, dest: str = '' ) -> int:
+      if not dest:
+         dest = './%s.csv' % self.ticker
+      if _isFresh( self.catalog, self.ticker, Catalog.DAILY_PRICES, dest ):
+         return 0
+
+      # Fetch Yahoo Finance data into a Python DataFrame
+      try:
+         print( "Getting daily price data for %s" % self.ticker )
+         df = self._fetchHistory()
+      except Exception as e:
+         print( "[ERROR] Could not get daily price data for %s" % self.ticker )
+         print( e )
+         return 1
+
+      df = df.round( 2 )
+      # Write the DataFrame into a CSV
+      df.to_csv( dest )
+      if self.catalog is not None:
+         self.catalog.recordFile( self.ticker, Catalog.DAILY_PRICES, dest, len( df ), _lastBarDate( df ) )
+      return 0
+
+   def getDividendsCsv( self, dest: str = '' ) -> int:
+      if not dest:
+         dest = './%s.csv' % self.ticker
+      if _isFresh( self.catalog, self.ticker, Catalog.DIVIDENDS, dest ):
+         return 0
+
+      if self.history is not None:
+         print( "Getting Dividend history for %s from its price history" % self.ticker )
+         _writeDividendsCsv( self.ticker, dest, _dividendsFromHistory( self.history ), self.catalog )
+         # Nothing else needs the history, so don't hold on to it.
+         self.history = None
+         self.numRequestsSaved += 1
+         return 0
+
+      try:
+         print( "Getting Dividend history for %s" % self.ticker )
+         self.numRequests += 1
+         dividends = _requestYahoo( lambda: self.yfTicker.dividends )
+         _writeDividendsCsv( self.ticker, dest, dividends, self.catalog )
+      except Exception as e:
+         print( "[ERROR] Could not get info for %s. Writing empty CSV." % self.ticker )
+         print( e )
+         with open( dest, 'w' ) as f:
+            f.write( "Date,Dividends\n" )
+         return 1
+      return 0
+
+   def _writeJson( self, dest: str, dataset: str, infoDict: dict ) -> None:
+      text = json.dumps( infoDict, indent=4, sort_keys=True )
       with open( dest, 'w' ) as f:
-         f.write( "Date,Dividends\n" )
-      return 1
+         f.write( text )
+      if self.catalog is not None:
+         self.catalog.record( self.ticker, dataset, len( infoDict ), None, Catalog.hashBytes( text.encode() ) )
+
+   def getInfoDict( self, dest: str = '' ) -> int:
+      if not dest:
+         dest = './%s.json' % self.ticker
+      if _isFresh( self.catalog, self.ticker, Catalog.INFO, dest ):
+         return 0
+
+      try:
+         print( "Getting Yahoo! Finance info dict for %s" % self.ticker )
+         self.numRequests += 1
+         infoDict = _requestYahoo( lambda: self.yfTicker.info )
+      except Exception as e:
+         print( "[ERROR] Could not get info for %s" % self.ticker )
+         print( e )
+         return 1
+
+      self._writeJson( dest, Catalog.INFO, infoDict )
+      return 0
 
-   return 0
+   def getFastInfo( self, dest: str = '' ) -> int:
+      if not dest:
+         dest = './%s.json' % self.ticker
+      if _isFresh( self.catalog, self.ticker, Catalog.FAST_INFO, dest ):
+         return 0
+
+      try:
+         print( "Getting Yahoo! Finance fast_info dict for %s" % self.ticker )
+         self.numRequests += 1
+         infoDict = _requestYahoo( lambda: dict( self.yfTicker.fast_info ) )
+      except Exception as e:
+         print( "[ERROR] Could not get info for %s" % self.ticker )
+         print( e )
+         return 1
+
+      self._writeJson( dest, Catalog.FAST_INFO, infoDict )
+      return 0
+
+
+def collectTickerData( ticker: str,
+                       priceDest: str,
+                       dividendsDest: str,
+                       infoDest: str,
+                       fastInfoDest: str,
+                       catalog: Optional[DataCatalog] = None ) -> YahooTickerCollector:
+   '''
+   Write the ticker's price CSV, dividends CSV, info JSON and fast_info JSON,
+   fetching the price history once for both CSVs.
+
+   Returns the collector, whose results map holds 0 or 1 for each dataset,
+   and whose numRequests and numRequestsSaved count what was sent.
+   '''
+   collector = YahooTickerCollector( ticker, catalog )
+   collector.results = {
+      Catalog.DAILY_PRICES : collector.getDailyPriceCsv( priceDest ),
+      Catalog.DIVIDENDS : collector.getDividendsCsv( dividendsDest ),
+      Catalog.INFO : collector.getInfoDict( infoDest ),
+      Catalog.FAST_INFO : collector.getFastInfo( fastInfoDest ),
+   }
+   # The dividends may have been up-to-date, leaving the history unused.
+   collector.history = None
+   return collector
 
 
 def getQuarterlyFinancialCsv( stock: str, destDir: str ) -> None:
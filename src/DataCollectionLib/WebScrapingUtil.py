@@ -1,62 +1,71 @@
 #!/usr/bin/env python
 
 
-from typing import Callable
-import subprocess
-from bs4 import BeautifulSoup, Tag
+from typing import Callable, Optional
+from bs4 import BeautifulSoup
+
+from UtilLib import HttpUtil
+from DataCollectionLib import HtmlTableExtractor
+
+
+DIVIDEND_ARISTOCRATS_URL = "https://en.wikipedia.org/wiki/S%26P_500_Dividend_Aristocrats"
+SP500_URL = "https://en.wikipedia.org/wiki/List_of_S%26P_500_companies"
+NASDAQ100_URL = "https://en.wikipedia.org/wiki/Nasdaq-100"
+DOW_JONES_URL = "https://en.wikipedia.org/wiki/Dow_Jones_Industrial_Average"
 
 
 def getHtmlSoup( url: str ) -> BeautifulSoup:
-    cmd = [ "curl", "-s", url ]
-    output = subprocess.check_output( cmd )
-    return BeautifulSoup( output, 'html.parser' )
+    return BeautifulSoup( HttpUtil.getText( url ), 'html.parser' )
+
+
+def parseDividendAristocratList( html: str ) -> list[str]:
+    rows = HtmlTableExtractor.extractTable( html, 0 ).dataRows()
+    return sorted( cells[ 1 ] for cells in rows[ 1: ] ) # Skip the header
+
+
+def parseSp500List( html: str ) -> list[str]:
+    rows = HtmlTableExtractor.extractTable( html, 0 ).dataRows()
+    return sorted( cells[ 0 ].strip() for cells in rows[ 1: ] ) # Skip the header
+
+
+def parseNasdaq100List( html: str ) -> list[str]:
+    rows = HtmlTableExtractor.extractTable( html, 4 ).dataRows()
+    return sorted( cells[ 1 ] for cells in rows[ 1: ] ) # Skip the header
+
+
+def parseDowJonesList( html: str ) -> list[str]:
+    rows = HtmlTableExtractor.extractTable( html, 1 ).dataRows()
+    return sorted( cells[ 1 ].strip() for cells in rows[ 1: ] ) # Skip the header
+
+
+# Name of each index, with its Wikipedia page and the function that parses it.
+INDEX_TO_URL_AND_PARSER_MAP: dict[str, tuple[str, Callable[[str], list[str]]]] = {
+    'DividendAristocrats' : ( DIVIDEND_ARISTOCRATS_URL, parseDividendAristocratList ),
+    'S&P500' : ( SP500_URL, parseSp500List ),
+    'Nasdaq100' : ( NASDAQ100_URL, parseNasdaq100List ),
+    'DowJones' : ( DOW_JONES_URL, parseDowJonesList ),
+}
 
 
 def getDividendAristocratList() -> list[str]:
     '''
     Return a list of tickers for the S&P 500 Dividend Aristocrats.
     '''
-    result = []
-    url = "https://en.wikipedia.org/wiki/S%26P_500_Dividend_Aristocrats"
-    soup = getHtmlSoup( url )
-    table = soup.find( 'table' )
-    assert isinstance( table, Tag ) # Reassure mypy that table.find_all exists.
-    rows = table.find_all( 'tr' )
-    for row in rows[ 1: ]: # Skip the header
-        ticker = row.find_all( 'td' )[ 1 ].text
-        result.append( ticker )
-    return sorted( result )
+    return parseDividendAristocratList( HttpUtil.getText( DIVIDEND_ARISTOCRATS_URL ) )
 
 
 def getSp500List() -> list[str]:
     '''
     Return a list of tickers for the stocks in the S&P 500.
     '''
-    result = []
-    url = "https://en.wikipedia.org/wiki/List_of_S%26P_500_companies"
-    soup = getHtmlSoup( url )
-    table = soup.find( 'table' )
-    assert isinstance( table, Tag ) # Reassure mypy that table.find_all exists.
-    rows = table.find_all( 'tr' )
-    for row in rows[ 1: ]: # Skip the header
-        ticker = row.find_all( 'td' )[ 0 ].text.strip()
-        result.append( ticker )
-    return sorted( result )
+    return parseSp500List( HttpUtil.getText( SP500_URL ) )
 
 
 def getNasdaq100List() -> list[str]:
     '''
     Return a list of tickers for the stocks in the Nasdaq 100.
     '''
-    result = []
-    url = "https://en.wikipedia.org/wiki/Nasdaq-100"
-    soup = getHtmlSoup( url )
-    table = soup.find_all( 'table' )[4]
-    rows = table.find_all( 'tr' )
-    for row in rows[ 1: ]: # Skip the header
-        ticker = row.find_all( 'td' )[ 1 ].text
-        result.append( ticker )
-    return sorted( result )
+    return parseNasdaq100List( HttpUtil.getText( NASDAQ100_URL ) )
 
 
 def getDowJonesList() -> list[str]:
@@ -64,15 +73,26 @@ def getDowJonesList() -> list[str]:
     Return a list of tickers for the stocks in the
     Dow Jones Industrial Average.
     '''
-    result = []
-    url = "https://en.wikipedia.org/wiki/Dow_Jones_Industrial_Average"
-    soup = getHtmlSoup( url )
-    table = soup.find_all( 'table' )[1]
-    rows = table.find_all( 'tr' )
-    for row in rows[ 1: ]: # Skip the header
-        ticker = row.find_all( 'td' )[ 1 ].text.strip()
-        result.append( ticker )
-    return sorted( result )
+    return parseDowJonesList( HttpUtil.getText( DOW_JONES_URL ) )
+
+
+def getIndexLists( indices: Optional[list[str]] = None ) -> dict[str, list[str]]:
+    '''
+    Return a map from each index in INDEX_TO_URL_AND_PARSER_MAP to its tickers,
+    downloading the pages concurrently.
+
+    Keyword arguments:
+       indices -- Names of the indices to get. Defaults to all of them.
+    '''
+    if indices is None:
+        indices = list( INDEX_TO_URL_AND_PARSER_MAP.keys() )
+    urls = [ INDEX_TO_URL_AND_PARSER_MAP[ index ][ 0 ] for index in indices ]
+    urlToResponseMap = HttpUtil.fetchAll( urls )
+    result = {}
+    for index in indices:
+        url, parse = INDEX_TO_URL_AND_PARSER_MAP[ index ]
+        result[ index ] = parse( urlToResponseMap[ url ].text )
+    return result
 
 
 
@@ -0,0 +1,228 @@
+#!/usr/bin/env python
+
+'''
+The steps of updating the Yahoo! Finance data: the list of tickers, each
+ticker's price history, dividends, info and fast_info files, and the tables
+built from them. Used by the update-yahoo-finance-data script and by the
+update-all pipeline.
+
+Example:
+   >>> tickers = updateTickerList()
+   >>> update = YahooUpdate( DataCatalog() )
+   >>> update.downloadPrices( tickers )
+   >>> summary = ConcurrentFetcher.fetchAll( tickers, update.tasks, skipTask=update.isTaskUpToDate,
+   ...                                       afterTicker=update.releaseCollector )
+   >>> print( update.requestReport() )
+   >>> buildTables()
+'''
+
+
+##################
+# IMPORTS
+##################
+import os, threading, time
+from typing import Optional
+
+from DataCollectionLib import DataCatalog as Catalog
+from DataCollectionLib.DataCatalog import DataCatalog
+from DataCollectionLib import ConcurrentFetcher
+from DataCollectionLib.ConcurrentFetcher import FetchTask
+from UtilLib.RateLimiter import RateLimiter
+from DataCollectionLib import RawDataUtil
+from DataCollectionLib import WebScrapingUtil
+from AnalysisLib import DividendIndex, FundamentalsTable
+from UtilLib.Util import absolutePathLocator
+
+
+##################
+# CONSTANTS
+##################
+TICKER_LIST_PATH = 'src/DataCollectionLib/scripts/tickers.txt'
+PRICE_DIR = 'data/RawData/DailyPriceCsvs'
+INFO_DIR = 'data/RawData/YahooFinanceInfo'
+FAST_INFO_DIR = 'data/RawData/YahooFinanceFastInfo'
+DIVIDENDS_DIR = 'data/RawData/Dividends'
+
+# Indices whose members are always in the list of tickers.
+INDICES = [ 'S&P500', 'Nasdaq100', 'DowJones' ]
+
+
+##################
+# FUNCTIONS
+##################
+
+def readTickerList() -> list[str]:
+   with open( absolutePathLocator( TICKER_LIST_PATH ), 'r' ) as f:
+      tickers = f.readlines()
+   return [ t.strip() for t in tickers ]
+
+
+def updateTickerList( indices: list[str] = INDICES ) -> list[str]:
+   '''
+   Add the current members of the indices to the list of tickers,
+   so that if an index adds a stock, we fetch that stock's data.
+   Returns the updated list.
+   '''
+   tickers = set( readTickerList() )
+   indexToTickersMap = WebScrapingUtil.getIndexLists( indices )
+   for indexTickers in indexToTickersMap.values():
+      tickers = tickers | set( indexTickers )
+   sortedTickers = sorted( list( tickers ) )
+   with open( absolutePathLocator( TICKER_LIST_PATH ), 'w' ) as f:
+      for ticker in sortedTickers:
+         f.write( ticker + '\n' )
+   return sortedTickers
+
+
+def buildTables() -> None:
+   '''
+   Rebuild the tables the Screener reads instead of every ticker's files.
+   '''
+   # The Screener reads the fields it needs for every ticker from one table,
+   # instead of opening each ticker's JSONs.
+   print( "***** BUILDING FUNDAMENTALS TABLE *****" )
+   numTickers = FundamentalsTable.buildFundamentalsTable()
+   print( "Built a fundamentals table with %d tickers" % numTickers )
+
+   # Likewise for the dividends, parsed once instead of from every ticker's CSV.
+   print( "***** BUILDING DIVIDEND TABLE *****" )
+   numTickers = DividendIndex.buildDividendTable()
+   print( "Built a dividend table with %d tickers" % numTickers )
+
+
+##################
+# CLASSES
+##################
+
+class YahooUpdate:
+   '''
+   One update of the Yahoo! Finance files for a list of tickers.
+   '''
+   def __init__( self,
+                 catalog: Optional[DataCatalog] = None,
+                 incremental: bool = False,
+                 batchSize: int = 100 ) -> None:
+      '''
+      Keyword arguments:
+         catalog     -- The data catalog, used to skip up-to-date files.
+                        None updates every file.
+         incremental -- Only download the days missing from the existing price CSVs.
+         batchSize   -- Download price history for this many tickers per request
+                        with downloadPrices(). 0 downloads each ticker's history
+                        separately, as one of the tasks.
+      '''
+      self.catalog = catalog
+      self.incremental = incremental
+      self.batchSize = batchSize
+      self.priceDir = absolutePathLocator( PRICE_DIR )
+      self.infoDir = absolutePathLocator( INFO_DIR )
+      self.fastInfoDir = absolutePathLocator( FAST_INFO_DIR )
+      self.dividendsDir = absolutePathLocator( DIVIDENDS_DIR )
+      # Dividend files written after this were written from a batch download.
+      self.startTime = time.time()
+      # All of a ticker's tasks run in the same worker, one after another, so they
+      # can share one collector. That way the dividends come out of the price
+      # history instead of needing a request of their own.
+      self.tickerToCollectorMap: dict[str, RawDataUtil.YahooTickerCollector] = {}
+      # Requests counted by the collectors of tickers that are done.
+      self.numRequests = 0
+      self.numRequestsSaved = 0
+      self.lock = threading.Lock()
+
+   def collectorFor( self, ticker: str ) -> RawDataUtil.YahooTickerCollector:
+      if ticker not in self.tickerToCollectorMap:
+         self.tickerToCollectorMap[ ticker ] = RawDataUtil.YahooTickerCollector( ticker, self.catalog )
+      return self.tickerToCollectorMap[ ticker ]
+
+   def _path( self, directory: str, ticker: str, extension: str ) -> str:
+      return '%s/%s.%s' % ( directory, ticker, extension )
+
+   def downloadPrices( self, tickers: list[str] ) -> dict[str, int]:
+      '''
+      Download the price histories in batches. Full histories also
+      give us the dividends files. Returns 0 or 1 for each ticker.
+      '''
+      return RawDataUtil.getDailyPriceCsvsBatch( tickers, self.priceDir,
+                                                 batchSize=self.batchSize or 100,
+                                                 incremental=self.incremental,
+                                                 catalog=self.catalog,
+                                                 dividendsDestDir=self.dividendsDir )
+
+   def fetchPrices( self, ticker: str ) -> int:
+      dest = self._path( self.priceDir, ticker, 'csv' )
+      if self.incremental:
+         return RawDataUtil.getDailyPriceCsvFast( ticker, dest, self.catalog )
+      return self.collectorFor( ticker ).getDailyPriceCsv( dest )
+
+   def fetchDividends( self, ticker: str ) -> int:
+      return self.collectorFor( ticker ).getDividendsCsv( self._path( self.dividendsDir, ticker, 'csv' ) )
+
+   def fetchFastInfo( self, ticker: str ) -> int:
+      return self.collectorFor( ticker ).getFastInfo( self._path( self.fastInfoDir, ticker, 'json' ) )
+
+   def fetchInfo( self, ticker: str ) -> int:
+      return self.collectorFor( ticker ).getInfoDict( self._path( self.infoDir, ticker, 'json' ) )
+
+   @property
+   def tasks( self ) -> list[FetchTask]:
+      '''
+      The per-ticker tasks, for ConcurrentFetcher.fetchAll(). With batches,
+      the prices come from downloadPrices() instead.
+      '''
+      tasks: list[FetchTask] = [
+         ( 'dividends', self.fetchDividends ),
+         ( 'fastInfo', self.fetchFastInfo ),
+         ( 'info', self.fetchInfo ),
+      ]
+      if self.batchSize <= 0:
+         tasks.insert( 0, ( 'prices', self.fetchPrices ) )
+      return tasks
+
+   def isTaskUpToDate( self, taskName: str, ticker: str ) -> bool:
+      # Where each task writes, and the catalog dataset that tracks it.
+      taskToDatasetAndPathMap = {
+         'prices' : ( Catalog.DAILY_PRICES, self._path( self.priceDir, ticker, 'csv' ) ),
+         'dividends' : ( Catalog.DIVIDENDS, self._path( self.dividendsDir, ticker, 'csv' ) ),
+         'fastInfo' : ( Catalog.FAST_INFO, self._path( self.fastInfoDir, ticker, 'json' ) ),
+         'info' : ( Catalog.INFO, self._path( self.infoDir, ticker, 'json' ) ),
+      }
+      dataset, dest = taskToDatasetAndPathMap[ taskName ]
+      if taskName == 'dividends' and os.path.exists( dest ) and os.path.getmtime( dest ) >= self.startTime:
+         # Already written from the batch download, even if there's no catalog.
+         return True
+      if self.catalog is None:
+         return False
+      return self.catalog.isFresh( ticker, dataset, dest )
+
+   def fetchTicker( self, ticker: str, rateLimiter: Optional[RateLimiter] = None ) -> list[str]:
+      '''
+      Run every task that isn't up-to-date for the ticker, one after another,
+      and return the names of the ones that failed. For callers that stream
+      tickers in, instead of handing them all to ConcurrentFetcher.fetchAll().
+
+      Keyword arguments:
+         ticker      -- The ticker symbol
+         rateLimiter -- Shared cap on how many tasks start per second, if any
+      '''
+      failedTasks, _ = ConcurrentFetcher.fetchTicker( ticker, self.tasks, rateLimiter, self.isTaskUpToDate )
+      self.releaseCollector( ticker )
+      return failedTasks
+
+   def releaseCollector( self, ticker: str ) -> None:
+      '''
+      Nothing else needs the ticker's collector once its tasks are done,
+      so keep the collector's counts and let it go, along with the history
+      it may hold. Pass it to ConcurrentFetcher.fetchAll() as afterTicker.
+      '''
+      collector = self.tickerToCollectorMap.pop( ticker, None )
+      if collector is not None:
+         with self.lock:
+            self.numRequests += collector.numRequests
+            self.numRequestsSaved += collector.numRequestsSaved
+
+   def requestReport( self ) -> str:
+      collectors = list( self.tickerToCollectorMap.values() )
+      numRequests = self.numRequests + sum( c.numRequests for c in collectors )
+      numRequestsSaved = self.numRequestsSaved + sum( c.numRequestsSaved for c in collectors )
+      return "Sent %d per-ticker requests, and saved %d by reading dividends from the price histories" % \
+             ( numRequests, numRequestsSaved )
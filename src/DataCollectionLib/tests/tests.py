@@ -7,11 +7,18 @@ TODOs:
 - Learn how to implement unit tests professionally.
 '''
 
-import os, json
+import os, json, tempfile, threading, time, datetime, urllib.error, urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
 import yfinance as yf
 import pandas as pd
 
-from DataCollectionLib import MacrotrendsUtil, RawDataUtil
+from DataCollectionLib import ClosingPrices, ConcurrentFetcher, MacrotrendsUtil, Pipeline, RawDataUtil
+from DataCollectionLib import DataCatalog as Catalog
+from DataCollectionLib.MacrotrendsCache import MacrotrendsCache
+from UtilLib import BrowserPool, HttpUtil, RequestGovernor, TradingCalendar, Util
+from AnalysisLib import DividendIndex, FundamentalsTable, LiveQuotes, MetricState
+from AnalysisLib.ReturnCalculator import ReturnCalculator
 
 
 
@@ -73,8 +80,610 @@ def testGetYahooFinanceInfoDict() -> None:
 
 
 
+########
+# Helpers for tests that run against a local HTTP server instead of the Internet.
+########
+class SlowHandler( BaseHTTPRequestHandler ):
+    '''
+    Mimics Yahoo! Finance's latency: every request takes LATENCY seconds.
+    '''
+    LATENCY = 0.05
+
+    def do_GET( self ) -> None:
+        time.sleep( self.LATENCY )
+        body = b'{"ok": true}'
+        self.send_response( 200 )
+        self.send_header( 'Content-Type', 'application/json' )
+        self.send_header( 'Content-Length', str( len( body ) ) )
+        self.end_headers()
+        self.wfile.write( body )
+
+    def log_message( self, format: str, *args: object ) -> None:
+        pass
+
+
+class EtagHandler( SlowHandler ):
+    '''
+    Serves /page<N> with an ETag, and answers a matching If-None-Match with a 304.
+    Keeps connections alive, and remembers which client ports connected.
+    '''
+    protocol_version = 'HTTP/1.1'
+    clientPorts: set[int] = set()
+    numFullResponses = 0
+    numNotModified = 0
+
+    def do_GET( self ) -> None:
+        time.sleep( self.LATENCY )
+        EtagHandler.clientPorts.add( self.client_address[ 1 ] )
+        etag = '"v1-%s"' % self.path.strip( '/' )
+        if self.headers.get( 'If-None-Match' ) == etag:
+            EtagHandler.numNotModified += 1
+            self.send_response( 304 )
+            self.send_header( 'ETag', etag )
+            self.send_header( 'Content-Length', '0' )
+            self.end_headers()
+            return
+        EtagHandler.numFullResponses += 1
+        body = ( '<html><body>%s</body></html>' % self.path ).encode()
+        self.send_response( 200 )
+        self.send_header( 'Content-Type', 'text/html; charset=utf-8' )
+        self.send_header( 'ETag', etag )
+        self.send_header( 'Content-Length', str( len( body ) ) )
+        self.end_headers()
+        self.wfile.write( body )
+
+
+class ThrottlingHandler( SlowHandler ):
+    '''
+    Answers with a 429 once more than LIMIT requests came in over the last second,
+    always fails /down with a 500, and has no /missing.
+    '''
+    LIMIT = 20
+    lock = threading.Lock()
+    recentTimes: list[float] = []
+    numRequests = 0
+
+    def do_GET( self ) -> None:
+        with ThrottlingHandler.lock:
+            ThrottlingHandler.numRequests += 1
+            now = time.monotonic()
+            ThrottlingHandler.recentTimes = [ t for t in ThrottlingHandler.recentTimes if t > now - 1 ]
+            throttled = len( ThrottlingHandler.recentTimes ) >= self.LIMIT
+            if not throttled:
+                ThrottlingHandler.recentTimes.append( now )
+        if self.path == '/down':
+            self.send_error( 500 )
+        elif self.path == '/missing':
+            self.send_error( 404 )
+        elif throttled:
+            self.send_response( 429 )
+            self.send_header( 'Retry-After', '0' )
+            self.send_header( 'Content-Length', '0' )
+            self.end_headers()
+        else:
+            super().do_GET()
+
+
+def startLocalServer( handlerClass: type ) -> tuple[ThreadingHTTPServer, str]:
+    '''
+    Start an HTTP server on a free local port, and return it with its base URL.
+    Call server.shutdown() when done.
+    '''
+    server = ThreadingHTTPServer( ( '127.0.0.1', 0 ), handlerClass )
+    threading.Thread( target=server.serve_forever, daemon=True ).start()
+    return server, 'http://127.0.0.1:%d' % server.server_address[ 1 ]
+
+
+def testConcurrentFetcher() -> None:
+    server, baseUrl = startLocalServer( SlowHandler )
+
+    def fetch( ticker: str ) -> int:
+        with urllib.request.urlopen( '%s/%s' % ( baseUrl, ticker ) ) as response:
+            return 0 if response.status == 200 else 1
+
+    def failForB( ticker: str ) -> int:
+        if ticker == 'B':
+            raise RuntimeError( "Simulated failure" )
+        return 0
+
+    try:
+        tickers = [ chr( ord( 'A' ) + i ) for i in range( 20 ) ]
+        tasks = [ ( 'first', fetch ), ( 'flaky', failForB ), ( 'second', fetch ) ]
+
+        serial = ConcurrentFetcher.fetchAll( tickers, tasks, numWorkers=1, showProgress=False )
+        doneTickers: list[str] = []
+        concurrent = ConcurrentFetcher.fetchAll( tickers, tasks, numWorkers=8, showProgress=False,
+                                                 afterTicker=doneTickers.append )
+        print( "Serial: %s" % serial.report() )
+        print( "Concurrent: %s" % concurrent.report() )
+
+        # Only B's flaky task fails, and B's other tasks still ran.
+        assert concurrent.tickerToFailedTasksMap == { 'B' : [ 'flaky' ] }
+        assert concurrent.numTasksRun == len( tickers ) * len( tasks )
+        assert sorted( doneTickers ) == tickers
+        assert concurrent.elapsedSeconds * 3 < serial.elapsedSeconds
+
+        # One ticker on its own is handled the same way, skipped tasks included.
+        skipFirst = lambda name, ticker: name == 'first'
+        assert ConcurrentFetcher.fetchTicker( 'B', tasks, skipTask=skipFirst ) == ( [ 'flaky' ], 1 )
+
+        # The global rate cap holds no matter how many workers there are.
+        limited = ConcurrentFetcher.fetchAll( tickers, [ ( 'fetch', fetch ) ], numWorkers=8,
+                                              maxRequestsPerSecond=40, showProgress=False )
+        print( "Rate-limited: %s" % limited.report() )
+        assert limited.tasksPerSecond <= 40 * 1.1
+    finally:
+        server.shutdown()
+
+
+def testLiveQuoteCache() -> None:
+    now = [ 0.0 ]
+    cache = LiveQuotes.LiveQuoteCache( ttls={ 'info' : 10.0 }, clock=lambda: now[ 0 ] )
+    fetches = []
+    def fetchInfo() -> dict:
+        fetches.append( now[ 0 ] )
+        return { 'time' : now[ 0 ] }
+
+    # A value is fetched again only once it's older than its field's TTL, or invalidated.
+    assert cache.get( 'TEST', 'info', fetchInfo ) == { 'time' : 0.0 }
+    now[ 0 ] = 10.0
+    assert cache.get( 'TEST', 'info', fetchInfo ) == { 'time' : 0.0 }
+    now[ 0 ] = 10.5
+    assert cache.get( 'TEST', 'info', fetchInfo ) == { 'time' : 10.5 }
+    cache.invalidate( 'TEST' )
+    assert cache.get( 'TEST', 'info', fetchInfo ) == { 'time' : 10.5 } and len( fetches ) == 3
+
+    # The latest bars replace the days they overlap and add the new ones.
+    localDf = pd.DataFrame( { 'Close' : [ 10.0, 11.0, 12.0 ] },
+                            index=pd.DatetimeIndex( [ '2024-03-06', '2024-03-07', '2024-03-08' ], name='Date' ) )
+    bars = pd.DataFrame( { 'Close' : [ 12.5, 13.0 ] },
+                         index=pd.DatetimeIndex( [ '2024-03-08', '2024-03-11' ], name='Date' ) )
+    cache.put( 'TEST', 'quote', LiveQuotes.Quote( datetime.date( 2024, 3, 8 ), bars ) )
+    patched = cache.patchHistory( 'TEST', localDf )
+    assert list( patched[ 'Close' ] ) == [ 10.0, 11.0, 12.5, 13.0 ]
+    assert str( patched.index[ -1 ].date() ) == '2024-03-11'
+    # The same inputs give back the same DataFrame, so values computed from it can be reused.
+    assert cache.patchHistory( 'TEST', localDf ) is patched
+
+    # Nothing came back for a ticker: its local history is used as-is.
+    cache.put( 'NONE', 'quote', LiveQuotes.Quote( datetime.date( 2024, 3, 8 ), bars.iloc[ :0 ] ) )
+    assert cache.patchHistory( 'NONE', localDf ) is localDf
+
+
+def testPipeline() -> None:
+    def slowSquare( x: int ) -> list[int]:
+        time.sleep( 0.02 )
+        if x == 3:
+            raise RuntimeError( "Simulated failure" )
+        return [ x * x ]
+
+    # Batches of 5 are split into items, which a slow stage handles 4 at a time.
+    batches = [ list( range( i, i + 5 ) ) for i in range( 0, 40, 5 ) ]
+    stages = [ Pipeline.Stage( 'split', lambda batch: batch ),
+               Pipeline.Stage( 'square', slowSquare, numWorkers=4, queueSize=4 ) ]
+    result = Pipeline.runPipeline( batches, stages )
+    print( result.report() )
+
+    # Only 3 fails, and the rest make it through.
+    assert sorted( result.outputs ) == [ x * x for x in range( 40 ) if x != 3 ]
+    split, square = result.stageStats
+    assert ( split.numIn, split.numOut ) == ( 8, 40 )
+    assert ( square.numIn, square.numOut, square.numFailed ) == ( 40, 39, 1 )
+    assert square.maxQueueDepth <= 4
+    assert result.elapsedSeconds * 2 < 40 * 0.02
+
+
+def testRequestGovernor() -> None:
+    server, baseUrl = startLocalServer( ThrottlingHandler )
+
+    def fetch( path: str ) -> int:
+        with urllib.request.urlopen( baseUrl + path ) as response:
+            return response.status
+
+    try:
+        # Many more requests than the server takes per second all get through,
+        # because the throttled ones are retried at a lower rate.
+        governor = RequestGovernor.RequestGovernor( maxRetries=8, baseBackoffSeconds=0.05, maxBackoffSeconds=0.5,
+                                                    increasePerSuccess=1.0, failureThreshold=100 )
+        with ThreadPoolExecutor( max_workers=8 ) as executor:
+            statuses = list( executor.map( lambda i: governor.call( 'local', fetch, '/page%d' % i ),
+                                           range( 60 ) ) )
+        state = governor.hostState( 'local' )
+        print( governor.report() )
+        assert statuses == [ 200 ] * 60
+        assert state.numSucceeded == 60 and state.numThrottled > 0
+        assert state.numRetries == state.numThrottled and state.rate is not None
+
+        # A missing page isn't retried.
+        numRetries = state.numRetries
+        try:
+            governor.call( 'local', fetch, '/missing' )
+            assert False, "Expected a 404"
+        except urllib.error.HTTPError as e:
+            assert e.code == 404
+        assert state.numRetries == numRetries
+
+        # Failures in a row open the circuit breaker, which then fails fast
+        # without sending anything, until a trial call after the cooldown succeeds.
+        time.sleep( 1 )
+        governor = RequestGovernor.RequestGovernor( maxRetries=0, failureThreshold=3, cooldownSeconds=0.3 )
+        for _ in range( 3 ):
+            try:
+                governor.call( 'local', fetch, '/down' )
+            except urllib.error.HTTPError:
+                pass
+        numServerRequests = ThrottlingHandler.numRequests
+        try:
+            governor.call( 'local', fetch, '/page' )
+            assert False, "Expected the circuit breaker to be open"
+        except RequestGovernor.CircuitOpenError:
+            pass
+        assert ThrottlingHandler.numRequests == numServerRequests
+        time.sleep( 0.3 )
+        assert governor.call( 'local', fetch, '/page' ) == 200
+        assert governor.call( 'local', fetch, '/page' ) == 200
+        state = governor.hostState( 'local' )
+        print( governor.report() )
+        assert ( state.numTrips, state.numRejected, state.numFailed ) == ( 1, 1, 3 )
+
+        # A failure that opens the breaker, like a failed trial call, is raised
+        # as it is, instead of being retried into a CircuitOpenError.
+        governor = RequestGovernor.RequestGovernor( maxRetries=2, baseBackoffSeconds=0.01,
+                                                    failureThreshold=1, cooldownSeconds=0.3 )
+        for _ in range( 2 ):
+            try:
+                governor.call( 'local', fetch, '/down' )
+                assert False, "Expected a 500"
+            except urllib.error.HTTPError as e:
+                assert e.code == 500
+            time.sleep( 0.3 )
+        state = governor.hostState( 'local' )
+        assert ( state.numTrips, state.numRetries, state.numFailed ) == ( 2, 0, 2 )
+    finally:
+        server.shutdown()
+
+
+def testHttpClient() -> None:
+    server, baseUrl = startLocalServer( EtagHandler )
+    cacheDir = 'httpCacheForTest'
+    client = HttpUtil.HttpClient( cacheDir=cacheDir )
+    try:
+        # The first fetch downloads the page, and later ones revalidate it with a 304.
+        first = client.get( baseUrl + '/page0' )
+        assert first.status == 200 and not first.fromCache
+        for _ in range( 4 ):
+            again = client.get( baseUrl + '/page0' )
+            assert again.fromCache and again.text == first.text
+        assert EtagHandler.numFullResponses == 1 and EtagHandler.numNotModified == 4
+        # All of those requests went over the same connection.
+        assert len( EtagHandler.clientPorts ) == 1
+
+        # The cache is on disk, so a new client also gets a 304.
+        otherClient = HttpUtil.HttpClient( cacheDir=cacheDir )
+        assert otherClient.get( baseUrl + '/page0' ).fromCache
+        otherClient.close()
+
+        # Independent pages are fetched concurrently.
+        urls = [ '%s/page%d' % ( baseUrl, i ) for i in range( 1, 9 ) ]
+        start = time.monotonic()
+        urlToResponseMap = client.fetchAll( urls )
+        elapsed = time.monotonic() - start
+        print( "Fetched %d pages in %.2fs" % ( len( urls ), elapsed ) )
+        assert all( urlToResponseMap[ url ].text.endswith( '/page%d</body></html>' % i )
+                    for i, url in enumerate( urls, 1 ) )
+        assert elapsed < len( urls ) * EtagHandler.LATENCY / 2
+    finally:
+        client.close()
+        server.shutdown()
+        os.system( 'rm -rf %s' % cacheDir )
+
+
+class FakeDriver:
+    '''
+    Stands in for a Selenium driver. Loading a URL containing 'crash' raises,
+    like a browser that crashed.
+    '''
+    numAlive = 0
+    maxAlive = 0
+    maxUses = 0
+    lock = threading.Lock()
+
+    def __init__( self ) -> None:
+        time.sleep( 0.05 ) # Browsers are slow to start.
+        self.page_source = ''
+        self.numUses = 0
+        with FakeDriver.lock:
+            FakeDriver.numAlive += 1
+            FakeDriver.maxAlive = max( FakeDriver.maxAlive, FakeDriver.numAlive )
+
+    def get( self, url: str ) -> None:
+        time.sleep( 0.01 )
+        self.numUses += 1
+        with FakeDriver.lock:
+            FakeDriver.maxUses = max( FakeDriver.maxUses, self.numUses )
+        if 'crash' in url:
+            raise RuntimeError( "Simulated browser crash" )
+        self.page_source = '<html>%s</html>' % url
+
+    def quit( self ) -> None:
+        with FakeDriver.lock:
+            FakeDriver.numAlive -= 1
+
+
+def testBrowserPool() -> None:
+    urls = [ 'https://example.com/page%d' % i for i in range( 30 ) ]
+    with BrowserPool.BrowserPool( size=3, maxUses=10, driverFactory=FakeDriver ) as pool:
+        pool.warmUp()
+        with ThreadPoolExecutor( max_workers=8 ) as executor:
+            pages = list( executor.map( pool.getPageSource, urls ) )
+        assert pages == [ '<html>%s</html>' % url for url in urls ]
+        # Never more than 3 browsers, and none was used more than 10 times.
+        assert FakeDriver.maxAlive == 3
+        assert FakeDriver.maxUses == 10
+        assert pool.numDriversRecycled >= 1
+
+        # A crash throws the browser away, and the retry gets a new one.
+        numStarted = pool.numDriversStarted
+        try:
+            pool.getPageSource( 'https://example.com/crash', numRetries=1 )
+        except RuntimeError:
+            pass
+        else:
+            raise AssertionError( "Expected the crash to propagate" )
+        assert pool.numDriversStarted >= numStarted + 1
+        assert pool.getPageSource( urls[ 0 ] ) == pages[ 0 ]
+        print( "Loaded %d pages with %d browsers" % ( pool.numPageLoads, pool.numDriversStarted ) )
+    assert FakeDriver.numAlive == 0
+
+
+def testTradingCalendar() -> None:
+    # The NYSE's published 2024 holidays.
+    expectedHolidays = [ '2024-01-01', '2024-01-15', '2024-02-19', '2024-03-29', '2024-05-27',
+                         '2024-06-19', '2024-07-04', '2024-09-02', '2024-11-28', '2024-12-25' ]
+    assert sorted( d.isoformat() for d in TradingCalendar.holidays( 2024 ) ) == expectedHolidays
+    # New Year's Day 2022 was a Saturday, so the exchange stayed open on 2021-12-31.
+    assert TradingCalendar.isTradingDay( datetime.date( 2021, 12, 31 ) )
+    assert TradingCalendar.isEarlyClose( datetime.date( 2024, 11, 29 ) )
+
+    def at( timeStr: str ) -> datetime.datetime:
+        return datetime.datetime.fromisoformat( timeStr ).replace( tzinfo=TradingCalendar.NEW_YORK )
+
+    # Before the close, the last completed session is the previous trading day,
+    # skipping weekends and holidays.
+    assert TradingCalendar.lastCompletedSession( at( '2024-07-05 15:00' ) ) == datetime.date( 2024, 7, 3 )
+    assert TradingCalendar.lastCompletedSession( at( '2024-07-05 16:00' ) ) == datetime.date( 2024, 7, 5 )
+    assert TradingCalendar.lastCompletedSession( at( '2024-11-29 13:00' ) ) == datetime.date( 2024, 11, 29 )
+    assert TradingCalendar.lastCompletedSession( at( '2024-09-02 18:00' ) ) == datetime.date( 2024, 8, 30 )
+    assert TradingCalendar.isUpToDate( '2024-08-30', at( '2024-09-03 09:30' ) )
+    assert not TradingCalendar.isUpToDate( '2024-08-30', at( '2024-09-03 16:30' ) )
+
+
+def testFundamentalsTable() -> None:
+    with tempfile.TemporaryDirectory() as tempDir:
+        infoDir = os.path.join( tempDir, 'info' )
+        fastInfoDir = os.path.join( tempDir, 'fastInfo' )
+        os.makedirs( infoDir )
+        os.makedirs( fastInfoDir )
+        infoDict = { 'longName' : 'Test Inc.', 'sector' : None, 'forwardPE' : 15, 'website' : 'test.com' }
+        with open( os.path.join( infoDir, 'TEST.json' ), 'w' ) as f:
+            json.dump( infoDict, f )
+        with open( os.path.join( fastInfoDir, 'TEST.json' ), 'w' ) as f:
+            json.dump( { 'marketCap' : 1.5e9, 'shares' : 1000 }, f )
+
+        tablePath = os.path.join( tempDir, 'fundamentals.npz' )
+        assert FundamentalsTable.buildFundamentalsTable( tablePath=tablePath, infoDir=infoDir,
+                                                         fastInfoDir=fastInfoDir ) == 1
+        table = FundamentalsTable.FundamentalsTable( tablePath, infoDir, fastInfoDir )
+        info = table.info( 'TEST' )
+        assert info is not None
+        # Fields in the table don't load the JSON, including ones the JSON doesn't have.
+        assert info[ 'longName' ] == 'Test Inc.'
+        assert info.get( 'dividendYield', 0 ) == 0
+        assert 'fullDict' not in info.__dict__
+        # Everything else comes from the JSON, unchanged.
+        assert info[ 'sector' ] is None and info[ 'forwardPE' ] == 15 and type( info[ 'forwardPE' ] ) is int
+        assert info[ 'website' ] == 'test.com'
+        assert dict( info ) == infoDict
+        fastInfo = table.fastInfo( 'TEST' )
+        assert fastInfo is not None and fastInfo[ 'shares' ] == 1000 and fastInfo[ 'marketCap' ] == 1.5e9
+        assert table.info( 'OTHER' ) is None
+
+        # Once a JSON changes, the table is out-of-date for it.
+        time.sleep( 0.01 )
+        with open( os.path.join( infoDir, 'TEST.json' ), 'w' ) as f:
+            json.dump( { 'longName' : 'Renamed Inc.' }, f )
+        assert table.info( 'TEST' ) is None
+        assert table.fastInfo( 'TEST' ) is not None
+
+
+def testReturnCalculator() -> None:
+    # Trading days around New Year, with a holiday, a gap and a missing price.
+    dates = [ '2022-12-29', '2022-12-30', '2023-01-03', '2023-12-29', '2024-01-02', '2024-02-29', '2025-02-28' ]
+    closes = [ 90.0, 100.0, 101.0, 110.0, float( 'nan' ), 120.0, 150.0 ]
+    calculator = ReturnCalculator( [ dates, dates[ -2: ] ], [ closes, closes[ -2: ] ] )
+    # The anchor is the last close on or before the date, skipping NaN.
+    assert list( calculator.pricesAsOf( '2024-01-01' ) )[ 0 ] == 110.0
+    assert list( calculator.pricesAsOf( '2024-01-02' ) )[ 0 ] == 110.0
+    # Feb 28 2025 minus a year is Feb 28 2024, before the second ticker's history.
+    oneYear = calculator.nYearReturn( 1 )
+    assert oneYear[ 0 ] == 100 * ( 150.0 - 110.0 ) / 110.0 and pd.isna( oneYear[ 1 ] )
+    assert calculator.ytdReturn()[ 0 ] == 100 * ( 150.0 - 120.0 ) / 120.0
+    assert calculator.returnBetween( '2023-01-01', '2024-01-01' )[ 0 ] == 10.0
+    assert pd.isna( calculator.returnSince( '2022-12-01' )[ 0 ] )
+
+
+def testDividendIndex() -> None:
+    with tempfile.TemporaryDirectory() as tempDir:
+        path = os.path.join( tempDir, 'TEST.csv' )
+        with open( path, 'w' ) as f:
+            f.write( "Date,Dividends\n"
+                     "2022-03-01 00:00:00-05:00,0.2\n"
+                     "2023-03-01 00:00:00-05:00,0.25\n"
+                     "2023-09-01 00:00:00-04:00,0.25\n"
+                     "2023-12-01 00:00:00-05:00,n/a\n"
+                     "2024-03-01 00:00:00-05:00,0.3\n" )
+        # Amounts that aren't numbers are left out.
+        dates, amounts = DividendIndex.readDividendsCsv( path )
+        assert str( dates[ 0 ] ) == '2022-03-01' and list( amounts ) == [ 0.2, 0.25, 0.25, 0.3 ]
+
+        tablePath = os.path.join( tempDir, 'dividends.npz' )
+        assert DividendIndex.buildDividendTable( tablePath=tablePath, dividendsDir=tempDir ) == 1
+        table = DividendIndex.DividendTable( tablePath, tempDir )
+        tableArrays = table.dividendArrays( 'TEST' )
+        assert tableArrays is not None and list( tableArrays[ 1 ] ) == list( amounts )
+
+        # A second ticker that has never paid.
+        index = DividendIndex.DividendIndex( [ dates, [] ], [ amounts, [] ] )
+        assert list( index.payoutCount( '2024-03-01' ) ) == [ 2, 0 ]
+        assert list( index.trailingTotal( '2024-03-01' ) ) == [ 0.55, 0.0 ]
+        # The window covers the 365 days up to and including the date.
+        assert list( index.trailingTotal( '2024-02-29' ) ) == [ 0.25, 0.0 ]
+        growth = index.growthRate( 1, '2024-03-01' )
+        assert abs( growth[ 0 ] - 120.0 ) < 1e-9 and pd.isna( growth[ 1 ] )
+
+
+def testMacrotrendsCache() -> None:
+    with tempfile.TemporaryDirectory() as tempDir:
+        cache = MacrotrendsCache( os.path.join( tempDir, 'cache.sqlite' ), defaultTtlSeconds=60 )
+        cache.put( 'TEST', 'net-income', '<html></html>' )
+        page = cache.get( 'TEST', 'net-income' )
+        assert page is not None and page.yearToValueMap is None
+
+        # Storing the parsed values later doesn't restart the page's TTL.
+        time.sleep( 0.01 )
+        cache.putParsed( 'TEST', 'net-income', { 2022 : 1.5 } )
+        parsedPage = cache.get( 'TEST', 'net-income' )
+        assert parsedPage is not None and parsedPage.yearToValueMap == { 2022 : 1.5 }
+        assert parsedPage.fetchedAt == page.fetchedAt
+        cache.close()
+
+
+def testMacrotrendsBlockedPage() -> None:
+    blockedHtml = '<html><body>Automated access to our data is prohibited</body></html>'
+    dataHtml = '<html><body><table><thead><tr><th colspan="2">Net Income (Millions of US $)</th></tr></thead>' \
+               '<tr><td>2022</td><td>$1.5</td></tr></table></body></html>'
+    loadedPages = [ blockedHtml, dataHtml ]
+    originalLoadPage = MacrotrendsUtil._loadPage
+    originalCache = MacrotrendsUtil.MacrotrendsCache._sharedCache
+    with tempfile.TemporaryDirectory() as tempDir:
+        cache = MacrotrendsCache( os.path.join( tempDir, 'cache.sqlite' ) )
+        MacrotrendsUtil.MacrotrendsCache._sharedCache = cache
+        MacrotrendsUtil._loadPage = lambda ticker, metric: loadedPages.pop( 0 )
+        try:
+            # A blocked page isn't cached, so the next call loads the page again.
+            assert MacrotrendsUtil.getPageSource( 'TEST', 'net-income' ) == blockedHtml
+            assert MacrotrendsUtil.getAnnualData( 'TEST', 'net-income' ) == { 2022 : 1500000.0 }
+            page = cache.get( 'TEST', 'net-income' )
+            assert page is not None and page.yearToValueMap == { 2022 : 1500000.0 }
+
+            # A blocked page that's already cached is dropped and loaded again.
+            cache.put( 'TEST', 'revenue', blockedHtml )
+            loadedPages.append( dataHtml )
+            assert MacrotrendsUtil.getAnnualData( 'TEST', 'revenue' ) == { 2022 : 1500000.0 }
+        finally:
+            MacrotrendsUtil._loadPage = originalLoadPage
+            MacrotrendsUtil.MacrotrendsCache._sharedCache = originalCache
+            cache.close()
+
+
+def testClosingPricesAfterAppend() -> None:
+    originalBaseDir = Util.BASE_DIR
+    with tempfile.TemporaryDirectory() as tempDir:
+        Util.BASE_DIR = tempDir
+        try:
+            os.makedirs( Util.absolutePathLocator( ClosingPrices.RAW_CSV_DIR ) )
+            rawPath = ClosingPrices.rawCsvPath( 'TEST' )
+            with open( rawPath, 'w' ) as f:
+                f.write( "Date,Open,High,Low,Close,Volume\n"
+                         "2024-03-07,10.0,10.5,9.5,10.25,100\n" )
+            catalog = Catalog.DataCatalog( os.path.join( tempDir, 'catalog.sqlite' ) )
+            catalog.recordFile( 'TEST', Catalog.DAILY_PRICES, rawPath, 1, '2024-03-07' )
+            ClosingPrices.recordInCatalog( catalog, ClosingPrices.generateClosingPrices( 'TEST' ) )
+            assert ClosingPrices.findStaleTickers( catalog, [ 'TEST' ] ) == []
+
+            # Appending rows chains the raw CSV's hash instead of hashing the file.
+            newRows = pd.DataFrame( { 'Open' : [ 10.25 ], 'High' : [ 11.0 ], 'Low' : [ 10.0 ],
+                                      'Close' : [ 10.75 ], 'Volume' : [ 200 ] },
+                                    index=pd.Index( [ '2024-03-08' ], name='Date' ) )
+            appendedBytes = RawDataUtil._appendPriceRows( rawPath, newRows )
+            RawDataUtil._recordAppendedRows( catalog, 'TEST', rawPath, newRows, appendedBytes )
+            assert ClosingPrices.findStaleTickers( catalog, [ 'TEST' ] ) == [ 'TEST' ]
+
+            # Regenerated once, the closing prices stay up-to-date.
+            ClosingPrices.recordInCatalog( catalog, ClosingPrices.generateClosingPrices( 'TEST' ) )
+            assert ClosingPrices.findStaleTickers( catalog, [ 'TEST' ] ) == []
+            assert ClosingPrices.isUpToDate( catalog, 'TEST' )
+            catalog.close()
+        finally:
+            Util.BASE_DIR = originalBaseDir
+
+
+def testMetricState() -> None:
+    closes = [ 10.0, 12.0, float( 'nan' ), 11.0, 9.0, 13.0, 12.5 ]
+    dates = [ '2024-03-0%d' % d for d in range( 1, 8 ) ]
+    windows: dict = { 'highLowWindows' : [ 3 ], 'movingAverageWindows' : [ 2, 3 ], 'returnDays' : [ 1, 5 ] }
+    def values( s: MetricState.MetricState ) -> str:
+        # As JSON, so NaN equals NaN.
+        return json.dumps( [ s.lastClosingPrice, s.allTimeHigh, s.allTimeLow, s.nDayHigh( 3 ), s.nDayLow( 3 ),
+                 s.movingAverage( 2 ), s.movingAverage( 3 ), s.nDayReturn( 1 ), s.nDayReturn( 5 ) ] )
+
+    # Building from a whole history and adding one bar at a time give the same values.
+    built = MetricState.MetricState.fromArrays( 'TEST', dates, closes, **windows )
+    state = MetricState.MetricState( 'TEST', **windows )
+    for date, close in zip( dates, closes ):
+        state.update( date, close )
+    assert values( built ) == values( state )
+
+    assert state.allTimeHigh == 13.0 and state.allTimeLow == 9.0
+    assert state.nDayHigh( 3 ) == 13.0 and state.nDayLow( 3 ) == 9.0
+    assert state.movingAverage( 2 ) == 12.75 and state.nDayReturn( 5 ) == 100 * ( 12.5 - 12.0 ) / 12.0
+    # Like pandas, a window with a NaN has no mean.
+    assert pd.isna( MetricState.MetricState.fromArrays( 'TEST', dates[ :4 ], closes[ :4 ], **windows ).movingAverage( 3 ) )
+
+    # The last bar can be revised, but not the ones before it.
+    state.update( '2024-03-08', 20.0 )
+    state.update( '2024-03-08', 8.0 )
+    assert state.lastClosingPrice == 8.0 and state.allTimeHigh == 13.0 and state.nDayLow( 3 ) == 8.0
+    assert len( state ) == 8
+    try:
+        state.update( '2024-03-07', 12.0 )
+        assert False, "Revised a bar before the last one"
+    except ValueError:
+        pass
+    # Windows that aren't kept can't be read.
+    try:
+        state.movingAverage( 200 )
+        assert False, "Read a moving average that isn't kept"
+    except ValueError:
+        pass
+
+    with tempfile.TemporaryDirectory() as tempDir:
+        MetricState.writeCheckpoint( state, tempDir )
+        restored = MetricState.readCheckpoint( 'TEST', tempDir, csvDir=tempDir, npyDir=tempDir )
+        assert restored is not None and values( restored ) == values( state ) and len( restored ) == 8
+        # The closing prices changed after the checkpoint was written.
+        time.sleep( 0.01 )
+        with open( os.path.join( tempDir, 'TEST.csv' ), 'w' ) as f:
+            f.write( 'Date,Close\n' )
+        assert MetricState.readCheckpoint( 'TEST', tempDir, csvDir=tempDir, npyDir=tempDir ) is None
+
+
 def main() -> None:
     testList = [
+        testTradingCalendar,
+        testFundamentalsTable,
+        testReturnCalculator,
+        testDividendIndex,
+        testMacrotrendsCache,
+        testMacrotrendsBlockedPage,
+        testClosingPricesAfterAppend,
+        testMetricState,
+        testLiveQuoteCache,
+        testPipeline,
+        testRequestGovernor,
+        testHttpClient,
+        testBrowserPool,
+        testConcurrentFetcher,
         testYfinance,
         testGetDailyPriceCsv,
         testGetYahooFinanceInfoDict,
@@ -0,0 +1,190 @@
+#!/usr/bin/env python
+
+
+r"""
+A pool of warm browser sessions for scraping pages that need a real browser.
+
+Starting a browser takes far longer than loading a page, so the pool keeps up
+to `size` drivers alive and hands them out to page loads, which can run
+concurrently. A driver is replaced after `maxUses` page loads ( browsers get
+slower and leak memory the longer they run ), and whenever a page load raises,
+since the browser may have crashed.
+
+Drivers come from a factory function, so anything with Selenium's get(),
+page_source and quit() can be pooled, e.g. a fake driver in tests.
+
+Example:
+    >>> with BrowserPool( size=4 ) as pool:
+    ...     pages = list( executor.map( pool.getPageSource, urls ) )
+"""
+
+import atexit, threading, queue
+from contextlib import contextmanager
+from typing import Any, Callable, Iterator, Optional
+
+
+def makeHeadlessChrome() -> Any:
+    '''
+    The default driver factory.
+    '''
+    from selenium import webdriver
+    options = webdriver.ChromeOptions()
+    options.add_argument( '--headless=new' )
+    return webdriver.Chrome( options=options )
+
+
+class _PooledDriver:
+    def __init__( self, driver: Any ) -> None:
+        self.driver = driver
+        self.numUses = 0
+
+
+class BrowserPool:
+    def __init__( self,
+                  size: int = 2,
+                  maxUses: int = 50,
+                  driverFactory: Callable[[], Any] = makeHeadlessChrome ) -> None:
+        '''
+        Keyword arguments:
+           size          -- Maximum number of drivers alive at the same time,
+                            i.e. how many pages can load concurrently.
+           maxUses       -- Replace a driver after this many page loads.
+           driverFactory -- Function that starts a new driver.
+        '''
+        self.size = size
+        self.maxUses = maxUses
+        self.driverFactory = driverFactory
+        # Each page load holds a slot, so at most `size` drivers are in use at once.
+        self.slots = threading.Semaphore( size )
+        self.idleDrivers: queue.LifoQueue[_PooledDriver] = queue.LifoQueue()
+        self.lock = threading.Lock()
+        self.closed = False
+
+        self.numDriversAlive = 0
+        self.numDriversStarted = 0
+        self.numDriversRecycled = 0
+        self.numPageLoads = 0
+
+    def __enter__( self ) -> 'BrowserPool':
+        return self
+
+    def __exit__( self, *args: object ) -> None:
+        self.close()
+
+    def _startDriver( self ) -> _PooledDriver:
+        pooledDriver = _PooledDriver( self.driverFactory() )
+        with self.lock:
+            self.numDriversAlive += 1
+            self.numDriversStarted += 1
+        return pooledDriver
+
+    def _retire( self, pooledDriver: _PooledDriver ) -> None:
+        with self.lock:
+            self.numDriversAlive -= 1
+            self.numDriversRecycled += 1
+        try:
+            pooledDriver.driver.quit()
+        except Exception as e:
+            # The browser may have crashed already.
+            print( "[ERROR] Failed to quit browser: %s" % e )
+
+    def warmUp( self ) -> None:
+        '''
+        Start drivers until `size` of them are alive, so the first page
+        loads don't have to wait for a browser to start.
+        '''
+        while self.numDriversAlive < self.size and not self.closed:
+            self.idleDrivers.put( self._startDriver() )
+
+    @contextmanager
+    def driver( self ) -> Iterator[Any]:
+        '''
+        Borrow a driver, waiting for one to be free if they're all in use.
+        If the block raises, the driver is thrown away instead of reused.
+        '''
+        if self.closed:
+            raise RuntimeError( "The browser pool is closed" )
+        with self.slots:
+            try:
+                pooledDriver = self.idleDrivers.get_nowait()
+            except queue.Empty:
+                pooledDriver = self._startDriver()
+
+            try:
+                yield pooledDriver.driver
+            except BaseException:
+                self._retire( pooledDriver )
+                raise
+
+            pooledDriver.numUses += 1
+            if pooledDriver.numUses >= self.maxUses or self.closed:
+                self._retire( pooledDriver )
+            else:
+                self.idleDrivers.put( pooledDriver )
+
+    def getPageSource( self, url: str, numRetries: int = 1 ) -> str:
+        '''
+        Load the URL in one of the pool's browsers and return the page's HTML.
+        If the load fails, retry up to numRetries times with a fresh browser.
+        '''
+        for attempt in range( numRetries + 1 ):
+            try:
+                with self.driver() as driver:
+                    driver.get( url )
+                    pageSource = driver.page_source
+                with self.lock:
+                    self.numPageLoads += 1
+                return pageSource
+            except Exception as e:
+                if attempt == numRetries:
+                    raise
+                print( "[ERROR] Failed to load %s, retrying with a new browser: %s" % ( url, e ) )
+        raise AssertionError( "unreachable" )
+
+    def close( self ) -> None:
+        '''
+        Quit the idle drivers. Drivers that are in use quit when they're returned.
+        '''
+        self.closed = True
+        while True:
+            try:
+                pooledDriver = self.idleDrivers.get_nowait()
+            except queue.Empty:
+                break
+            self._retire( pooledDriver )
+
+
+_sharedPool: Optional[BrowserPool] = None
+_sharedPoolLock = threading.Lock()
+
+
+def configureSharedPool( size: int = 2,
+                         maxUses: int = 50,
+                         driverFactory: Callable[[], Any] = makeHeadlessChrome ) -> BrowserPool:
+    '''
+    Replace the shared pool with one using the given settings.
+    '''
+    global _sharedPool
+    with _sharedPoolLock:
+        if _sharedPool is not None:
+            _sharedPool.close()
+        _sharedPool = BrowserPool( size, maxUses, driverFactory )
+        return _sharedPool
+
+
+def getSharedPool() -> BrowserPool:
+    '''
+    Returns the pool shared by Util.getPageSourceUsingSelenium(),
+    creating it with the default settings on first use.
+    '''
+    global _sharedPool
+    with _sharedPoolLock:
+        if _sharedPool is None or _sharedPool.closed:
+            _sharedPool = BrowserPool()
+        return _sharedPool
+
+
+@atexit.register
+def _closeSharedPool() -> None:
+    if _sharedPool is not None:
+        _sharedPool.close()
@@ -0,0 +1,181 @@
+#!/usr/bin/env python
+
+
+r"""
+A shared HTTP client for the scraping helpers.
+
+- One requests.Session, so connections to the same host are kept alive and reused.
+- An on-disk cache of responses that carry an ETag or Last-Modified header.
+  Pages in the cache are revalidated with a conditional GET, so a page that
+  hasn't changed costs a 304 response instead of a full download.
+- fetchAll() downloads independent pages concurrently.
+
+Example:
+    >>> html = HttpUtil.getText( 'https://en.wikipedia.org/wiki/Nasdaq-100' )
+    >>> urlToResponseMap = HttpUtil.fetchAll( [ url1, url2 ] )
+    >>> urlToResponseMap[ url1 ].fromCache
+    True
+"""
+
+import os, json, hashlib, threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import NamedTuple, Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from UtilLib import Util
+
+
+CACHE_DIR = 'data/HttpCache'
+
+# Some sites ( e.g. Wikipedia ) reject requests without a User-Agent.
+USER_AGENT = 'TradingWithCode/1.0 (+https://github.com/kelvinchengGH/TradingWithCode)'
+
+
+class HttpResponse( NamedTuple ):
+    url: str
+    status: int       # Status of the final response, e.g. 200, or 304 when the cached copy was used.
+    content: bytes
+    encoding: Optional[str]
+    fromCache: bool
+
+    @property
+    def text( self ) -> str:
+        return self.content.decode( self.encoding or 'utf-8', errors='replace' )
+
+
+class HttpClient:
+    def __init__( self,
+                  cacheDir: str = '',
+                  useCache: bool = True,
+                  poolSize: int = 16,
+                  timeout: float = 30 ) -> None:
+        '''
+        Keyword arguments:
+           cacheDir -- Where to keep cached responses. Defaults to CACHE_DIR.
+           useCache -- Whether to use and update the on-disk cache at all.
+           poolSize -- How many connections to keep open per host.
+           timeout  -- Seconds to wait for the server before giving up.
+        '''
+        self.cacheDir = cacheDir or Util.absolutePathLocator( CACHE_DIR )
+        self.useCache = useCache
+        self.timeout = timeout
+        self.session = requests.Session()
+        adapter = HTTPAdapter( pool_connections=poolSize, pool_maxsize=poolSize )
+        self.session.mount( 'http://', adapter )
+        self.session.mount( 'https://', adapter )
+        self.session.headers[ 'User-Agent' ] = USER_AGENT
+
+        self.lock = threading.Lock()
+        self.numRequests = 0
+        self.numNotModified = 0
+        self.bytesDownloaded = 0
+
+    def close( self ) -> None:
+        self.session.close()
+
+    def _cachePaths( self, url: str ) -> tuple[str, str]:
+        '''
+        Returns the paths of the cached body and of its metadata.
+        '''
+        key = hashlib.sha1( url.encode() ).hexdigest()
+        return ( os.path.join( self.cacheDir, key + '.body' ),
+                 os.path.join( self.cacheDir, key + '.json' ) )
+
+    def _readCache( self, url: str ) -> Optional[tuple[dict, bytes]]:
+        bodyPath, metaPath = self._cachePaths( url )
+        try:
+            with open( metaPath, 'r' ) as f:
+                meta = json.load( f )
+            with open( bodyPath, 'rb' ) as f:
+                content = f.read()
+        except ( FileNotFoundError, ValueError ):
+            return None
+        if meta.get( 'url' ) != url:
+            return None
+        return meta, content
+
+    def _writeCache( self, url: str, meta: dict, content: bytes ) -> None:
+        os.makedirs( self.cacheDir, exist_ok=True )
+        bodyPath, metaPath = self._cachePaths( url )
+        # Write the body before the metadata, and swap each in atomically,
+        # so a reader never pairs new metadata with an old body.
+        for path, data in ( ( bodyPath, content ), ( metaPath, json.dumps( meta ).encode() ) ):
+            tmpPath = '%s.%d.tmp' % ( path, threading.get_ident() )
+            with open( tmpPath, 'wb' ) as f:
+                f.write( data )
+            os.replace( tmpPath, path )
+
+    def get( self, url: str ) -> HttpResponse:
+        '''
+        GET the URL, and raise requests.HTTPError if the server returns an error.
+        '''
+        cached = self._readCache( url ) if self.useCache else None
+        headers = {}
+        if cached is not None:
+            meta, _ = cached
+            if meta.get( 'etag' ):
+                headers[ 'If-None-Match' ] = meta[ 'etag' ]
+            if meta.get( 'lastModified' ):
+                headers[ 'If-Modified-Since' ] = meta[ 'lastModified' ]
+
+        response = self.session.get( url, headers=headers, timeout=self.timeout )
+        with self.lock:
+            self.numRequests += 1
+            self.bytesDownloaded += len( response.content )
+
+        if response.status_code == 304 and cached is not None:
+            with self.lock:
+                self.numNotModified += 1
+            meta, content = cached
+            return HttpResponse( url, 304, content, meta.get( 'encoding' ), True )
+
+        response.raise_for_status()
+        etag = response.headers.get( 'ETag' )
+        lastModified = response.headers.get( 'Last-Modified' )
+        if self.useCache and ( etag or lastModified ):
+            meta = { 'url' : url, 'etag' : etag, 'lastModified' : lastModified,
+                     'encoding' : response.encoding }
+            self._writeCache( url, meta, response.content )
+        return HttpResponse( url, response.status_code, response.content, response.encoding, False )
+
+    def getText( self, url: str ) -> str:
+        return self.get( url ).text
+
+    def fetchAll( self, urls: list[str], numWorkers: int = 8 ) -> dict[str, HttpResponse]:
+        '''
+        GET the URLs concurrently, and return a map from each URL to its response.
+        If any of them fails, its exception is raised after the others finish.
+        '''
+        with ThreadPoolExecutor( max_workers=max( 1, min( numWorkers, len( urls ) ) ) ) as executor:
+            futures = { url : executor.submit( self.get, url ) for url in urls }
+        return { url : future.result() for url, future in futures.items() }
+
+
+_defaultClient: Optional[HttpClient] = None
+_defaultClientLock = threading.Lock()
+
+
+def getDefaultClient() -> HttpClient:
+    '''
+    Returns the client shared by the module-level functions,
+    creating it on first use.
+    '''
+    global _defaultClient
+    with _defaultClientLock:
+        if _defaultClient is None:
+            _defaultClient = HttpClient()
+        return _defaultClient
+
+
+def get( url: str ) -> HttpResponse:
+    return getDefaultClient().get( url )
+
+
+def getText( url: str ) -> str:
+    return getDefaultClient().getText( url )
+
+
+def fetchAll( urls: list[str], numWorkers: int = 8 ) -> dict[str, HttpResponse]:
+    return getDefaultClient().fetchAll( urls, numWorkers )
@@ -0,0 +1,127 @@
+#!/usr/bin/env python
+
+
+r"""
+Per-ticker tables kept in a single .npz file, built from one source file
+per ticker ( e.g. a JSON or a CSV ), and checked against those files'
+mtimes when they're read.
+
+- readSourceFiles() reads each ticker's source file, and records its mtime.
+- writeTable() writes the arrays so readers never see half a table.
+- NpzTable is a read-only view of a table. The whole table is read the
+  first time it's used, and rowMatchesFile() tells whether a ticker's row
+  is still up-to-date with its source file.
+- sharedTable() returns one instance per table class and path, so every
+  Stock shares one load of each table.
+
+Example:
+    >>> mtimes, dicts = NpzTable.readSourceFiles( paths, loadJson, ( OSError, ValueError ) )
+    >>> NpzTable.writeTable( tablePath, { 'tickers' : np.array( tickers ), 'mtimes' : mtimes, ... } )
+    >>> table = NpzTable.sharedTable( NpzTable.NpzTable, tablePath )
+    >>> table.rowMatchesFile( table.tickerToRowMap[ 'AAPL' ], 'mtimes', paths[ 0 ] )
+    True
+"""
+
+import os
+from functools import cached_property
+from typing import Callable, Optional, Sequence, TypeVar
+
+import numpy as np
+
+
+T = TypeVar( 'T' )
+TableT = TypeVar( 'TableT', bound='NpzTable' )
+
+
+def mtimeNs( path: str ) -> int:
+    '''
+    Return the file's mtime in nanoseconds, or -1 if it can't be read.
+    '''
+    try:
+        return os.stat( path ).st_mtime_ns
+    except OSError:
+        return -1
+
+
+def readSourceFiles( paths: Sequence[str],
+                     read: Callable[[str], T],
+                     errors: tuple[type[Exception], ...] ) -> tuple[np.ndarray, list[Optional[T]]]:
+    '''
+    Read every file, and return their mtimes ( int64 ) and what read() returned.
+    When read() raises one of the errors, the file's result is None and its
+    mtime is -1, so the table never claims to have it, and callers read
+    the file themselves and fail the way they always have.
+    '''
+    mtimes = np.full( len( paths ), -1, dtype=np.int64 )
+    results: list[Optional[T]] = []
+    for row, path in enumerate( paths ):
+        # Take the mtime before reading, so a file that changes while
+        # we read it looks out-of-date afterwards.
+        mtimes[ row ] = mtimeNs( path )
+        try:
+            results.append( read( path ) )
+        except errors:
+            mtimes[ row ] = -1
+            results.append( None )
+    return mtimes, results
+
+
+def writeTable( tablePath: str, arrays: dict[str, np.ndarray] ) -> None:
+    # Write to a temporary file and swap it in, so readers never see half a table.
+    os.makedirs( os.path.dirname( tablePath ), exist_ok=True )
+    tempPath = tablePath + '-tmp'
+    with open( tempPath, 'wb' ) as tableFile:
+        np.savez( tableFile, allow_pickle=False, **arrays )
+    os.replace( tempPath, tablePath )
+
+
+class NpzTable:
+    '''
+    Read-only view of a table written by writeTable(), with a 'tickers' array
+    giving each row's ticker.
+    '''
+    def __init__( self, tablePath: str ) -> None:
+        self.tablePath = tablePath
+
+    @cached_property
+    def arrays( self ) -> dict[str, np.ndarray]:
+        if not os.path.exists( self.tablePath ):
+            return {}
+        with np.load( self.tablePath, allow_pickle=False ) as npz:
+            return { name : npz[ name ] for name in npz.files }
+
+    @cached_property
+    def tickerToRowMap( self ) -> dict[str, int]:
+        if 'tickers' not in self.arrays:
+            return {}
+        return { str( ticker ) : row for row, ticker in enumerate( self.arrays[ 'tickers' ] ) }
+
+    def __contains__( self, ticker: str ) -> bool:
+        return ticker in self.tickerToRowMap
+
+    def __len__( self ) -> int:
+        return len( self.tickerToRowMap )
+
+    def rowMatchesFile( self, row: int, mtimesName: str, path: str ) -> bool:
+        '''
+        Return whether the file is unchanged since the row was built from it,
+        going by the mtimes recorded in the mtimesName array.
+        '''
+        recordedMtime = int( self.arrays[ mtimesName ][ row ] )
+        return recordedMtime != -1 and mtimeNs( path ) == recordedMtime
+
+
+_keyToSharedTableMap: dict[tuple[type, str], NpzTable] = {}
+
+
+def sharedTable( tableClass: type[TableT], tablePath: str ) -> TableT:
+    '''
+    Returns the one instance of tableClass for the path, creating it with
+    just the path on first use.
+    '''
+    key = ( tableClass, tablePath )
+    if key not in _keyToSharedTableMap:
+        _keyToSharedTableMap[ key ] = tableClass( tablePath )
+    table = _keyToSharedTableMap[ key ]
+    assert isinstance( table, tableClass )
+    return table
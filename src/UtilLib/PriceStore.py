@@ -0,0 +1,170 @@
+#!/usr/bin/env python
+
+
+r"""
+Storage for the daily closing price history of each ticker.
+
+Closing prices are kept in two formats under data/ProcessedData:
+   - DailyClosingPriceCsvs/<T>.csv: human-readable Date,Close text files.
+   - DailyClosingPriceNpys/<T>-dates.npy and <T>-close.npy: a pair of NumPy
+     arrays holding the dates (datetime64[D], i.e. int64 days) and the
+     closing prices (float64). Loading these skips text and date parsing
+     entirely, which makes reading the whole universe much faster.
+
+readClosingPriceDf() prefers the NumPy pair when it's at least as new as
+the CSV, and falls back to the CSV otherwise.
+"""
+
+import os
+
+import numpy as np
+import pandas as pd
+from pandas import DataFrame
+
+from UtilLib.Util import absolutePathLocator
+
+
+CSV_DIR = 'data/ProcessedData/DailyClosingPriceCsvs'
+NPY_DIR = 'data/ProcessedData/DailyClosingPriceNpys'
+
+
+def csvPath( ticker: str, csvDir: str = '' ) -> str:
+    return os.path.join( csvDir or absolutePathLocator( CSV_DIR ), '%s.csv' % ticker )
+
+
+def npyPaths( ticker: str, npyDir: str = '' ) -> tuple[str, str]:
+    '''
+    Return the paths of the dates array and the closing prices array.
+    '''
+    npyDir = npyDir or absolutePathLocator( NPY_DIR )
+    return ( os.path.join( npyDir, '%s-dates.npy' % ticker ),
+             os.path.join( npyDir, '%s-close.npy' % ticker ) )
+
+
+def _saveAtomically( path: str, array: np.ndarray ) -> None:
+    # np.save() appends ".npy" to paths without it, so keep the suffix.
+    tempPath = path[:-4] + '-tmp.npy'
+    np.save( tempPath, array, allow_pickle=False )
+    os.replace( tempPath, path )
+
+
+def writeClosingPriceNpy( ticker: str, df: DataFrame, npyDir: str = '' ) -> None:
+    '''
+    Save the closing price history as a pair of NumPy arrays.
+
+    Keyword arguments:
+       ticker -- The ticker symbol
+       df     -- DataFrame with a Date column (or index) and a Close column.
+                 Dates may be strings starting with 'YYYY-MM-DD' or datetimes.
+       npyDir -- Directory for the arrays. Defaults to NPY_DIR.
+    '''
+    if 'Date' in df.columns:
+        dateValues = df[ 'Date' ]
+    else:
+        dateValues = df.index.to_series()
+    if dateValues.dtype == object or pd.api.types.is_string_dtype( dateValues ):
+        dates = np.array( dateValues.astype( str ).str.slice( 0, 10 ), dtype='datetime64[D]' )
+    else:
+        dates = pd.DatetimeIndex( dateValues ).tz_localize( None ).to_numpy().astype( 'datetime64[D]' )
+    close = pd.to_numeric( df[ 'Close' ], errors='coerce' ).to_numpy( dtype=np.float64 )
+    writeClosingPriceArrays( ticker, dates, close, npyDir )
+
+
+def writeClosingPriceArrays( ticker: str, dates: np.ndarray, close: np.ndarray, npyDir: str = '' ) -> None:
+    '''
+    Save the dates ( anything that converts to datetime64[D] ) and the
+    closing prices as the ticker's pair of NumPy arrays.
+    '''
+    dates = np.asarray( dates ).astype( 'datetime64[D]' )
+    close = np.asarray( close, dtype=np.float64 )
+    if len( dates ) != len( close ):
+        raise ValueError( "Mismatched date and price arrays for %s" % ticker )
+
+    npyDir = npyDir or absolutePathLocator( NPY_DIR )
+    os.makedirs( npyDir, exist_ok=True )
+    datesPath, closePath = npyPaths( ticker, npyDir )
+    _saveAtomically( datesPath, dates )
+    _saveAtomically( closePath, close )
+
+
+def readClosingPriceNpy( ticker: str, npyDir: str = '' ) -> DataFrame:
+    '''
+    Read the closing price history from its NumPy arrays into a DataFrame
+    shaped like the one read from the CSV: a 'Date' index and a 'Close' column.
+    '''
+    datesPath, closePath = npyPaths( ticker, npyDir )
+    dates = np.load( datesPath, allow_pickle=False )
+    close = np.load( closePath, allow_pickle=False )
+    if len( dates ) != len( close ):
+        raise ValueError( "Mismatched date and price arrays for %s" % ticker )
+    index = pd.DatetimeIndex( dates.astype( 'datetime64[ns]' ), name='Date' )
+    return pd.DataFrame( { 'Close' : close }, index=index )
+
+
+def readClosingPriceCsv( ticker: str, csvDir: str = '' ) -> DataFrame:
+    df = pd.read_csv( csvPath( ticker, csvDir ), index_col='Date', parse_dates=True,
+                      na_values=[ 'nan' ] )
+    return df
+
+
+def readCloseArray( ticker: str, csvDir: str = '', npyDir: str = '' ) -> np.ndarray:
+    '''
+    Return just the closing prices as a float64 array. When the binary
+    format is up-to-date, this skips the dates and the DataFrame entirely.
+    '''
+    if hasFreshNpy( ticker, csvDir, npyDir ):
+        try:
+            close: np.ndarray = np.load( npyPaths( ticker, npyDir )[ 1 ], allow_pickle=False )
+            return close
+        except ( OSError, ValueError ):
+            pass
+    return readClosingPriceCsv( ticker, csvDir )[ 'Close' ].to_numpy( dtype=np.float64 )
+
+
+def readPriceArrays( ticker: str, csvDir: str = '', npyDir: str = '' ) -> tuple[np.ndarray, np.ndarray]:
+    '''
+    Return the dates ( datetime64[D] ) and the closing prices ( float64 )
+    as a pair of arrays, both from the same source.
+    '''
+    if hasFreshNpy( ticker, csvDir, npyDir ):
+        try:
+            datesPath, closePath = npyPaths( ticker, npyDir )
+            dates: np.ndarray = np.load( datesPath, allow_pickle=False )
+            close: np.ndarray = np.load( closePath, allow_pickle=False )
+            if len( dates ) == len( close ):
+                return dates, close
+        except ( OSError, ValueError ):
+            pass
+    df = readClosingPriceCsv( ticker, csvDir )
+    return ( df.index.to_numpy().astype( 'datetime64[D]' ),
+             df[ 'Close' ].to_numpy( dtype=np.float64 ) )
+
+
+def hasFreshNpy( ticker: str, csvDir: str = '', npyDir: str = '' ) -> bool:
+    '''
+    Returns whether the NumPy arrays exist and are no older than the CSV.
+    '''
+    datesPath, closePath = npyPaths( ticker, npyDir )
+    try:
+        npyMtime = min( os.stat( datesPath ).st_mtime, os.stat( closePath ).st_mtime )
+    except FileNotFoundError:
+        return False
+    try:
+        return npyMtime >= os.stat( csvPath( ticker, csvDir ) ).st_mtime
+    except FileNotFoundError:
+        # Only the binary format was written.
+        return True
+
+
+def readClosingPriceDf( ticker: str, csvDir: str = '', npyDir: str = '' ) -> DataFrame:
+    '''
+    Return the closing price history for the ticker, using the binary
+    format when it's available and up-to-date, and the CSV otherwise.
+    '''
+    if hasFreshNpy( ticker, csvDir, npyDir ):
+        try:
+            return readClosingPriceNpy( ticker, npyDir )
+        except ( OSError, ValueError ):
+            # A corrupt or half-written pair; the CSV is still good.
+            pass
+    return readClosingPriceCsv( ticker, csvDir )
@@ -0,0 +1,53 @@
+#!/usr/bin/env python
+
+
+r"""
+A thread-safe token bucket for capping how often requests are made.
+"""
+
+import threading, time
+from typing import Optional
+
+
+class RateLimiter:
+    def __init__( self, ratePerSecond: Optional[float] = None, burst: int = 1 ) -> None:
+        '''
+        Keyword arguments:
+           ratePerSecond -- Maximum sustained rate. None means no limit.
+           burst         -- How many calls can go through back to back
+                            after the limiter has been idle.
+        '''
+        self.burst = burst
+        self.lock = threading.Lock()
+        self.tokens = float( burst )
+        self.lastRefill = time.monotonic()
+        self.ratePerSecond = ratePerSecond
+
+    def setRate( self, ratePerSecond: Optional[float] ) -> None:
+        with self.lock:
+            self._refill()
+            self.ratePerSecond = ratePerSecond
+
+    def _refill( self ) -> None:
+        now = time.monotonic()
+        if self.ratePerSecond:
+            self.tokens = min( float( self.burst ),
+                               self.tokens + ( now - self.lastRefill ) * self.ratePerSecond )
+        self.lastRefill = now
+
+    def acquire( self ) -> float:
+        '''
+        Block until a call is allowed, and return how long we waited.
+        '''
+        waited = 0.0
+        while True:
+            with self.lock:
+                if not self.ratePerSecond:
+                    return waited
+                self._refill()
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return waited
+                delay = ( 1 - self.tokens ) / self.ratePerSecond
+            time.sleep( delay )
+            waited += delay
@@ -0,0 +1,333 @@
+#!/usr/bin/env python
+
+
+r"""
+Send requests to a host at a rate the host can take, retry the ones that
+fail for transient reasons, and stop sending for a while when it keeps failing.
+
+- Each host has its own rate ( a RateLimiter ), adapted AIMD-style: every
+  quick success adds a little to it, and a throttled ( e.g. 429 ) or slow
+  response cuts it by a factor.
+- A call that fails with a throttle, a 5xx or a connection error is retried,
+  after an exponential backoff with full jitter, or after the server's
+  Retry-After if that's longer. Other errors are raised right away.
+- After enough transient failures in a row, the host's circuit breaker opens,
+  and calls fail fast with CircuitOpenError. Once the cooldown has passed,
+  one trial call is let through: if it succeeds the breaker closes,
+  and if not it opens again.
+
+Example:
+    >>> governor = RequestGovernor.getSharedGovernor()
+    >>> history = governor.call( RequestGovernor.YAHOO_HOST, yfTicker.history, period='max' )
+    >>> print( governor.report() )
+"""
+
+import threading, time, random
+from collections import deque
+from typing import Any, Callable, Optional, TypeVar
+
+from UtilLib.RateLimiter import RateLimiter
+
+
+# The hosts the data collectors talk to.
+YAHOO_HOST = 'finance.yahoo.com'
+MACROTRENDS_HOST = 'www.macrotrends.net'
+
+# Responses that mean we're sending too fast, and ones worth retrying.
+THROTTLE_STATUSES = { 429, 503 }
+RETRY_STATUSES = { 429, 500, 502, 503, 504 }
+
+# Seconds over which the rate we were actually sending at is measured.
+RATE_WINDOW_SECONDS = 10.0
+
+T = TypeVar( 'T' )
+
+
+class CircuitOpenError( Exception ):
+    '''
+    Raised instead of sending a request while a host's circuit breaker is open.
+    '''
+
+
+def _statusOf( e: BaseException ) -> Optional[int]:
+    '''
+    The HTTP status of an HTTPError from urllib, requests or curl_cffi.
+    '''
+    status = getattr( e, 'code', None )
+    if isinstance( status, int ) and 100 <= status < 600:
+        return status
+    response = getattr( e, 'response', None )
+    status = getattr( response, 'status_code', None )
+    return status if isinstance( status, int ) else None
+
+
+def isThrottle( e: BaseException ) -> bool:
+    '''
+    Returns whether the error means the host wants us to slow down.
+    '''
+    status = _statusOf( e )
+    if status is not None:
+        return status in THROTTLE_STATUSES
+    # e.g. yfinance's YFRateLimitError
+    return 'RateLimit' in type( e ).__name__ or 'Too Many Requests' in str( e )
+
+
+def isTransient( e: BaseException ) -> bool:
+    '''
+    Returns whether the same request might succeed if we try again.
+    '''
+    if isThrottle( e ):
+        return True
+    status = _statusOf( e )
+    if status is not None:
+        return status in RETRY_STATUSES
+    if isinstance( e, ( FileNotFoundError, PermissionError, IsADirectoryError ) ):
+        return False
+    # Connection errors and timeouts ( requests' and curl_cffi's are OSErrors too ),
+    # and Selenium's page load timeouts.
+    return isinstance( e, ( OSError, TimeoutError ) ) or type( e ).__name__.endswith( 'TimeoutException' )
+
+
+def _retryAfterSeconds( e: BaseException ) -> Optional[float]:
+    headers = getattr( e, 'headers', None ) or getattr( getattr( e, 'response', None ), 'headers', None )
+    if not headers:
+        return None
+    try:
+        return float( headers.get( 'Retry-After' ) )
+    except ( TypeError, ValueError ):
+        # An HTTP date, or no header at all.
+        return None
+
+
+class HostState:
+    '''
+    A host's rate, circuit breaker and counters.
+    '''
+    def __init__( self, host: str, maxRate: Optional[float], minRate: float ) -> None:
+        self.host = host
+        self.maxRate = maxRate
+        self.minRate = minRate
+        # None means no limit, until the host first pushes back.
+        self.rateLimiter = RateLimiter( maxRate )
+        self.lock = threading.Lock()
+        self.recentStarts: deque[float] = deque()
+        self.latencySeconds: Optional[float] = None
+
+        self.consecutiveFailures = 0
+        self.openUntil = 0.0
+        self.trialInFlight = False
+
+        self.numRequests = 0
+        self.numSucceeded = 0
+        self.numFailed = 0
+        self.numThrottled = 0
+        self.numSlow = 0
+        self.numRetries = 0
+        self.numRejected = 0
+        self.numTrips = 0
+
+    @property
+    def rate( self ) -> Optional[float]:
+        return self.rateLimiter.ratePerSecond
+
+    @property
+    def isOpen( self ) -> bool:
+        return time.monotonic() < self.openUntil
+
+    def report( self ) -> str:
+        rate = '%.2f/s' % self.rate if self.rate else 'unlimited'
+        latency = '%.2fs' % self.latencySeconds if self.latencySeconds is not None else '-'
+        return "%s: %d requests, %d succeeded, %d failed, %d throttled, %d slow, %d retries, " \
+               "%d rejected by the circuit breaker, which tripped %d times; rate %s, latency %s" % \
+               ( self.host, self.numRequests, self.numSucceeded, self.numFailed, self.numThrottled,
+                 self.numSlow, self.numRetries, self.numRejected, self.numTrips, rate, latency )
+
+
+class RequestGovernor:
+    def __init__( self,
+                  maxRetries: int = 3,
+                  baseBackoffSeconds: float = 1.0,
+                  maxBackoffSeconds: float = 60.0,
+                  increasePerSuccess: float = 0.05,
+                  decreaseFactor: float = 0.5,
+                  slowSeconds: float = 10.0,
+                  slowDecreaseFactor: float = 0.9,
+                  failureThreshold: int = 5,
+                  cooldownSeconds: float = 60.0,
+                  minRate: float = 0.1 ) -> None:
+        '''
+        Keyword arguments:
+           maxRetries         -- How many times to retry a call after a transient failure
+           baseBackoffSeconds -- Longest wait before the first retry. It doubles for each
+                                 retry after that, and the actual wait is random below it.
+           maxBackoffSeconds  -- Cap on the backoff
+           increasePerSuccess -- Requests per second added to a host's rate after each quick success
+           decreaseFactor     -- What a host's rate is multiplied by when it throttles us
+           slowSeconds        -- Responses slower than this count as a sign of congestion
+           slowDecreaseFactor -- What a host's rate is multiplied by after a slow response
+           failureThreshold   -- Transient failures in a row that open a host's circuit breaker
+           cooldownSeconds    -- How long the breaker stays open before a trial call
+           minRate            -- A host's rate is never cut below this
+        '''
+        self.maxRetries = maxRetries
+        self.baseBackoffSeconds = baseBackoffSeconds
+        self.maxBackoffSeconds = maxBackoffSeconds
+        self.increasePerSuccess = increasePerSuccess
+        self.decreaseFactor = decreaseFactor
+        self.slowSeconds = slowSeconds
+        self.slowDecreaseFactor = slowDecreaseFactor
+        self.failureThreshold = failureThreshold
+        self.cooldownSeconds = cooldownSeconds
+        self.minRate = minRate
+        self.lock = threading.Lock()
+        self.hostToStateMap: dict[str, HostState] = {}
+
+    def configureHost( self, host: str, maxRate: Optional[float] = None ) -> HostState:
+        '''
+        Set the most requests per second the host gets, however well it responds.
+        None means no cap. The host's current rate starts at the cap.
+        '''
+        state = self.hostState( host )
+        with state.lock:
+            state.maxRate = maxRate
+            state.rateLimiter.setRate( maxRate )
+        return state
+
+    def hostState( self, host: str ) -> HostState:
+        with self.lock:
+            if host not in self.hostToStateMap:
+                self.hostToStateMap[ host ] = HostState( host, None, self.minRate )
+            return self.hostToStateMap[ host ]
+
+    def _admit( self, state: HostState ) -> None:
+        '''
+        Raise CircuitOpenError if the host's breaker doesn't let a call through.
+        '''
+        with state.lock:
+            if state.consecutiveFailures < self.failureThreshold:
+                return
+            if state.isOpen or state.trialInFlight:
+                state.numRejected += 1
+                raise CircuitOpenError( "Not sending to %s for %.0fs after %d failures in a row" % \
+                                        ( state.host, max( 0.0, state.openUntil - time.monotonic() ),
+                                          state.consecutiveFailures ) )
+            # Half-open: let this one call through as a trial.
+            state.trialInFlight = True
+
+    def _setRate( self, state: HostState, rate: float ) -> None:
+        if state.maxRate is not None:
+            rate = min( rate, state.maxRate )
+        state.rateLimiter.setRate( max( state.minRate, rate ) )
+
+    def _decrease( self, state: HostState, factor: float ) -> None:
+        '''
+        Cut the host's rate. If it had no limit, start from the rate we were sending at.
+        '''
+        rate = state.rate
+        if rate is None:
+            rate = len( state.recentStarts ) / RATE_WINDOW_SECONDS
+        self._setRate( state, rate * factor )
+
+    def _recordStart( self, state: HostState ) -> None:
+        now = time.monotonic()
+        with state.lock:
+            state.numRequests += 1
+            state.recentStarts.append( now )
+            while state.recentStarts and state.recentStarts[ 0 ] < now - RATE_WINDOW_SECONDS:
+                state.recentStarts.popleft()
+
+    def _recordSuccess( self, state: HostState, seconds: float ) -> None:
+        with state.lock:
+            state.numSucceeded += 1
+            state.consecutiveFailures = 0
+            state.trialInFlight = False
+            state.latencySeconds = seconds if state.latencySeconds is None \
+                                   else 0.8 * state.latencySeconds + 0.2 * seconds
+            if seconds > self.slowSeconds:
+                state.numSlow += 1
+                self._decrease( state, self.slowDecreaseFactor )
+            elif state.rate is not None:
+                self._setRate( state, state.rate + self.increasePerSuccess )
+
+    def _recordFailure( self, state: HostState, e: BaseException ) -> None:
+        with state.lock:
+            state.trialInFlight = False
+            if not isTransient( e ):
+                # The host answered, it just didn't have what we asked for.
+                state.consecutiveFailures = 0
+                return
+            if isThrottle( e ):
+                state.numThrottled += 1
+                self._decrease( state, self.decreaseFactor )
+            state.consecutiveFailures += 1
+            if state.consecutiveFailures >= self.failureThreshold:
+                if not state.isOpen:
+                    state.numTrips += 1
+                state.openUntil = time.monotonic() + self.cooldownSeconds
+
+    def backoffSeconds( self, attempt: int, e: Optional[BaseException] = None ) -> float:
+        '''
+        How long to wait before retry number attempt ( 0 for the first ).
+        '''
+        delay = random.uniform( 0, min( self.maxBackoffSeconds, self.baseBackoffSeconds * 2 ** attempt ) )
+        retryAfter = _retryAfterSeconds( e ) if e is not None else None
+        if retryAfter is not None:
+            delay = max( delay, min( retryAfter, self.maxBackoffSeconds ) )
+        return delay
+
+    def call( self, host: str, func: Callable[..., T], *args: Any, **kwargs: Any ) -> T:
+        '''
+        Call func( *args, **kwargs ), which sends a request to the host, and
+        return what it returns. Transient failures are retried; the last
+        failure, or CircuitOpenError, is raised if it never succeeds.
+        '''
+        state = self.hostState( host )
+        attempt = 0
+        while True:
+            self._admit( state )
+            state.rateLimiter.acquire()
+            self._recordStart( state )
+            start = time.monotonic()
+            try:
+                result = func( *args, **kwargs )
+            except Exception as e:
+                self._recordFailure( state, e )
+                with state.lock:
+                    # A retry would only be turned away by the breaker this
+                    # failure just opened ( e.g. a failed trial call ), so
+                    # raise the error itself instead of CircuitOpenError.
+                    giveUp = not isTransient( e ) or attempt >= self.maxRetries or state.isOpen
+                    if giveUp:
+                        state.numFailed += 1
+                if giveUp:
+                    raise
+                delay = self.backoffSeconds( attempt, e )
+                print( "[ERROR] Request to %s failed ( %s ), retrying in %.1fs" % ( host, e, delay ) )
+                with state.lock:
+                    state.numRetries += 1
+                time.sleep( delay )
+                attempt += 1
+                continue
+            self._recordSuccess( state, time.monotonic() - start )
+            return result
+
+    def report( self ) -> str:
+        with self.lock:
+            states = list( self.hostToStateMap.values() )
+        return "\n".join( state.report() for state in states if state.numRequests or state.numRejected )
+
+
+_sharedGovernor: Optional[RequestGovernor] = None
+_sharedGovernorLock = threading.Lock()
+
+
+def getSharedGovernor() -> RequestGovernor:
+    '''
+    Returns the governor every data collector sends its requests through,
+    so they all share each host's rate and circuit breaker.
+    '''
+    global _sharedGovernor
+    with _sharedGovernorLock:
+        if _sharedGovernor is None:
+            _sharedGovernor = RequestGovernor()
+        return _sharedGovernor
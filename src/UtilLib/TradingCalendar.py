@@ -0,0 +1,200 @@
+#!/usr/bin/env python
+
+
+r"""
+The NYSE trading calendar, computed by rule so it works offline.
+
+Knows the exchange's full-day holidays and early ( 1 p.m. ) closes, and which
+session most recently closed at any point in time. That's what tells us whether
+a price CSV can possibly be missing any data.
+
+Example:
+    >>> TradingCalendar.isTradingDay( datetime.date( 2024, 7, 4 ) )
+    False
+    >>> TradingCalendar.lastCompletedSession( datetime.datetime( 2024, 7, 5, 9, 0, tzinfo=NEW_YORK ) )
+    datetime.date(2024, 7, 3)
+    >>> TradingCalendar.isUpToDate( '2024-07-03', datetime.datetime( 2024, 7, 5, 9, 0, tzinfo=NEW_YORK ) )
+    True
+
+NOTE: One-off closures ( e.g. national days of mourning ) can't be derived
+      from a rule, so they're listed in UNSCHEDULED_CLOSURES. Add new ones there.
+"""
+
+import datetime
+from functools import lru_cache
+from typing import Optional
+from zoneinfo import ZoneInfo
+
+
+NEW_YORK = ZoneInfo( 'America/New_York' )
+
+REGULAR_CLOSE = datetime.time( 16, 0 )
+EARLY_CLOSE = datetime.time( 13, 0 )
+
+# Days the exchange closed for reasons no rule predicts.
+UNSCHEDULED_CLOSURES = {
+    datetime.date( 2001, 9, 11 ) : "September 11 Attacks",
+    datetime.date( 2001, 9, 12 ) : "September 11 Attacks",
+    datetime.date( 2001, 9, 13 ) : "September 11 Attacks",
+    datetime.date( 2001, 9, 14 ) : "September 11 Attacks",
+    datetime.date( 2004, 6, 11 ) : "Day of Mourning for Ronald Reagan",
+    datetime.date( 2007, 1, 2 ) : "Day of Mourning for Gerald Ford",
+    datetime.date( 2012, 10, 29 ) : "Hurricane Sandy",
+    datetime.date( 2012, 10, 30 ) : "Hurricane Sandy",
+    datetime.date( 2018, 12, 5 ) : "Day of Mourning for George H.W. Bush",
+    datetime.date( 2025, 1, 9 ) : "Day of Mourning for Jimmy Carter",
+}
+
+
+def _nthWeekday( year: int, month: int, weekday: int, n: int ) -> datetime.date:
+    '''
+    Returns the nth given weekday of the month, e.g. the 3rd Monday.
+    n == -1 means the last one.
+
+    Keyword arguments:
+       weekday -- 0 for Monday through 6 for Sunday
+    '''
+    if n > 0:
+        first = datetime.date( year, month, 1 )
+        offset = ( weekday - first.weekday() ) % 7
+        return first + datetime.timedelta( days=offset + 7 * ( n - 1 ) )
+    nextMonth = datetime.date( year + month // 12, month % 12 + 1, 1 )
+    last = nextMonth - datetime.timedelta( days=1 )
+    return last - datetime.timedelta( days=( last.weekday() - weekday ) % 7 )
+
+
+def _easter( year: int ) -> datetime.date:
+    '''
+    Returns Easter Sunday, using the anonymous Gregorian algorithm.
+    '''
+    a = year % 19
+    b, c = divmod( year, 100 )
+    d, e = divmod( b, 4 )
+    f = ( b + 8 ) // 25
+    g = ( b - f + 1 ) // 3
+    h = ( 19 * a + b - d - g + 15 ) % 30
+    i, k = divmod( c, 4 )
+    l = ( 32 + 2 * e + 2 * i - h - k ) % 7
+    m = ( a + 11 * h + 22 * l ) // 451
+    month, day = divmod( h + l - 7 * m + 114, 31 )
+    return datetime.date( year, month, day + 1 )
+
+
+def _observed( date: datetime.date ) -> datetime.date:
+    '''
+    Holidays on a Saturday are observed on Friday,
+    and holidays on a Sunday are observed on Monday.
+    '''
+    if date.weekday() == 5:
+        return date - datetime.timedelta( days=1 )
+    if date.weekday() == 6:
+        return date + datetime.timedelta( days=1 )
+    return date
+
+
+@lru_cache( maxsize=None )
+def holidays( year: int ) -> dict[datetime.date, str]:
+    '''
+    Returns a map from each date the exchange is closed in the year
+    ( other than weekends ) to the holiday's name.
+    '''
+    dateToHolidayMap = {}
+
+    # When New Year's Day is a Saturday, the exchange doesn't close
+    # on the Friday before, since that would end the previous year early.
+    newYearsDay = datetime.date( year, 1, 1 )
+    if newYearsDay.weekday() != 5:
+        dateToHolidayMap[ _observed( newYearsDay ) ] = "New Year's Day"
+    if year >= 1998:
+        dateToHolidayMap[ _nthWeekday( year, 1, 0, 3 ) ] = "Martin Luther King, Jr. Day"
+    dateToHolidayMap[ _nthWeekday( year, 2, 0, 3 ) ] = "Washington's Birthday"
+    dateToHolidayMap[ _easter( year ) - datetime.timedelta( days=2 ) ] = "Good Friday"
+    dateToHolidayMap[ _nthWeekday( year, 5, 0, -1 ) ] = "Memorial Day"
+    if year >= 2022:
+        dateToHolidayMap[ _observed( datetime.date( year, 6, 19 ) ) ] = "Juneteenth"
+    dateToHolidayMap[ _observed( datetime.date( year, 7, 4 ) ) ] = "Independence Day"
+    dateToHolidayMap[ _nthWeekday( year, 9, 0, 1 ) ] = "Labor Day"
+    dateToHolidayMap[ _nthWeekday( year, 11, 3, 4 ) ] = "Thanksgiving Day"
+    dateToHolidayMap[ _observed( datetime.date( year, 12, 25 ) ) ] = "Christmas Day"
+
+    for date, name in UNSCHEDULED_CLOSURES.items():
+        if date.year == year:
+            dateToHolidayMap[ date ] = name
+    return dateToHolidayMap
+
+
+def isTradingDay( date: datetime.date ) -> bool:
+    return date.weekday() < 5 and date not in holidays( date.year )
+
+
+def isEarlyClose( date: datetime.date ) -> bool:
+    '''
+    Returns whether the exchange closes at 1 p.m. on the date:
+    the day before Independence Day, the day after Thanksgiving, and
+    Christmas Eve, as long as they're regular trading days.
+    '''
+    if not isTradingDay( date ):
+        return False
+    if date.month == 7 and date.day == 3:
+        return True
+    if date.month == 12 and date.day == 24:
+        return True
+    return date == _nthWeekday( date.year, 11, 3, 4 ) + datetime.timedelta( days=1 )
+
+
+def closeTime( date: datetime.date ) -> datetime.datetime:
+    '''
+    Returns when the session on the date closes, in New York time.
+    '''
+    time = EARLY_CLOSE if isEarlyClose( date ) else REGULAR_CLOSE
+    return datetime.datetime.combine( date, time, tzinfo=NEW_YORK )
+
+
+def previousTradingDay( date: datetime.date ) -> datetime.date:
+    '''
+    Returns the last trading day strictly before the date.
+    '''
+    date -= datetime.timedelta( days=1 )
+    while not isTradingDay( date ):
+        date -= datetime.timedelta( days=1 )
+    return date
+
+
+def nextTradingDay( date: datetime.date ) -> datetime.date:
+    '''
+    Returns the first trading day strictly after the date.
+    '''
+    date += datetime.timedelta( days=1 )
+    while not isTradingDay( date ):
+        date += datetime.timedelta( days=1 )
+    return date
+
+
+def lastCompletedSession( now: Optional[datetime.datetime] = None ) -> datetime.date:
+    '''
+    Returns the date of the most recent session that had closed by the given time.
+
+    Keyword arguments:
+       now -- Defaults to the current time. A naive datetime
+              is taken to be in the local timezone.
+    '''
+    if now is None:
+        now = datetime.datetime.now( NEW_YORK )
+    now = now.astimezone( NEW_YORK )
+    today = now.date()
+    if isTradingDay( today ) and now >= closeTime( today ):
+        return today
+    return previousTradingDay( today )
+
+
+def isUpToDate( dateStr: str, now: Optional[datetime.datetime] = None ) -> bool:
+    '''
+    Returns whether data whose last bar is on dateStr already includes
+    the last completed session, i.e. whether fetching again can't give us
+    any new daily bars.
+
+    Keyword arguments:
+       dateStr -- Date string the form 'YYYY-MM-DD'
+       now     -- Defaults to the current time.
+    '''
+    return dateStr >= lastCompletedSession( now ).isoformat()
@@ -6,8 +6,6 @@ Useful helper functions
 """
 
 import os, datetime
-import requests
-from selenium import webdriver
 
 
 # Base directory of the repository
@@ -35,7 +33,8 @@ def isMostRecentWeekday( dateStr: str ) -> bool:
    '''
    Returns whether the dateStr is equal to the most recent weekday.
 
-   TODO: Handle holidays?
+   NOTE: This doesn't know about holidays. To check whether price data
+         is up-to-date, use TradingCalendar.isUpToDate() instead.
 
    Keyword arguments:
       dateStr -- Date string the form 'YYYY-MM-DD'
@@ -102,8 +101,11 @@ def getTickerList( tickerListPath: str ) -> list[str]:
 def getPageSourceUsingRequests( url: str ) -> str:
     '''
     Given a URL, return the HTML source code for that webpage.
+    Uses the shared HTTP client, so connections are reused and
+    unchanged pages are served from its cache.
     '''
-    return requests.get( url ).text
+    from UtilLib import HttpUtil
+    return HttpUtil.getText( url )
 
 def getPageSourceUsingSelenium( url: str ) -> str:
     '''
@@ -111,11 +113,9 @@ def getPageSourceUsingSelenium( url: str ) -> str:
     scrape them with requests.get(), but using Selenium
     lets me get around the issue.
 
-    NOTE: In my testing, this can be very slow. Further efforts
-          will be needed to make this faster and more reliable.
+    The browsers come from a shared BrowserPool, so we don't pay for
+    starting a new one on every call. Use BrowserPool.configureSharedPool()
+    to change how many there are.
     '''
-    driver = webdriver.Chrome()
-    driver.get( url )
-    pageSource = driver.page_source
-    driver.close()
-    return pageSource
+    from UtilLib import BrowserPool
+    return BrowserPool.getSharedPool().getPageSource( url )
@@ -0,0 +1,77 @@
+#!/usr/bin/env python
+
+"""
+Take the template HTML file, and add in the table of stock data.
+"""
+
+###########
+# Imports
+###########
+import os
+from pandas import DataFrame
+
+
+###########
+# Constants
+###########
+THIS_DIR = os.path.dirname( __file__ )
+TEMPLATE_PATH = THIS_DIR + '/template.html'
+OUTPUT_PATH = THIS_DIR + '/index.html'
+PLACEHOLDER = '<!--PLACEHOLDER: StockDataFrame table -->'
+
+
+###########
+# Functions
+###########
+
+def tableHtml( df: DataFrame ) -> str:
+    '''
+    Convert the table of stock data to an HTML table whose columns sort when clicked.
+    '''
+    tableLines = df.to_html().split( '\n' )
+
+    # Now we edit some of the lines in the HTML.
+
+    # Set table id.
+    tableLines[ 0 ] = tableLines[ 0 ][:-1] + ' id="StockDataFrame">'
+
+    # Set name of the first column.
+    tableLines[ 3 ] = tableLines[ 3 ][:-5] + 'Ticker' + tableLines[ 3 ][-5:]
+
+    # Set onclick for the Ticker column, which is the index column of the DataFrame.
+    origLine = tableLines[ 3 ]
+    newLine = origLine[:9] + ' onclick="sortBy(0)"' + origLine[9:]
+    tableLines[ 3 ]  = newLine
+
+    # Set onclick for each of the other columns.
+    #    Keep in mind that the DataFrame's Ticker column is the index,
+    #    which doesn't appear in df.columns.
+    for dfColNum in range( len( df.columns ) ):
+        lineNum = 4 + dfColNum
+        htmlTableColNum = dfColNum + 1
+        origLine = tableLines[ lineNum ]
+        newLine = origLine[:9] + ' onclick="sortBy(%d)"' % htmlTableColNum + origLine[9:]
+        tableLines[ lineNum ] = newLine
+
+    # Form the finished HTML code for the table.
+    return '\n'.join( tableLines )
+
+
+def writeDashboard( df: DataFrame, templatePath: str = '', outputPath: str = '' ) -> str:
+    '''
+    Substitute the table for the PLACEHOLDER comment in the template,
+    write the page, and return its path.
+
+    Keyword arguments:
+       df           -- The table of stock data, e.g. Screener().df
+       templatePath -- Defaults to TEMPLATE_PATH.
+       outputPath   -- Defaults to OUTPUT_PATH.
+    '''
+    with open( templatePath or TEMPLATE_PATH, 'r' ) as f:
+        origHtmlText = f.read()
+
+    newHtmlText = origHtmlText.replace( PLACEHOLDER, tableHtml( df ) )
+    newHtmlPath = outputPath or OUTPUT_PATH
+    with open( newHtmlPath, 'w' ) as f:
+        f.write( newHtmlText )
+    return newHtmlPath